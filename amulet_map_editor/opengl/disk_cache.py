@@ -0,0 +1,54 @@
+"""Helpers for the caches that keep pickled data on disk between sessions.
+Each cache is a directory of entries named by a key. The least recently used entries are deleted
+when there are more than the cache allows."""
+
+import os
+import pickle
+from typing import Any, Optional, Tuple
+
+from amulet_map_editor import log
+
+
+def file_state(path: str) -> Optional[Tuple[int, int]]:
+    """The modified time in nanoseconds and the size of a file. Used to find out if a file has changed.
+    None if the file could not be found."""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+def load_entry(directory: str, key: str) -> Optional[Any]:
+    """Load a cache entry and mark it as the most recently used.
+    :return: The unpickled data. None if the entry does not exist or could not be loaded."""
+    path = os.path.join(directory, f'{key}.pickle')
+    if os.path.isfile(path):
+        try:
+            with open(path, 'rb') as f:
+                data = pickle.load(f)
+            os.utime(path)
+            return data
+        except Exception:
+            log.info(f'Failed loading the cache entry {path}', exc_info=True)
+    return None
+
+
+def save_entry(directory: str, key: str, data: Any, max_entries: int) -> bool:
+    """Save a cache entry and delete the least recently used entries above max_entries.
+    :return: True if the entry was saved."""
+    path = os.path.join(directory, f'{key}.pickle')
+    try:
+        os.makedirs(directory, exist_ok=True)
+        with open(f'{path}.tmp', 'wb') as f:
+            pickle.dump(data, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(f'{path}.tmp', path)
+        cached = sorted(
+            (entry.stat().st_mtime, entry.path) for entry in os.scandir(directory) if entry.name.endswith('.pickle')
+        )
+        for _, old_path in cached[:-max_entries]:
+            os.remove(old_path)
+    except OSError:
+        log.info(f'Failed saving the cache entry {path}', exc_info=True)
+        return False
+    return True
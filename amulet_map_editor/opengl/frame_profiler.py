@@ -0,0 +1,205 @@
+"""Optional instrumentation of the time spent drawing each frame.
+CPU time is measured with perf_counter for named stages. GPU time is measured with OpenGL timer queries.
+The results of timer queries are only available a few frames later so they are filled in when they are ready."""
+
+from OpenGL.GL import *
+import time
+import json
+import csv
+import contextlib
+import collections
+from typing import Dict, List, Deque, Tuple, Optional, Union
+
+import numpy
+
+from amulet_map_editor import log
+
+FrameType = Dict[str, Union[int, float, None]]
+
+
+class FrameProfiler:
+    def __init__(self, history: int = 600, interval: float = 1.0):
+        """Records the time spent in each stage of drawing a frame and counters such as draw calls.
+        The number of frames drawn and skipped, the fps and the frame time are always counted.
+        Everything else does nothing until enabled is set to True.
+        :param history: The number of frames to keep.
+        :param interval: The time in seconds that fps and frame_time are averaged over.
+        """
+        self.enabled = False
+        self._interval = interval
+        self.frame_count = 0  # the number of frames drawn
+        self.skipped_frames = 0  # the number of times a frame was not drawn because nothing had changed
+        self.fps = 0.0  # the number of frames drawn per second in the last interval
+        self.frame_time = 0.0  # the mean time in seconds to draw a frame in the last interval
+        self._interval_start = time.perf_counter()
+        self._interval_frames = 0
+        self._interval_frame_time = 0.0
+        self._frames: Deque[FrameType] = collections.deque(maxlen=history)
+        self._current: FrameType = {}  # the stages and counters recorded since the last frame ended
+        self._frame_start = 0.0
+        self._gpu_timing = True  # set to False if timer queries are not supported
+        self._free_queries: List[int] = []
+        self._pending_queries: Deque[Tuple[int, FrameType]] = collections.deque()  # queries that have not finished yet
+        self._query: Optional[int] = None  # the query for the frame being drawn
+
+    @property
+    def frames(self) -> List[FrameType]:
+        """The recorded frames from oldest to newest."""
+        return list(self._frames)
+
+    def clear(self):
+        """Remove all recorded frames."""
+        self._frames.clear()
+
+    def begin_frame(self):
+        """Call before drawing a frame. The OpenGL context must be current."""
+        self._frame_start = time.perf_counter()
+        if not self.enabled:
+            return
+        self._read_queries()
+        if self._gpu_timing:
+            try:
+                query = self._free_queries.pop() if self._free_queries else int(numpy.ravel(glGenQueries(1))[0])
+                glBeginQuery(GL_TIME_ELAPSED, query)
+            except Exception:
+                log.warning('OpenGL timer queries are not supported. GPU frame time will not be recorded.', exc_info=True)
+                self._gpu_timing = False
+            else:
+                self._query = query
+
+    def end_frame(self):
+        """Call after drawing a frame."""
+        now = time.perf_counter()
+        frame_time = now - self._frame_start
+        self.frame_count += 1
+        self._interval_frames += 1
+        self._interval_frame_time += frame_time
+        self._update_interval(now)
+        if not self.enabled:
+            return
+        frame = self._current
+        self._current = {}
+        frame['time'] = time.time()
+        frame['frame_ms'] = frame_time * 1000
+        frame['gpu_ms'] = None
+        if self._query is not None:
+            glEndQuery(GL_TIME_ELAPSED)
+            self._pending_queries.append((self._query, frame))
+            self._query = None
+        self._frames.append(frame)
+
+    def skip_frame(self):
+        """Call when a frame was not drawn because nothing had changed."""
+        self.skipped_frames += 1
+        self._update_interval(time.perf_counter())
+
+    def _update_interval(self, now: float):
+        """Update fps and frame_time if the interval has passed."""
+        elapsed = now - self._interval_start
+        if elapsed >= self._interval:
+            self.fps = self._interval_frames / elapsed
+            self.frame_time = self._interval_frame_time / self._interval_frames if self._interval_frames else 0.0
+            self._interval_start = now
+            self._interval_frames = 0
+            self._interval_frame_time = 0.0
+
+    def _read_queries(self):
+        """Fill in the GPU time of frames whose timer query has finished."""
+        available = numpy.zeros(1, dtype=numpy.int32)
+        result = numpy.zeros(1, dtype=numpy.uint64)
+        while self._pending_queries:
+            query, frame = self._pending_queries[0]
+            glGetQueryObjectiv(query, GL_QUERY_RESULT_AVAILABLE, available)
+            if not available[0]:
+                break
+            glGetQueryObjectui64v(query, GL_QUERY_RESULT, result)
+            frame['gpu_ms'] = int(result[0]) / 1_000_000
+            self._pending_queries.popleft()
+            self._free_queries.append(query)
+
+    def stage(self, name: str):
+        """A context manager that adds the CPU time spent in it to the stage in the current frame.
+        :param name: The name of the stage. Recorded as name_ms
+        """
+        if self.enabled:
+            return self._stage(name)
+        return contextlib.nullcontext()
+
+    @contextlib.contextmanager
+    def _stage(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            key = f'{name}_ms'
+            self._current[key] = self._current.get(key, 0.0) + (time.perf_counter() - start) * 1000
+
+    def count(self, name: str, value: Union[int, float] = 1):
+        """Add to a counter in the current frame."""
+        if self.enabled:
+            self._current[name] = self._current.get(name, 0) + value
+
+    def set(self, name: str, value: Union[int, float]):
+        """Set a value in the current frame."""
+        if self.enabled:
+            self._current[name] = value
+
+    def summary(self, duration: float = 1.0) -> Dict[str, float]:
+        """The mean of each value over the frames drawn in the last duration seconds.
+        Counters ending in _count are reported as a rate per second instead.
+        :param duration: The time in seconds to average over.
+        """
+        if not self._frames:
+            return {}
+        end = self._frames[-1]['time']
+        frames = [frame for frame in self._frames if end - frame['time'] <= duration]
+        totals: Dict[str, float] = {}
+        counts: Dict[str, int] = {}
+        for frame in frames:
+            for key, value in frame.items():
+                if value is not None and key != 'time':
+                    totals[key] = totals.get(key, 0) + value
+                    counts[key] = counts.get(key, 0) + 1
+        summary = {}
+        for key, total in totals.items():
+            if key.endswith('_count'):
+                summary[f'{key[:-6]}_per_second'] = total / duration
+            else:
+                summary[key] = total / counts[key]
+        summary['frames'] = len(frames)
+        return summary
+
+    def _keys(self) -> List[str]:
+        keys = ['time', 'frame_ms', 'gpu_ms']
+        for frame in self._frames:
+            for key in frame:
+                if key not in keys:
+                    keys.append(key)
+        return keys
+
+    def dump_json(self, path: str):
+        """Write the recorded frames to a JSON file as a list of objects."""
+        with open(path, 'w') as f:
+            json.dump(self.frames, f, indent=1)
+
+    def dump_csv(self, path: str):
+        """Write the recorded frames to a CSV file with one row per frame."""
+        with open(path, 'w', newline='') as f:
+            writer = csv.DictWriter(f, self._keys())
+            writer.writeheader()
+            writer.writerows(self._frames)
+
+    def __str__(self):
+        return f"{self.fps:.1f} fps {self.frame_time * 1000:.2f} ms/frame ({self.frame_count} drawn, {self.skipped_frames} skipped)"
+
+    def unload(self):
+        """Delete the OpenGL timer queries. The OpenGL context must be current."""
+        queries = self._free_queries + [query for query, _ in self._pending_queries]
+        if self._query is not None:
+            glEndQuery(GL_TIME_ELAPSED)
+            queries.append(self._query)
+            self._query = None
+        if queries:
+            glDeleteQueries(len(queries), queries)
+        self._free_queries.clear()
+        self._pending_queries.clear()
@@ -0,0 +1,48 @@
+"""Functions to test if geometry is visible to the camera.
+The transformation matrices in this project are applied to row vectors (vertex @ matrix)
+so the clip space coordinates are the dot product of the vertex with the columns of the matrix."""
+
+import numpy
+
+
+def frustum_planes(transformation_matrix: numpy.ndarray) -> numpy.ndarray:
+    """Extract the six clip planes from a transformation matrix.
+    :param transformation_matrix: The 4x4 matrix that transforms from the space the geometry is in to clip space.
+    :return: float array of shape (6, 4). A point p is inside a plane if dot(plane[:3], p) + plane[3] >= 0
+    """
+    m = numpy.asarray(transformation_matrix, dtype=numpy.float64)
+    w = m[:, 3]
+    return numpy.array(
+        [
+            w + m[:, 0],  # left
+            w - m[:, 0],  # right
+            w + m[:, 1],  # bottom
+            w - m[:, 1],  # top
+            w + m[:, 2],  # near
+            w - m[:, 2],  # far
+        ]
+    )
+
+
+def aabb_in_frustum(planes: numpy.ndarray, box_min: numpy.ndarray, box_max: numpy.ndarray) -> bool:
+    """Test if an axis aligned box is at least partially inside the frustum.
+    This is conservative. Some boxes near the corners of the frustum may be reported as visible.
+    :param planes: The planes from frustum_planes
+    :param box_min: The minimum point of the box. Shape (3,)
+    :param box_max: The maximum point of the box. Shape (3,)
+    """
+    # the corner of the box furthest along the normal of each plane
+    corners = numpy.where(planes[:, :3] >= 0, box_max, box_min)
+    return bool(numpy.all(numpy.einsum('ij,ij->i', corners, planes[:, :3]) + planes[:, 3] >= 0))
+
+
+def aabbs_in_frustum(planes: numpy.ndarray, box_min: numpy.ndarray, box_max: numpy.ndarray) -> numpy.ndarray:
+    """Vectorised version of aabb_in_frustum.
+    :param planes: The planes from frustum_planes
+    :param box_min: The minimum points of the boxes. Shape (n, 3)
+    :param box_max: The maximum points of the boxes. Shape (n, 3)
+    :return: bool array of shape (n,)
+    """
+    positive = planes[:, :3] >= 0  # (6, 3)
+    corners = numpy.where(positive[numpy.newaxis], box_max[:, numpy.newaxis], box_min[:, numpy.newaxis])  # (n, 6, 3)
+    return numpy.all(numpy.einsum('nij,ij->ni', corners, planes[:, :3]) + planes[:, 3] >= 0, axis=1)
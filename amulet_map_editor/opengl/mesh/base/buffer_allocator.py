@@ -0,0 +1,98 @@
+import bisect
+from typing import List, Optional
+
+
+class BufferAllocator:
+    def __init__(self, capacity: int = 0):
+        """A first fit free-list allocator for sub-allocating ranges of a fixed size buffer.
+        This only does the bookkeeping. The caller is responsible for writing the data.
+        Units are whatever the caller uses (eg vertices).
+        :param capacity: The size of the buffer being allocated from.
+        """
+        self._capacity = 0
+        self._used = 0
+        self._free_offsets: List[int] = []  # the start of each free block. Sorted.
+        self._free_sizes: List[int] = []  # the size of each free block
+        self.reset(capacity)
+
+    @property
+    def capacity(self) -> int:
+        """The size of the buffer being allocated from."""
+        return self._capacity
+
+    @property
+    def used(self) -> int:
+        """The total size of all allocated ranges."""
+        return self._used
+
+    @property
+    def high_water(self) -> int:
+        """The end of the last allocated range. Nothing past this needs drawing."""
+        if self._free_offsets and self._free_offsets[-1] + self._free_sizes[-1] == self._capacity:
+            return self._free_offsets[-1]
+        return self._capacity
+
+    @property
+    def fragmentation(self) -> float:
+        """The fraction of the space below high_water that is free. 0 is fully packed."""
+        high_water = self.high_water
+        if high_water == 0:
+            return 0.0
+        return 1 - self._used / high_water
+
+    def reset(self, capacity: int, used: int = 0):
+        """Discard all allocations.
+        :param capacity: The new size of the buffer.
+        :param used: The size of a single range starting at 0 to mark as allocated.
+            Used after the caller has packed the data into the start of the buffer.
+        """
+        assert 0 <= used <= capacity, 'used must be between 0 and capacity'
+        self._capacity = capacity
+        self._used = used
+        if used < capacity:
+            self._free_offsets = [used]
+            self._free_sizes = [capacity - used]
+        else:
+            self._free_offsets = []
+            self._free_sizes = []
+
+    def allocate(self, size: int) -> Optional[int]:
+        """Allocate a range of the buffer.
+        :param size: The size of the range.
+        :return: The offset of the range. None if there is no free block large enough.
+        """
+        if size <= 0:
+            return 0
+        for index, free_size in enumerate(self._free_sizes):
+            if free_size >= size:
+                offset = self._free_offsets[index]
+                if free_size == size:
+                    del self._free_offsets[index]
+                    del self._free_sizes[index]
+                else:
+                    self._free_offsets[index] += size
+                    self._free_sizes[index] -= size
+                self._used += size
+                return offset
+        return None
+
+    def free(self, offset: int, size: int):
+        """Release a range returned by allocate. Adjacent free blocks are merged.
+        :param offset: The offset returned by allocate.
+        :param size: The size passed to allocate.
+        """
+        if size <= 0:
+            return
+        self._used -= size
+        index = bisect.bisect_left(self._free_offsets, offset)
+        # merge with the following block
+        if index < len(self._free_offsets) and self._free_offsets[index] == offset + size:
+            size += self._free_sizes[index]
+            del self._free_offsets[index]
+            del self._free_sizes[index]
+        # merge with the previous block
+        if index > 0 and self._free_offsets[index - 1] + self._free_sizes[index - 1] == offset:
+            self._free_sizes[index - 1] += size
+        else:
+            self._free_offsets.insert(index, offset)
+            self._free_sizes.insert(index, size)
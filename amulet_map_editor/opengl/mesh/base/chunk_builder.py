@@ -1,9 +1,14 @@
 import numpy
-from typing import Tuple, Dict, List
+from typing import Tuple, Dict, List, Optional, Any, Callable
+import weakref
 
 import minecraft_model_reader
 
 from amulet_map_editor.opengl.mesh import new_empty_verts, TriMesh
+from amulet_map_editor.opengl.occlusion import section_visibility
+
+SubChunkType = Tuple[numpy.ndarray, numpy.ndarray, Tuple[int, int, int]]  # larger blocks, unique blocks, offset
+ModelTemplateType = Dict[Optional[str], numpy.ndarray]  # cull direction: vertex table of the model in model space
 
 _brightness_step = 0.15
 _brightness_multiplier = {
@@ -16,9 +21,182 @@ _brightness_multiplier = {
     'down': (1-_brightness_step*3,)*3,
 }
 
+# cull direction: (normal axis, side of the block the face is on)
+_face_axes = {
+    'down': (1, 0),
+    'up': (1, 1),
+    'north': (2, 0),
+    'south': (2, 1),
+    'west': (0, 0),
+    'east': (0, 1),
+}
+
+# The faces of the low detail height map. cull direction: (corners of the unit square (4, 3), the axis each texture coord follows)
+_lod1_faces = {
+    'up': (numpy.array([(0, 1, 0), (0, 1, 1), (1, 1, 1), (1, 1, 0)]), [0, 2]),
+    'north': (numpy.array([(1, 1, 0), (1, 0, 0), (0, 0, 0), (0, 1, 0)]), [0, 1]),
+    'south': (numpy.array([(0, 1, 1), (0, 0, 1), (1, 0, 1), (1, 1, 1)]), [0, 1]),
+    'west': (numpy.array([(0, 1, 0), (0, 0, 0), (0, 0, 1), (0, 1, 1)]), [2, 1]),
+    'east': (numpy.array([(1, 1, 1), (1, 0, 1), (1, 0, 0), (1, 1, 0)]), [2, 1]),
+}
+# the neighbouring cell of each wall in the height map (dx, dz)
+_lod1_wall_offsets = {
+    'north': (0, -1),
+    'south': (0, 1),
+    'west': (-1, 0),
+    'east': (1, 0),
+}
+_quad_uv = numpy.array([(0, 0), (0, 1), (1, 1), (1, 0)])
+_quad_triangles = numpy.array([0, 1, 2, 0, 2, 3])
+
+# vertices (6, 3), texture coords (6, 2), the axis each texture coord follows (2,), texture, tint (3,)
+GreedyFaceType = Tuple[numpy.ndarray, numpy.ndarray, numpy.ndarray, Any, numpy.ndarray]
+_greedy_faces: "weakref.WeakKeyDictionary[minecraft_model_reader.MinecraftMesh, Optional[Dict[str, GreedyFaceType]]]" = weakref.WeakKeyDictionary()
+
+
+def get_greedy_faces(model: minecraft_model_reader.MinecraftMesh) -> Optional[Dict[str, GreedyFaceType]]:
+    """Get the data needed to merge the faces of a model with the same faces of neighbouring blocks.
+    :return: None if the model is not a full opaque cube with one texture per face.
+        Otherwise a dictionary mapping cull direction to the face data."""
+    if model not in _greedy_faces:
+        _greedy_faces[model] = _create_greedy_faces(model)
+    return _greedy_faces[model]
+
+
+def _create_greedy_faces(model: minecraft_model_reader.MinecraftMesh) -> Optional[Dict[str, GreedyFaceType]]:
+    if model.is_transparent != 0 or set(model.faces.keys()) != set(_face_axes.keys()):
+        return None
+    greedy_faces = {}
+    for cull_dir, (normal_axis, side) in _face_axes.items():
+        faces = model.faces[cull_dir]
+        texture_index = model.texture_index[cull_dir]
+        if faces.size != 6 or texture_index[0] != texture_index[1]:
+            return None
+        plane_axes = [axis for axis in range(3) if axis != normal_axis]
+        verts = model.verts[cull_dir].reshape((-1, 3))[faces]
+        tverts = model.texture_coords[cull_dir].reshape((-1, 2))[faces]
+        tint = model.tint_verts[cull_dir].reshape((-1, 3))[faces]
+        corners = verts[:, plane_axes]
+        shared_corners = numpy.array([corner for corner in corners[:3] if any(numpy.array_equal(corner, c) for c in corners[3:])])
+        if not (
+            numpy.all(verts[:, normal_axis] == side)
+            and numpy.all(numpy.logical_or(corners == 0, corners == 1))
+            and len(numpy.unique(corners, axis=0)) == 4
+            # the two triangles must meet on the diagonal of the square
+            and len(shared_corners) == 2 and numpy.all(shared_corners[0] != shared_corners[1])
+            and numpy.all(tint == tint[0])
+        ):
+            return None
+        # each texture coordinate must map the full texture along one of the axes
+        # so that it can be scaled up by the size of the merged face.
+        uv_axes = []
+        for uv in tverts.T:
+            uv_axis = next(
+                (
+                    axis for axis in plane_axes if
+                    numpy.array_equal(uv, verts[:, axis]) or numpy.array_equal(uv, 1 - verts[:, axis])
+                ),
+                None
+            )
+            if uv_axis is None:
+                return None
+            uv_axes.append(uv_axis)
+        if uv_axes[0] == uv_axes[1]:
+            return None
+        greedy_faces[cull_dir] = (verts, tverts, numpy.array(uv_axes), model.textures[texture_index[0]], tint[0])
+    return greedy_faces
+
+
+def greedy_quads(keys: numpy.ndarray, normal_axis: int) -> Tuple[numpy.ndarray, numpy.ndarray, numpy.ndarray]:
+    """Merge neighbouring faces with the same key into rectangles.
+    Faces are merged into runs along one axis and runs of the same size are then merged along the other axis.
+    :param keys: 3D int array. 0 for no face. Faces with the same key can be merged.
+    :param normal_axis: The axis the faces are pointing along. Faces are only merged along the other two axes.
+    :return: The minimum location of each rectangle (n, 3), the size of each rectangle (n, 3), the key of each rectangle (n,)
+    """
+    plane_axes = [axis for axis in range(3) if axis != normal_axis]
+    # the normal axis goes first. Runs are found along the last axis and merged along the middle axis.
+    keys = keys.transpose((normal_axis, *plane_axes))
+    previous_keys = numpy.zeros_like(keys)
+    previous_keys[:, :, 1:] = keys[:, :, :-1]
+    next_keys = numpy.zeros_like(keys)
+    next_keys[:, :, :-1] = keys[:, :, 1:]
+    run_starts = numpy.argwhere(numpy.logical_and(keys != 0, keys != previous_keys))
+    run_ends = numpy.argwhere(numpy.logical_and(keys != 0, keys != next_keys))
+    run_keys = keys[tuple(run_starts.T)]
+    run_lengths = run_ends[:, 2] - run_starts[:, 2] + 1
+
+    # sort the runs so that runs that can be merged are next to each other
+    n, a, b = run_starts.T
+    order = numpy.lexsort((a, run_keys, run_lengths, b, n))
+    n, a, b, run_lengths, run_keys = n[order], a[order], b[order], run_lengths[order], run_keys[order]
+    new_quad = numpy.ones(len(n), dtype=numpy.bool_)
+    new_quad[1:] = (
+        (n[1:] != n[:-1])
+        | (b[1:] != b[:-1])
+        | (run_lengths[1:] != run_lengths[:-1])
+        | (run_keys[1:] != run_keys[:-1])
+        | (a[1:] != a[:-1] + 1)
+    )
+    quad_starts = numpy.flatnonzero(new_quad)
+    quad_widths = numpy.diff(numpy.append(quad_starts, len(n)))
+
+    locations = numpy.stack((n, a, b), 1)[quad_starts]
+    sizes = numpy.stack((numpy.ones(len(quad_starts), dtype=quad_widths.dtype), quad_widths, run_lengths[quad_starts]), 1)
+    # back into x, y, z order
+    axis_order = numpy.argsort((normal_axis, *plane_axes))
+    return locations[:, axis_order], sizes[:, axis_order], run_keys[quad_starts]
+
+
+def model_face_texture(model: minecraft_model_reader.MinecraftMesh, cull_dir: Optional[str]) -> Optional[Tuple[Any, numpy.ndarray]]:
+    """Get the texture and tint that best represent one side of a model.
+    If the model does not have a face in that direction another face is used.
+    :return: The texture and tint (3,). None if the model has no faces."""
+    for cull_dir_ in (cull_dir, None, 'up', *model.faces):
+        if cull_dir_ in model.faces and model.texture_index[cull_dir_].size:
+            return model.textures[model.texture_index[cull_dir_][0]], model.tint_verts[cull_dir_].reshape((-1, 3))[0]
+    return None
+
+
+def create_model_template(
+    model: minecraft_model_reader.MinecraftMesh,
+    texture_bounds: Callable[[Any], Tuple[float, float, float, float]]
+) -> ModelTemplateType:
+    """Create the vertex table of each cull direction of a model.
+    The texture bounds and the shaded tint are filled in so the table only needs the block position adding to it.
+    :param model: The model to create the template for
+    :param texture_bounds: A function to get the texture bounds of a texture
+    :return: A dictionary mapping cull direction to a float32 array of shape (vertex count, TriMesh._vert_len)
+    """
+    template = {}
+    for cull_dir in model.faces.keys():
+        if cull_dir not in _brightness_multiplier:
+            continue
+        # the vertices in model space
+        verts = model.verts[cull_dir].reshape((-1, 3))
+        tverts = model.texture_coords[cull_dir].reshape((-1, 2))
+        faces = model.faces[cull_dir]
+
+        vert_table = numpy.zeros((faces.size, TriMesh._vert_len), dtype=numpy.float32)
+        vert_table[:, :3] = verts[faces]
+        vert_table[:, 3:5] = tverts[faces]
+        # one texture per triangle
+        tex_bounds = numpy.array(
+            [texture_bounds(model.textures[texture_index]) for texture_index in model.texture_index[cull_dir]],
+            dtype=numpy.float32
+        ).reshape((-1, 4))
+        tex_bounds = numpy.repeat(tex_bounds, 3, 0)[:faces.size]
+        vert_table[:len(tex_bounds), 5:9] = tex_bounds
+        vert_table[:, 9:12] = model.tint_verts[cull_dir].reshape((-1, 3))[faces] * _brightness_multiplier[cull_dir]
+        template[cull_dir] = vert_table
+    return template
+
 
 class RenderChunkBuilder(TriMesh):
     """A class to define the logic to generate geometry from a block array"""
+    # the geometry is created in the TriMesh layout and packed by _pack_verts if the storage layout is different
+    _table_vert_len = TriMesh._vert_len
+    _lod1_scale = 2  # the width in blocks of each cell of the low detail height map
 
     def _get_model(self, block_temp_id: int) -> minecraft_model_reader.MinecraftMesh:
         raise NotImplementedError
@@ -26,10 +204,20 @@ class RenderChunkBuilder(TriMesh):
     def _texture_bounds(self, texture):
         raise NotImplementedError
 
+    def _get_model_template(self, block_temp_id: int) -> ModelTemplateType:
+        """Get the vertex template of a block model.
+        Subclasses should override this to use a cached template."""
+        return create_model_template(self._get_model(block_temp_id), self._texture_bounds)
+
     @property
     def offset(self) -> numpy.ndarray:
         raise NotImplementedError
 
+    @property
+    def greedy_meshing(self) -> bool:
+        """Should the faces of full opaque blocks be merged into larger faces."""
+        return False
+
     def _get_block_data(self, blocks: numpy.ndarray) -> Tuple[numpy.ndarray, numpy.ndarray]:
         """Given a Chunk object will return the chunk arrays needed to generate geometry
         :returns: block array of the chunk, block array one block larger than the chunk, array of unique blocks"""
@@ -41,20 +229,26 @@ class RenderChunkBuilder(TriMesh):
     def create_geometry(self):
         raise NotImplementedError
 
-    def _set_verts(self, chunk_verts: List[numpy.ndarray], chunk_verts_translucent: List[numpy.ndarray]):
+    def _join_verts(self, chunk_verts: List[numpy.ndarray], chunk_verts_translucent: List[numpy.ndarray]) -> Tuple[numpy.ndarray, int]:
+        """Join and pack the vertex arrays created by _create_lod0_array.
+        :return: The vertex array, the offset into the vertex array of the translucent geometry"""
         if chunk_verts:
-            self.verts = numpy.concatenate(chunk_verts, 0)
-            self.verts_translucent = self.verts.size
+            verts = self._pack_verts(numpy.concatenate(chunk_verts, 0))
         else:
-            self.verts = new_empty_verts()
+            verts = new_empty_verts()
+        verts_translucent = verts.size
 
         if chunk_verts_translucent:
-            chunk_verts_translucent.insert(0, self.verts)
-            self.verts = numpy.concatenate(chunk_verts_translucent, 0)
+            verts = numpy.concatenate(
+                [verts, self._pack_verts(numpy.concatenate(chunk_verts_translucent, 0))], 0
+            )
+        return verts, verts_translucent
 
+    def _set_verts(self, chunk_verts: List[numpy.ndarray], chunk_verts_translucent: List[numpy.ndarray]):
+        self.verts, self.verts_translucent = self._join_verts(chunk_verts, chunk_verts_translucent)
         self.draw_count = int(self.verts.size // self._vert_len)
 
-    def _create_lod0_multi(self, blocks: List[Tuple[numpy.ndarray, numpy.ndarray, Tuple[int, int, int]]]):
+    def _create_lod0_multi(self, blocks: List[SubChunkType]):
         chunk_verts = []
         chunk_verts_translucent = []
         for larger_blocks, unique_blocks, offset in blocks:
@@ -63,6 +257,22 @@ class RenderChunkBuilder(TriMesh):
             chunk_verts_translucent += chunk_verts_translucent_
         self._set_verts(chunk_verts, chunk_verts_translucent)
 
+    def _create_lod0_section(self, larger_blocks: numpy.ndarray, unique_blocks: numpy.ndarray, offset: Tuple[int, int, int]) -> Tuple[numpy.ndarray, int, int]:
+        """Create the geometry for one sub-chunk.
+        :return: The vertex array, the offset into the vertex array of the translucent geometry
+            and the face connectivity of the sub-chunk from occlusion.section_visibility"""
+        return (
+            *self._join_verts(
+                *self._create_lod0_array(larger_blocks, unique_blocks, offset)
+            ),
+            self._section_visibility(larger_blocks, unique_blocks)
+        )
+
+    def _section_visibility(self, larger_blocks: numpy.ndarray, unique_blocks: numpy.ndarray) -> int:
+        """Find which faces of a sub-chunk can see each other through the blocks that are not full opaque cubes."""
+        opaque_lut = numpy.array([self._get_model(block_temp_id).is_transparent == 0 for block_temp_id in unique_blocks], dtype=numpy.bool_)
+        return section_visibility(opaque_lut[numpy.searchsorted(unique_blocks, larger_blocks[1:-1, 1:-1, 1:-1])])
+
     def _create_lod0(self, larger_blocks: numpy.ndarray, unique_blocks: numpy.ndarray):
         self._set_verts(
             *self._create_lod0_array(larger_blocks, unique_blocks)
@@ -72,11 +282,15 @@ class RenderChunkBuilder(TriMesh):
         """Create a numpy array for opaque geometry and a numpy array for """
         offset = offset or (0, 0, 0)
         blocks = larger_blocks[1:-1, 1:-1, 1:-1]
-        transparent_array = numpy.zeros(larger_blocks.shape, dtype=numpy.uint8)
+        # unique_blocks is sorted so the index of each block in unique_blocks can be found with a binary search.
+        # Everything about a block is then looked up from tables indexed by this rather than comparing the whole array for each block.
+        palette_index = numpy.searchsorted(unique_blocks, larger_blocks)
         models: Dict[int, minecraft_model_reader.MinecraftMesh] = {}
-        for block_temp_id in unique_blocks:
+        transparent_lut = numpy.zeros(len(unique_blocks), dtype=numpy.uint8)
+        for index, block_temp_id in enumerate(unique_blocks):
             model = models[block_temp_id] = self._get_model(block_temp_id)
-            transparent_array[larger_blocks == block_temp_id] = model.is_transparent
+            transparent_lut[index] = model.is_transparent
+        transparent_array = transparent_lut[palette_index]
 
         def get_transparent_array(offset_transparent_array, transparent_array_):
             return numpy.logical_and(
@@ -106,50 +320,51 @@ class RenderChunkBuilder(TriMesh):
         chunk_verts = []
         chunk_verts_translucent = []
 
-        for block_temp_id, model in models.items():
+        if self.greedy_meshing:
+            greedy_models = {}
+            for block_temp_id, model in models.items():
+                greedy_faces = get_greedy_faces(model)
+                if greedy_faces is not None:
+                    greedy_models[block_temp_id] = greedy_faces
+            if greedy_models:
+                chunk_verts += self._create_greedy_array(blocks, greedy_models, show_map, offset)
+                models = {block_temp_id: model for block_temp_id, model in models.items() if block_temp_id not in greedy_models}
+
+        # group the block positions by block with one sort.
+        # The sort is stable so the positions of each block are in the same order numpy.argwhere would give.
+        block_palette_index = palette_index[1:-1, 1:-1, 1:-1].ravel()
+        block_order = numpy.argsort(block_palette_index, kind='stable')
+        block_order_locations = numpy.stack(numpy.unravel_index(block_order, blocks.shape), axis=1)
+        block_ends = numpy.cumsum(numpy.bincount(block_palette_index, minlength=len(unique_blocks)))
+        flat_show_map = {cull_dir: show.ravel() for cull_dir, show in show_map.items()}
+
+        for index, block_temp_id in enumerate(unique_blocks):
             # for each unique blockstate in the chunk
             # get the model and the locations of the blocks
-            model: minecraft_model_reader.MinecraftMesh
-            all_block_locations = numpy.argwhere(blocks == block_temp_id)
-            if not all_block_locations.size:
+            if block_temp_id not in models:
+                continue
+            model: minecraft_model_reader.MinecraftMesh = models[block_temp_id]
+            start = block_ends[index - 1] if index else 0
+            end = block_ends[index]
+            if start == end:
                 continue
-            where = None
-            for cull_dir in model.faces.keys():
+            all_block_locations = block_order_locations[start:end]
+            flat_block_locations = block_order[start:end]
+            for cull_dir, template in self._get_model_template(block_temp_id).items():
                 # iterate through each cull direction
                 # narrow down the blocks to what should be created for that cull direction
                 if cull_dir is None:
                     block_locations = all_block_locations
-                elif cull_dir in show_map:
-                    if where is None:
-                        where = tuple(all_block_locations.T)
-                    block_locations = all_block_locations[show_map[cull_dir][where]]
+                else:
+                    block_locations = all_block_locations[flat_show_map[cull_dir][flat_block_locations]]
                     if not block_locations.size:
                         continue
-                else:
-                    continue
-
-                # the number of blocks and their offsets in chunk space
-                block_count = len(block_locations)
-                block_offsets = block_locations
-
-                # the vertices in model space
-                verts = model.verts[cull_dir].reshape((-1, 3))
-                tverts = model.texture_coords[cull_dir].reshape((-1, 2))
-                faces = model.faces[cull_dir]
 
                 # each slice in the first axis is a new block, each slice in the second is a new vertex
-                vert_table = numpy.zeros((block_count, faces.size, self._vert_len), dtype=numpy.float32)
-                vert_table[:, :, :3] = verts[faces] + block_offsets[:, :].reshape((-1, 1, 3)) + self.offset + offset
-                vert_table[:, :, 3:5] = tverts[faces]
-
-                vert_index = 0
-                for texture_index in model.texture_index[cull_dir]:
-                    tex_bounds = self._texture_bounds(model.textures[texture_index])
-
-                    vert_table[:, vert_index:vert_index+3, 5:9] = tex_bounds
-                    vert_index += 3
-
-                vert_table[:, :, 9:12] = model.tint_verts[cull_dir].reshape((-1, 3))[faces] * _brightness_multiplier[cull_dir]
+                vert_table = numpy.empty((len(block_locations), template.shape[0], self._table_vert_len), dtype=numpy.float32)
+                vert_table[:] = template
+                # move the model to the block position in chunk space
+                vert_table[:, :, :3] += (block_locations + self.offset + offset).reshape((-1, 1, 3))
 
                 if model.is_transparent == 1:
                     chunk_verts_translucent.append(vert_table.ravel())
@@ -157,3 +372,135 @@ class RenderChunkBuilder(TriMesh):
                     chunk_verts.append(vert_table.ravel())
 
         return chunk_verts, chunk_verts_translucent
+
+    def _create_greedy_array(
+        self,
+        blocks: numpy.ndarray,
+        greedy_models: Dict[int, Dict[str, GreedyFaceType]],
+        show_map: Dict[str, numpy.ndarray],
+        offset: Tuple[int, int, int]
+    ) -> List[numpy.ndarray]:
+        """Create the geometry for the blocks that are full opaque cubes.
+        Visible faces next to each other with the same texture and tint are merged into one larger face.
+        The texture is repeated across the larger face by the shader."""
+        greedy_ids = numpy.array(sorted(greedy_models), dtype=blocks.dtype)
+        # index into greedy_ids + 1 for each block. 0 for blocks that are not in greedy_ids
+        lut_index = numpy.searchsorted(greedy_ids, blocks)
+        lut_index[lut_index == len(greedy_ids)] = 0
+        is_greedy = greedy_ids[lut_index] == blocks
+        lut_index += 1
+        lut_index[numpy.logical_not(is_greedy)] = 0
+
+        chunk_verts = []
+        for cull_dir, (normal_axis, _) in _face_axes.items():
+            # faces with the same geometry, texture and tint get the same key and can be merged.
+            face_keys: Dict[Any, int] = {}
+            key_faces: List[Optional[GreedyFaceType]] = [None]
+            key_lut = numpy.zeros(len(greedy_ids) + 1, dtype=numpy.uint32)
+            for index, block_temp_id in enumerate(greedy_ids):
+                face = greedy_models[block_temp_id][cull_dir]
+                face_verts, face_tverts, _, texture, tint = face
+                face_key = (face_verts.tobytes(), face_tverts.tobytes(), texture, tint.tobytes())
+                if face_key not in face_keys:
+                    face_keys[face_key] = len(key_faces)
+                    key_faces.append(face)
+                key_lut[index + 1] = face_keys[face_key]
+
+            keys = key_lut[lut_index] * show_map[cull_dir]
+            if not keys.any():
+                continue
+            quad_locations, quad_sizes, quad_keys = greedy_quads(keys, normal_axis)
+
+            for key in numpy.unique(quad_keys):
+                face_verts, face_tverts, uv_axes, texture, tint = key_faces[key]
+                key_mask = quad_keys == key
+                locations = quad_locations[key_mask]
+                sizes = quad_sizes[key_mask]
+                vert_table = numpy.zeros((len(locations), face_verts.shape[0], self._table_vert_len), dtype=numpy.float32)
+                vert_table[:, :, :3] = face_verts * sizes[:, numpy.newaxis, :] + locations[:, numpy.newaxis, :] + self.offset + offset
+                vert_table[:, :, 3:5] = face_tverts * sizes[:, numpy.newaxis, uv_axes]
+                vert_table[:, :, 5:9] = self._texture_bounds(texture)
+                vert_table[:, :, 9:12] = tint * _brightness_multiplier[cull_dir]
+                chunk_verts.append(vert_table.ravel())
+
+        return chunk_verts
+
+    def _create_lod1_array(self, heights: numpy.ndarray, top_blocks: numpy.ndarray, exists: numpy.ndarray) -> List[numpy.ndarray]:
+        """Create a low detail mesh of the top surface of a chunk.
+        Columns are grouped into cells _lod1_scale blocks wide which take the height and block of the highest column.
+        The top of each cell is a quad with the top texture of the block. Neighbouring tops with the same height and block are merged.
+        Walls are added down to the height of lower neighbouring cells. Cells at the edge of the chunk or next
+        to empty cells have walls down to the top of the lowest cell in the chunk so gaps to neighbouring chunks are hidden.
+        :param heights: The y coordinate of the highest block in each column. Shape (16, 16) in x, z order
+        :param top_blocks: The block id of the highest block in each column. Shape (16, 16)
+        :param exists: If each column contains a block. Shape (16, 16)
+        :return: A list of opaque vertex arrays
+        """
+        if not exists.any():
+            return []
+        scale = self._lod1_scale
+        size_x, size_z = heights.shape[0] // scale, heights.shape[1] // scale
+
+        def to_cells(array: numpy.ndarray) -> numpy.ndarray:
+            return array.reshape((size_x, scale, size_z, scale)).transpose((0, 2, 1, 3)).reshape((size_x, size_z, scale * scale))
+
+        column_heights = to_cells(numpy.where(exists, heights, int(heights[exists].min()) - 1))
+        highest = numpy.argmax(column_heights, axis=2)[:, :, numpy.newaxis]
+        cell_heights = numpy.take_along_axis(column_heights, highest, 2)[:, :, 0]
+        cell_blocks = numpy.take_along_axis(to_cells(top_blocks), highest, 2)[:, :, 0]
+        cell_exists = to_cells(exists).any(axis=2)
+
+        chunk_verts = []
+        # the tops. Cells with the same height and block get the same key so they can be merged.
+        cell_keys = numpy.stack((cell_heights, cell_blocks), axis=2)[cell_exists]
+        unique_keys, key_index = numpy.unique(cell_keys, axis=0, return_inverse=True)
+        keys = numpy.zeros((size_x, 1, size_z), dtype=numpy.uint32)
+        keys[:, 0, :][cell_exists] = key_index.ravel() + 1
+        quad_locations, quad_sizes, quad_keys = greedy_quads(keys, 1)
+        quad_keys = unique_keys[quad_keys - 1]
+        quad_locations = quad_locations * scale
+        quad_locations[:, 1] = quad_keys[:, 0]
+        quad_sizes[:, [0, 2]] *= scale
+        chunk_verts += self._create_lod1_quads('up', quad_locations, quad_sizes, quad_keys[:, 1])
+
+        # the walls
+        floor = cell_heights[cell_exists].min()
+        padded_heights = numpy.full((size_x + 2, size_z + 2), floor, dtype=cell_heights.dtype)
+        padded_heights[1:-1, 1:-1][cell_exists] = cell_heights[cell_exists]
+        for cull_dir, (dx, dz) in _lod1_wall_offsets.items():
+            neighbour_heights = padded_heights[1 + dx:size_x + 1 + dx, 1 + dz:size_z + 1 + dz]
+            wall_mask = numpy.logical_and(cell_exists, cell_heights > neighbour_heights)
+            if not wall_mask.any():
+                continue
+            cell_x, cell_z = numpy.nonzero(wall_mask)
+            bottoms = neighbour_heights[wall_mask] + 1
+            locations = numpy.stack((cell_x * scale, bottoms, cell_z * scale), axis=1)
+            sizes = numpy.stack((numpy.full(len(bottoms), scale), cell_heights[wall_mask] + 1 - bottoms, numpy.full(len(bottoms), scale)), axis=1)
+            chunk_verts += self._create_lod1_quads(cull_dir, locations, sizes, cell_blocks[wall_mask])
+        return chunk_verts
+
+    def _create_lod1_quads(self, cull_dir: str, locations: numpy.ndarray, sizes: numpy.ndarray, block_ids: numpy.ndarray) -> List[numpy.ndarray]:
+        """Create the geometry of height map quads.
+        :param cull_dir: The direction the quads face
+        :param locations: The minimum point of the box each quad is a side of (n, 3)
+        :param sizes: The size of the box each quad is a side of (n, 3)
+        :param block_ids: The block the texture of each quad comes from (n,)
+        :return: A list of vertex arrays
+        """
+        corners, uv_axes = _lod1_faces[cull_dir]
+        chunk_verts = []
+        for block_temp_id in numpy.unique(block_ids):
+            face = model_face_texture(self._get_model(block_temp_id), cull_dir)
+            if face is None:
+                continue
+            texture, tint = face
+            block_mask = block_ids == block_temp_id
+            block_sizes = sizes[block_mask][:, numpy.newaxis, :]
+            vert_table = numpy.zeros((numpy.count_nonzero(block_mask), 6, self._table_vert_len), dtype=numpy.float32)
+            vert_table[:, :, :3] = corners[_quad_triangles] * block_sizes + locations[block_mask][:, numpy.newaxis, :] + self.offset
+            # the texture is repeated across the quad by the shader
+            vert_table[:, :, 3:5] = _quad_uv[_quad_triangles] * block_sizes[:, :, uv_axes]
+            vert_table[:, :, 5:9] = self._texture_bounds(texture)
+            vert_table[:, :, 9:12] = tint * _brightness_multiplier[cull_dir]
+            chunk_verts.append(vert_table.ravel())
+        return chunk_verts
@@ -0,0 +1,103 @@
+from OpenGL.GL import *
+import numpy
+from typing import Dict, Tuple
+
+from amulet_map_editor.opengl.mesh.base.tri_mesh import TriMesh
+from amulet_map_editor.opengl.shaders import ShaderNameType
+
+# The layout of each vertex in the compact format (16 bytes compared to 48 bytes in the TriMesh format)
+compact_vertex_dtype = numpy.dtype([
+    ('position', numpy.int16, 3),  # fixed point position. Divided by _position_scale in the shader.
+    ('texture_index', numpy.uint16),  # index into the texture bounds buffer
+    ('texture_coords', numpy.float16, 2),
+    ('tint', numpy.uint8, 4),  # tint value (also shading). The fourth value is padding.
+])
+_position_scale = 64  # must match render_chunk_compact.vert
+_position_limits = numpy.iinfo(numpy.int16)
+# the largest region size in chunks whose positions can be stored in the compact format
+max_region_size = _position_limits.max // _position_scale // 16
+
+_texture_bounds_buffers: Dict[str, Tuple[int, int]] = {}  # context identifier: (buffer, texture)
+
+
+class PositionRangeError(ValueError):
+    """Raised when a vertex position is outside the range that the compact vertex format can store."""
+    pass
+
+
+def pack_verts(verts: numpy.ndarray) -> numpy.ndarray:
+    """Pack a flat vertex table in the TriMesh layout into the compact layout.
+    The first texture bounds value must be the index of the texture in the texture bounds buffer.
+    Positions must be within +-512 and tints between 0 and 1.
+    :return: A flat float32 view of the packed data. The values are not meaningful as floats but the
+        array can be concatenated and sized in the same way as the TriMesh layout.
+    :raises PositionRangeError: If a position is outside the range the compact format can store."""
+    table = verts.reshape((-1, TriMesh._vert_len))
+    positions = numpy.round(table[:, :3] * _position_scale)
+    if positions.size and (positions.min() < _position_limits.min or positions.max() > _position_limits.max):
+        raise PositionRangeError(
+            f'Vertex positions must be between {_position_limits.min / _position_scale} and '
+            f'{_position_limits.max / _position_scale} to be stored in the compact vertex format. '
+            f'Found {positions.min() / _position_scale} to {positions.max() / _position_scale}'
+        )
+    packed = numpy.zeros(table.shape[0], dtype=compact_vertex_dtype)
+    packed['position'] = positions
+    packed['texture_index'] = table[:, 5]
+    packed['texture_coords'] = table[:, 3:5]
+    packed['tint'][:, :3] = numpy.round(numpy.clip(table[:, 9:12], 0, 1) * 255)
+    return packed.view(numpy.float32)
+
+
+def set_texture_bounds(context_identifier: str, texture_bounds: numpy.ndarray):
+    """Upload the texture bounds for a context.
+    Must be called from the thread with the context.
+    :param context_identifier: The identifier of the context
+    :param texture_bounds: float32 array of shape (texture_count, 4)"""
+    if context_identifier not in _texture_bounds_buffers:
+        _texture_bounds_buffers[context_identifier] = glGenBuffers(1), glGenTextures(1)
+    buffer, texture = _texture_bounds_buffers[context_identifier]
+    texture_bounds = numpy.ascontiguousarray(texture_bounds, dtype=numpy.float32)
+    glBindBuffer(GL_TEXTURE_BUFFER, buffer)
+    glBufferData(GL_TEXTURE_BUFFER, texture_bounds.nbytes, texture_bounds, GL_STATIC_DRAW)
+    glBindBuffer(GL_TEXTURE_BUFFER, 0)
+    glBindTexture(GL_TEXTURE_BUFFER, texture)
+    glTexBuffer(GL_TEXTURE_BUFFER, GL_RGBA32F, buffer)
+    glBindTexture(GL_TEXTURE_BUFFER, 0)
+
+
+def unload_texture_bounds(context_identifier: str):
+    """Delete the texture bounds for a context."""
+    if context_identifier in _texture_bounds_buffers:
+        buffer, texture = _texture_bounds_buffers.pop(context_identifier)
+        glDeleteTextures([texture])
+        glDeleteBuffers(1, [buffer])
+
+
+class CompactTriMesh(TriMesh):
+    """A TriMesh that stores the vertices in the compact format.
+    The texture bounds are looked up in the shader from a texture buffer set with set_texture_bounds."""
+    _vert_len = compact_vertex_dtype.itemsize // 4
+
+    @property
+    def shader_name(self) -> ShaderNameType:
+        return 'render_chunk_compact', 'render_chunk'
+
+    def _pack_verts(self, verts: numpy.ndarray) -> numpy.ndarray:
+        return pack_verts(verts)
+
+    def _setup_opengl_attrs(self):
+        stride = compact_vertex_dtype.itemsize
+        fields = compact_vertex_dtype.fields
+        glVertexAttribPointer(0, 3, GL_SHORT, GL_FALSE, stride, ctypes.c_void_p(fields['position'][1]))
+        glEnableVertexAttribArray(0)
+        glVertexAttribPointer(1, 2, GL_HALF_FLOAT, GL_FALSE, stride, ctypes.c_void_p(fields['texture_coords'][1]))
+        glEnableVertexAttribArray(1)
+        glVertexAttribIPointer(2, 1, GL_UNSIGNED_SHORT, stride, ctypes.c_void_p(fields['texture_index'][1]))
+        glEnableVertexAttribArray(2)
+        glVertexAttribPointer(3, 3, GL_UNSIGNED_BYTE, GL_TRUE, stride, ctypes.c_void_p(fields['tint'][1]))
+        glEnableVertexAttribArray(3)
+
+    def _draw(self, transformation_matrix: numpy.ndarray):
+        glActiveTexture(GL_TEXTURE1)
+        glBindTexture(GL_TEXTURE_BUFFER, _texture_bounds_buffers[self.context_identifier][1])
+        super()._draw(transformation_matrix)
@@ -0,0 +1,75 @@
+from OpenGL.GL import *
+import numpy
+
+from amulet_map_editor.opengl.mesh.base.tri_mesh import TriMesh
+from amulet_map_editor.opengl.shaders import ShaderNameType
+
+_instance_location = 4  # the first attribute location of the instance transform. A mat4 uses four locations.
+
+
+class InstancedTriMesh(TriMesh):
+    """A TriMesh that is drawn once for each of a list of transforms with one draw call.
+    The vertices are uploaded once and each copy is transformed by its instance transform before the camera transform.
+    The transforms are in the same row vector layout as the transformation matrix."""
+
+    def __init__(self, context_identifier: str, texture: int):
+        super().__init__(context_identifier, texture)
+        self._instance_vbo = None  # the buffer of instance transforms
+        self._instance_transforms = numpy.zeros((0, 4, 4), dtype=numpy.float32)
+        self._instances_changed = True  # do the instance transforms need uploading
+
+    @property
+    def shader_name(self) -> ShaderNameType:
+        return 'render_chunk_instanced', 'render_chunk'
+
+    @property
+    def instance_count(self) -> int:
+        return len(self._instance_transforms)
+
+    @property
+    def instance_transforms(self) -> numpy.ndarray:
+        """The transform of each copy of the mesh. Shape (n, 4, 4)"""
+        return self._instance_transforms
+
+    @instance_transforms.setter
+    def instance_transforms(self, instance_transforms: numpy.ndarray):
+        instance_transforms = numpy.ascontiguousarray(instance_transforms, dtype=numpy.float32).reshape((-1, 4, 4))
+        if not numpy.array_equal(instance_transforms, self._instance_transforms):
+            self._instance_transforms = instance_transforms
+            self._instances_changed = True
+
+    def _setup_opengl_attrs(self):
+        super()._setup_opengl_attrs()
+        self._instance_vbo = glGenBuffers(1)
+        glBindBuffer(GL_ARRAY_BUFFER, self._instance_vbo)
+        for row in range(4):
+            location = _instance_location + row
+            glVertexAttribPointer(location, 4, GL_FLOAT, GL_FALSE, 64, ctypes.c_void_p(row * 16))
+            glEnableVertexAttribArray(location)
+            glVertexAttribDivisor(location, 1)
+        # the vertex buffer is expected to be bound after this
+        glBindBuffer(GL_ARRAY_BUFFER, self._vbo)
+        self._instances_changed = True
+
+    def _upload_instances(self):
+        glBindBuffer(GL_ARRAY_BUFFER, self._instance_vbo)
+        glBufferData(GL_ARRAY_BUFFER, self._instance_transforms.nbytes, self._instance_transforms, GL_DYNAMIC_DRAW)
+        glBindBuffer(GL_ARRAY_BUFFER, 0)
+        self._instances_changed = False
+
+    def unload(self):
+        super().unload()
+        if self._instance_vbo is not None:
+            glDeleteBuffers(1, [self._instance_vbo])
+            self._instance_vbo = None
+
+    def draw(self, transformation_matrix: numpy.ndarray):
+        if not self.instance_count or not self.draw_count:
+            return
+        self._setup()
+        if self._instances_changed:
+            self._upload_instances()
+        self._draw(transformation_matrix)
+
+    def _draw_arrays(self):
+        glDrawArraysInstanced(self.draw_mode, self.draw_start, self.draw_count, self.instance_count)
@@ -0,0 +1,86 @@
+"""Functions to generate chunk geometry in a worker process.
+The world, palette and resource pack cannot be sent to another process so the
+caller resolves the block models and sends them along with the block arrays."""
+
+import numpy
+from typing import Tuple, Dict, List, Any
+
+import minecraft_model_reader
+
+from amulet_map_editor.opengl.mesh.base.chunk_builder import RenderChunkBuilder, SubChunkType, ModelTemplateType
+from amulet_map_editor.opengl.mesh.base.compact_tri_mesh import pack_verts
+
+_texture_bounds: Dict[Any, Tuple[float, float, float, float]] = {}
+_texture_index: Dict[Any, int] = {}
+# The block ids are only valid for one world and resource pack.
+# The process pool is recreated when either changes so these can be cached for the life of the process.
+_model_templates: Dict[Tuple[int, bool], ModelTemplateType] = {}
+
+
+def init_worker(texture_bounds: Dict[Any, Tuple[float, float, float, float]]):
+    """Initialiser for the worker processes. Stores the data that is the same for every chunk."""
+    global _texture_bounds, _texture_index
+    _texture_bounds = texture_bounds
+    _model_templates.clear()
+    # this must match ResourcePackManager.get_texture_index
+    _texture_index = {texture: index for index, texture in enumerate(texture_bounds)}
+
+
+class WorkerChunkBuilder(RenderChunkBuilder):
+    """A RenderChunkBuilder that only has access to the data sent to the worker process."""
+    def __init__(self, models: Dict[int, minecraft_model_reader.MinecraftMesh], offset: numpy.ndarray, greedy_meshing: bool, compact_vertices: bool):
+        super().__init__(None, 0)
+        self._models = models
+        self._offset = offset
+        self._greedy_meshing = greedy_meshing
+        self._compact_vertices = compact_vertices
+        self.verts_translucent = 0
+
+    def _get_model(self, block_temp_id: int) -> minecraft_model_reader.MinecraftMesh:
+        return self._models[block_temp_id]
+
+    def _texture_bounds(self, texture):
+        if texture not in _texture_bounds:
+            texture = ('minecraft', 'missing_no')
+        if self._compact_vertices:
+            return _texture_index[texture], 0, 0, 0
+        return _texture_bounds[texture]
+
+    def _get_model_template(self, block_temp_id: int) -> ModelTemplateType:
+        key = (block_temp_id, self._compact_vertices)
+        if key not in _model_templates:
+            _model_templates[key] = super()._get_model_template(block_temp_id)
+        return _model_templates[key]
+
+    def _pack_verts(self, verts: numpy.ndarray) -> numpy.ndarray:
+        if self._compact_vertices:
+            return pack_verts(verts)
+        return verts
+
+    @property
+    def offset(self) -> numpy.ndarray:
+        return self._offset
+
+    @property
+    def greedy_meshing(self) -> bool:
+        return self._greedy_meshing
+
+
+def create_lod0(
+    sub_chunks: List[SubChunkType],
+    models: Dict[int, minecraft_model_reader.MinecraftMesh],
+    offset: numpy.ndarray,
+    greedy_meshing: bool = False,
+    compact_vertices: bool = False
+) -> List[Tuple[numpy.ndarray, int, int]]:
+    """Create the geometry for the given sub-chunks.
+    :param sub_chunks: The sub-chunk data from RenderChunk._sub_chunks
+    :param models: The models for every block id found in the sub-chunks
+    :param offset: The offset of the chunk
+    :param greedy_meshing: Should the faces of full opaque blocks be merged
+    :param compact_vertices: Should the geometry be created in the compact vertex format
+    :return: For each sub-chunk the vertex array, the offset into the vertex array of the translucent geometry
+        and the face connectivity of the sub-chunk
+    """
+    builder = WorkerChunkBuilder(models, offset, greedy_meshing, compact_vertices)
+    return [builder._create_lod0_section(*sub_chunk) for sub_chunk in sub_chunks]
@@ -2,7 +2,7 @@ from OpenGL.GL import *
 from OpenGL.error import GLError
 import numpy
 from amulet_map_editor.opengl.mesh import new_empty_verts
-from amulet_map_editor.opengl.shaders import get_shader
+from amulet_map_editor.opengl.shaders import get_shader, ShaderNameType
 from amulet_map_editor import log
 
 
@@ -46,9 +46,14 @@ class TriMesh(Drawable):
         return GL_TRIANGLES
 
     @property
-    def shader_name(self) -> str:
+    def shader_name(self) -> ShaderNameType:
         return 'render_chunk'
 
+    def _pack_verts(self, verts: numpy.ndarray) -> numpy.ndarray:
+        """Convert a flat vertex table in the layout defined by _vertex_attrs into the layout stored in the VBO.
+        Subclasses with a different storage layout should override this."""
+        return verts
+
     def _setup(self):
         """Setup OpenGL attributes if required"""
         if self._vao is None:  # if the opengl state has not been set
@@ -113,6 +118,10 @@ class TriMesh(Drawable):
         self._setup()
         self._draw(transformation_matrix)
 
+    def _draw_arrays(self):
+        """Issue the draw calls. The shader, vertex array and texture are already bound."""
+        glDrawArrays(self.draw_mode, self.draw_start, self.draw_count)
+
     def _draw(self, transformation_matrix: numpy.ndarray):
         glUseProgram(self._shader)
         glUniformMatrix4fv(self._transform_location, 1, GL_FALSE, transformation_matrix.astype(numpy.float32))
@@ -125,9 +134,9 @@ class TriMesh(Drawable):
             self._setup()
             glBindVertexArray(self._vao)
         glActiveTexture(GL_TEXTURE0)
-        glBindTexture(GL_TEXTURE_2D, self._texture)
+        glBindTexture(GL_TEXTURE_2D_ARRAY, self._texture)
 
-        glDrawArrays(self.draw_mode, self.draw_start, self.draw_count)
+        self._draw_arrays()
 
         glBindVertexArray(0)
         glUseProgram(0)
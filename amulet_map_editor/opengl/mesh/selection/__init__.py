@@ -1,4 +1,5 @@
 from .render_selection import RenderSelection
+from .render_selection_batch import RenderSelectionBatch
 from .render_selection_highlightable import RenderSelectionHighlightable
 from .render_selection_editable import RenderSelectionEditable
 from .render_selection_group import RenderSelectionGroup
@@ -19,6 +19,7 @@ class RenderSelection(TriMesh):
         self._bounds: Optional[numpy.ndarray] = None  # The min and max locations
         self.transformation_matrix = numpy.eye(4, dtype=numpy.float64)
         self._rebuild = True
+        self._geometry_version = 0  # changed every time the geometry needs recreating
         self._volume = 1
 
         self._init_verts(texture_bounds)
@@ -94,6 +95,13 @@ class RenderSelection(TriMesh):
     def _mark_recreate(self):
         self._bounds = None
         self._rebuild = True
+        self._geometry_version += 1
+
+    @property
+    def geometry_version(self) -> int:
+        """A number that changes every time the geometry of the box changes.
+        Used by meshes that draw the box as part of a larger buffer to find out if it needs updating."""
+        return self._geometry_version
 
     @property
     def point1(self) -> numpy.ndarray:
@@ -170,6 +178,14 @@ class RenderSelection(TriMesh):
         )
         self.verts[:36, 3:5] /= 16
 
+    def create_box_verts(self) -> numpy.ndarray:
+        """The vertices of the box relative to the origin of its points.
+        Used to draw the box as part of a different mesh. This does not need an OpenGL context."""
+        self._create_geometry_()
+        verts = self.verts.copy()
+        verts[:, :3] += self.min - (self.min % 16)
+        return verts
+
     def _create_geometry(self):
         self._setup()
         self._create_geometry_()
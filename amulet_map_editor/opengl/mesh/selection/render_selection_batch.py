@@ -0,0 +1,134 @@
+import numpy
+from OpenGL.GL import *
+from typing import Dict, List, Sequence, Tuple, Optional
+
+from amulet_map_editor.opengl.mesh import new_empty_verts
+from amulet_map_editor.opengl.mesh.base.tri_mesh import TriMesh
+from amulet.api.data_types import PointCoordinatesAny
+from .render_selection import RenderSelection
+
+
+class RenderSelectionBatch(TriMesh):
+    """The geometry of a list of selection boxes packed into one vertex buffer.
+    Only the ranges of the boxes that have changed are sent to OpenGL.
+    The boxes are drawn with one draw call plus one for the boxes the camera is inside."""
+    def __init__(self, context_identifier: str, texture: int):
+        super().__init__(context_identifier, texture)
+        self._boxes: List[RenderSelection] = []
+        self._box_verts: Dict[RenderSelection, Tuple[int, numpy.ndarray]] = {}  # the geometry version and vertices of each box
+        self._box_first = numpy.zeros(0, dtype=numpy.int32)  # the first vertex of each box
+        self._box_counts = numpy.zeros(0, dtype=numpy.int32)  # the number of vertices in each box
+        self._box_bounds = numpy.zeros((0, 2, 3), dtype=numpy.float64)  # the min and max point of each box
+        self._draw_first = self._box_first
+        self._draw_counts = self._box_counts
+        self._origin = numpy.zeros(3, dtype=numpy.float32)  # the vertices are relative to this to keep their precision
+        self.transformation_matrix = numpy.eye(4, dtype=numpy.float64)
+        self._rebuild = True  # does the whole buffer need recreating
+
+    @property
+    def vertex_usage(self):
+        return GL_DYNAMIC_DRAW
+
+    @property
+    def draw_mode(self):
+        return GL_TRIANGLES
+
+    def _get_box_verts(self, box: RenderSelection) -> numpy.ndarray:
+        """The vertices of a box relative to the origin. Reused if the box has not changed."""
+        version, verts = self._box_verts.get(box, (None, None))
+        if version != box.geometry_version:
+            verts = box.create_box_verts()
+            verts[:, :3] -= self._origin
+            self._box_verts[box] = (box.geometry_version, verts)
+        return verts
+
+    def _create_geometry(self, boxes: Sequence[RenderSelection]):
+        """Pack the vertices of every box into a new buffer."""
+        self._boxes = list(boxes)
+        if self._boxes:
+            box_min = self._boxes[0].min
+            origin = (box_min - box_min % 16).astype(numpy.float32)
+            if not numpy.array_equal(origin, self._origin):
+                self._origin = origin
+                self._box_verts.clear()
+        self._box_verts = {box: self._box_verts[box] for box in self._boxes if box in self._box_verts}
+        box_verts = [self._get_box_verts(box) for box in self._boxes]
+        self._box_counts = numpy.array([len(verts) for verts in box_verts], dtype=numpy.int32)
+        self._box_first = numpy.zeros(len(self._boxes), dtype=numpy.int32)
+        numpy.cumsum(self._box_counts[:-1], out=self._box_first[1:])
+        self._box_bounds = numpy.array([box.bounds for box in self._boxes], dtype=numpy.float64).reshape((-1, 2, 3))
+        self.verts = numpy.concatenate(box_verts).ravel() if box_verts else new_empty_verts()
+        self.transformation_matrix[3, :3] = self._origin
+        self.change_verts()
+        self._rebuild = False
+
+    def _update_geometry(self):
+        """Send the vertices of the boxes that have changed to OpenGL.
+        Recreates the buffer if the number of vertices of a box has changed."""
+        changed = [
+            index for index, box in enumerate(self._boxes)
+            if self._box_verts[box][0] != box.geometry_version
+        ]
+        if not changed:
+            return
+        box_verts = [self._get_box_verts(self._boxes[index]) for index in changed]
+        if any(len(verts) != self._box_counts[index] for index, verts in zip(changed, box_verts)):
+            self._create_geometry(self._boxes)
+            return
+        glBindBuffer(GL_ARRAY_BUFFER, self._vbo)
+        for index, verts in zip(changed, box_verts):
+            start = self._box_first[index] * self._vert_len
+            self.verts[start:start + verts.size] = verts.ravel()
+            glBufferSubData(GL_ARRAY_BUFFER, start * 4, verts.size * 4, verts)
+            self._box_bounds[index] = self._boxes[index].bounds
+        glBindBuffer(GL_ARRAY_BUFFER, 0)
+
+    def unload(self):
+        super().unload()
+        self._rebuild = True
+
+    def _draw_arrays(self):
+        glMultiDrawArrays(self.draw_mode, self._draw_first, self._draw_counts, self._draw_first.size)
+
+    def draw(
+            self,
+            transformation_matrix: numpy.ndarray,
+            boxes: Sequence[RenderSelection],
+            camera_position: PointCoordinatesAny = None,
+            hidden_index: Optional[int] = None
+    ):
+        """
+        Draw a list of selection boxes.
+        :param transformation_matrix: 4x4 transformation matrix for the camera
+        :param boxes: The boxes to draw. The buffer is recreated if these are not the boxes drawn last time.
+        :param camera_position: The position of the camera. Boxes the camera is inside are drawn inside out.
+        :param hidden_index: The index of a box not to draw.
+        """
+        self._setup()
+        if self._rebuild or len(boxes) != len(self._boxes) or any(a is not b for a, b in zip(boxes, self._boxes)):
+            self._create_geometry(boxes)
+        else:
+            self._update_geometry()
+        if not self._boxes:
+            return
+
+        visible = numpy.ones(len(self._boxes), dtype=numpy.bool)
+        if hidden_index is not None:
+            visible[hidden_index] = False
+        if camera_position is not None:
+            point = numpy.array(camera_position)
+            inside = numpy.all(
+                (self._box_bounds[:, 0] <= point) & (point < self._box_bounds[:, 1]),
+                axis=1
+            )
+        else:
+            inside = numpy.zeros(len(self._boxes), dtype=numpy.bool)
+
+        transformation_matrix = numpy.matmul(self.transformation_matrix, transformation_matrix)
+        for cull_face, mask in ((GL_BACK, visible & ~inside), (GL_FRONT, visible & inside)):
+            if mask.any():
+                self._draw_first = numpy.ascontiguousarray(self._box_first[mask])
+                self._draw_counts = numpy.ascontiguousarray(self._box_counts[mask])
+                glCullFace(cull_face)
+                self._draw(transformation_matrix)
+        glCullFace(GL_BACK)
@@ -75,10 +75,6 @@ class RenderSelectionEditable(RenderSelectionHighlightable):
             self._free_edges[1, self._free_edges[0]] = False
             self._being_resized = True
 
-    def _mark_recreate(self):
-        self._bounds = None
-        self._rebuild = True
-
     def set_active_point(self, position: BlockCoordinatesAny):
         if self.is_dynamic:
             self._points[self._free_edges] = numpy.array([position, position])[self._free_edges]
@@ -5,10 +5,12 @@ from amulet_map_editor.opengl.mesh.base.tri_mesh import Drawable
 from amulet.api.selection import SelectionGroup, SelectionBox
 from amulet.api.data_types import BlockCoordinatesAny, PointCoordinatesAny
 from .render_selection import RenderSelection
+from .render_selection_batch import RenderSelectionBatch
 
 
 class RenderSelectionGroup(Drawable):
-    """A group of selection boxes to be drawn"""
+    """A group of selection boxes to be drawn.
+    The boxes are packed into one vertex buffer and drawn together."""
     def __init__(self,
                  context_identifier: str,
                  texture_bounds: Dict[Any, Tuple[float, float, float, float]],
@@ -20,6 +22,7 @@ class RenderSelectionGroup(Drawable):
         self._texture = texture
 
         self._boxes: List[RenderSelection] = []
+        self._batch = RenderSelectionBatch(context_identifier, texture)
 
         if selection:
             for box in selection.selection_boxes:
@@ -45,6 +48,11 @@ class RenderSelectionGroup(Drawable):
             SelectionBox(box.min, box.max) for box in self._boxes
         ])
 
-    def draw(self, transformation_matrix: numpy.ndarray, camera_position: PointCoordinatesAny = None):
+    def unload(self):
+        """Unload all OpenGL data."""
         for box in self._boxes:
-            box.draw(transformation_matrix, camera_position)
+            box.unload()
+        self._batch.unload()
+
+    def draw(self, transformation_matrix: numpy.ndarray, camera_position: PointCoordinatesAny = None):
+        self._batch.draw(transformation_matrix, self._boxes, camera_position)
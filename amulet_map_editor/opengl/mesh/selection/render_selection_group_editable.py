@@ -214,6 +214,11 @@ class RenderSelectionGroupEditable(RenderSelectionGroup):
         else:  # if there is an active selection that is being edited
             self._box_select_disable()
 
+    def unload(self):
+        super().unload()
+        self._unload_active_box()
+        self._cursor.unload()
+
     def draw(
             self,
             transformation_matrix: numpy.ndarray,
@@ -222,9 +227,13 @@ class RenderSelectionGroupEditable(RenderSelectionGroup):
             draw_cursor=True
     ):
         if draw_selection:
-            for index, box in enumerate(self._boxes):
-                if not self.editable or index != self._active_box_index:
-                    box.draw(transformation_matrix, camera_position)
+            # the active box is drawn by the editable box
+            self._batch.draw(
+                transformation_matrix,
+                self._boxes,
+                camera_position,
+                self._active_box_index if self.editable else None
+            )
             if self._active_box is not None:
                 self._active_box.draw(transformation_matrix, camera_position)
         if draw_cursor and not self.editing:
@@ -1,5 +1,9 @@
-from typing import Tuple, Any, Dict
+from typing import Tuple, Any, Dict, Sequence, List, Set, Optional
 import weakref
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, Future
 import numpy
 
 import minecraft_model_reader
@@ -8,8 +12,12 @@ import PyMCTranslate
 from amulet.api.structure import Structure
 from amulet.api.chunk import Chunk
 from amulet.api.block import BlockManager
+from amulet.api.data_types import PointCoordinatesAny
 
-from amulet_map_editor.opengl.mesh.base.chunk_builder import RenderChunkBuilder
+from amulet_map_editor import log
+from amulet_map_editor.opengl.mesh import new_empty_verts
+from amulet_map_editor.opengl.mesh.base.chunk_builder import RenderChunkBuilder, ModelTemplateType
+from amulet_map_editor.opengl.mesh.base.instanced_tri_mesh import InstancedTriMesh
 from amulet_map_editor.opengl.resource_pack import ResourcePackManager
 from amulet_map_editor.opengl.mesh.selection import RenderSelectionGroup, RenderSelection
 
@@ -25,6 +33,12 @@ class GreenRenderSelectionGroup(RenderSelectionGroup):
         return GreenRenderSelection(self._context_identifier, self._texture_bounds, self._texture)
 
 
+class PlaceholderRenderSelection(RenderSelection):
+    @property
+    def box_tint(self) -> Tuple[float, float, float]:
+        return 0.5, 0.5, 0.5
+
+
 class SubRenderStructure(RenderChunkBuilder):
     def __init__(
         self,
@@ -43,6 +57,7 @@ class SubRenderStructure(RenderChunkBuilder):
         self._cz = chunk.cz
         self._slices = slices
         self._offset = (offset + tuple(s.start for s in slices)) + (chunk.cx*16, 0, chunk.cz*16)
+        self._size = numpy.array([s.stop - s.start for s in slices])
 
     @property
     def cx(self):
@@ -62,12 +77,22 @@ class SubRenderStructure(RenderChunkBuilder):
     def _texture_bounds(self, texture):
         return self._render_structure().get_texture_bounds(texture)
 
+    def _get_model_template(self, block_temp_id: int) -> ModelTemplateType:
+        return self._render_structure().get_block_template(block_temp_id)
+
     @property
     def offset(self) -> numpy.ndarray:
         return self._offset
 
+    @property
+    def size(self) -> numpy.ndarray:
+        """The size of the section in blocks."""
+        return self._size
+
 
 class RenderStructure(ResourcePackManager):
+    _join_interval = 0.5  # the minimum time in seconds between adding newly built sections to the mesh
+
     def __init__(
         self,
         context_identifier: Any,
@@ -77,29 +102,176 @@ class RenderStructure(ResourcePackManager):
         texture_bounds: Dict[Any, Tuple[float, float, float, float]],
         translator: PyMCTranslate.Version
     ):
+        """The geometry of a structure and its selection boxes.
+        The geometry is created in a background thread the first time the structure is drawn, nearest the camera first.
+        Each section is drawn as a box until its geometry is ready.
+        The geometry is drawn at every location with one instanced draw call for each mesh."""
         super().__init__(context_identifier, resource_pack, texture, texture_bounds, translator)
         self._structure = structure
-        self._sub_structures = []
+        self._mesh = InstancedTriMesh(context_identifier, texture)
         self._selection = GreenRenderSelectionGroup(context_identifier, texture_bounds, texture, structure.selection)
-        self._create_geometry()  # TODO: move this to a different thread
+        self._selection_mesh = InstancedTriMesh(context_identifier, texture)
+        self._placeholder = PlaceholderRenderSelection(context_identifier, texture_bounds, texture)
+        self._placeholder_mesh = InstancedTriMesh(context_identifier, texture)
+        self._locations = numpy.zeros((0, 3), dtype=numpy.float32)
+        self._camera_position: Optional[numpy.ndarray] = None
+
+        offset = -structure.selection.min
+        self._sections = [
+            SubRenderStructure(self, structure.palette, chunk, slices, offset, texture)
+            for chunk, slices, _ in structure.get_chunk_slices()
+        ]
+        self._unbuilt_sections: Set[int] = set(range(len(self._sections)))  # the sections not in the mesh yet
+        self._verts: List[numpy.ndarray] = []  # the opaque geometry of the built sections
+        self._verts_translucent: List[numpy.ndarray] = []  # the translucent geometry of the built sections
+        self._join_time = 0.0  # when the mesh was last rebuilt
+        self._unjoined = False  # are there built sections that are not in the mesh yet
+        # the geometry of the sections that have been built. This is a queue because it is filled from the builder thread
+        self._built_sections: queue.Queue = queue.Queue()
+        self._cancel = threading.Event()
+        self._builder: Optional[ThreadPoolExecutor] = None
+        self._build: Optional[Future] = None
+
+        self._create_selection_geometry()
+        self._create_placeholder_geometry()
 
     @property
     def _palette(self) -> BlockManager:
         return self._structure.palette
 
-    def _create_geometry(self):
-        offset = -self._structure.selection.min
-        sections = []
-        for chunk, slices, _ in self._structure.get_chunk_slices():
-            section = SubRenderStructure(self, self._structure.palette, chunk, slices, offset, self.texture)
-            section.create_geometry()
-            sections.append(section)
-        self._sub_structures = sections
-
-    def draw(self, transformation_matrix: numpy.ndarray, cam_cx, cam_cz):
-        for chunk in sorted(
-            self._sub_structures, key=lambda x: abs(x.cx - cam_cx) + abs(x.cz - cam_cz),
-            reverse=True
-        ):
-            chunk.draw(transformation_matrix)
-        self._selection.draw(transformation_matrix)
+    @property
+    def building(self) -> bool:
+        """Is there geometry that has not been built or added to the mesh yet."""
+        return bool(self._unbuilt_sections) and not self._cancel.is_set()
+
+    @property
+    def progress(self) -> float:
+        """The fraction of the sections that are in the mesh."""
+        if not self._sections:
+            return 1.0
+        return 1 - len(self._unbuilt_sections) / len(self._sections)
+
+    @property
+    def redraw_required(self) -> bool:
+        """Does the structure need drawing again to show newly built geometry."""
+        return self.building and (self._build is None or self._unjoined or not self._built_sections.empty())
+
+    def _create_selection_geometry(self):
+        selection_verts = [box.create_box_verts() for box in self._selection]
+        self._set_verts(self._selection_mesh, numpy.concatenate(selection_verts).ravel() if selection_verts else new_empty_verts())
+
+    def _create_placeholder_geometry(self):
+        """Create a box in place of each section that is not in the mesh yet."""
+        placeholder_verts = []
+        for index in self._unbuilt_sections:
+            section = self._sections[index]
+            self._placeholder.point1 = section.offset
+            self._placeholder.point2 = section.offset + section.size - 1
+            placeholder_verts.append(self._placeholder.create_box_verts())
+        self._set_verts(self._placeholder_mesh, numpy.concatenate(placeholder_verts).ravel() if placeholder_verts else new_empty_verts())
+
+    @staticmethod
+    def _set_verts(mesh: InstancedTriMesh, verts: numpy.ndarray):
+        """Replace the vertices of a mesh. They are sent to OpenGL the next time it is drawn."""
+        mesh.unload()
+        mesh.verts = verts
+        mesh.draw_count = verts.size // mesh._vert_len
+
+    def _build_sections(self):
+        """Create the geometry of each section in order of distance to the camera.
+        This runs in the builder thread and stops early if the build is cancelled."""
+        centres = numpy.array([section.offset + section.size / 2 for section in self._sections]).reshape((-1, 3))
+        remaining = list(range(len(self._sections)))
+        while remaining and not self._cancel.is_set():
+            camera_position = self._camera_position
+            locations = self._locations
+            if camera_position is not None and len(locations):
+                # the distance from the camera to the nearest copy of each remaining section
+                distances = numpy.linalg.norm(
+                    centres[remaining][:, numpy.newaxis, :] + locations[numpy.newaxis, :, :] - camera_position,
+                    axis=2
+                ).min(axis=1)
+                index = remaining.pop(int(numpy.argmin(distances)))
+            else:
+                index = remaining.pop(0)
+            section = self._sections[index]
+            try:
+                section.create_geometry()
+            except:
+                log.error(f'Failed creating the geometry for structure section {index}', exc_info=True)
+                self._built_sections.put((index, new_empty_verts(), new_empty_verts()))
+            else:
+                self._built_sections.put((index, section.verts[:section.verts_translucent], section.verts[section.verts_translucent:]))
+                section.verts = new_empty_verts()
+
+    def _start_build(self):
+        if self._build is None and not self._cancel.is_set():
+            self._builder = ThreadPoolExecutor(max_workers=1)
+            self._build = self._builder.submit(self._build_sections)
+            self._builder.shutdown(wait=False)
+
+    def _merge_built_sections(self):
+        """Add the sections that have finished building to the mesh.
+        The mesh is rebuilt at most once every _join_interval seconds and when the last section is added.
+        All the opaque geometry is put before the translucent geometry."""
+        while True:
+            try:
+                index, verts, verts_translucent = self._built_sections.get_nowait()
+            except queue.Empty:
+                break
+            self._unbuilt_sections.discard(index)
+            self._verts.append(verts)
+            self._verts_translucent.append(verts_translucent)
+            self._unjoined = True
+        if self._unjoined and (not self._unbuilt_sections or time.time() - self._join_time >= self._join_interval):
+            self._join_time = time.time()
+            verts = self._verts + self._verts_translucent
+            self._set_verts(self._mesh, numpy.concatenate(verts) if verts else new_empty_verts())
+            self._create_placeholder_geometry()
+            self._unjoined = False
+            if not self._unbuilt_sections:
+                # the mesh has a copy of everything
+                self._verts.clear()
+                self._verts_translucent.clear()
+
+    @property
+    def locations(self) -> numpy.ndarray:
+        """The locations the structure is drawn at. Shape (n, 3)"""
+        return self._locations
+
+    @locations.setter
+    def locations(self, locations: Sequence[PointCoordinatesAny]):
+        locations = numpy.array(locations, dtype=numpy.float32).reshape((-1, 3))
+        if numpy.array_equal(locations, self._locations):
+            return
+        self._locations = locations
+        transforms = numpy.tile(numpy.eye(4, dtype=numpy.float32), (len(locations), 1, 1))
+        transforms[:, 3, :3] = locations
+        self._mesh.instance_transforms = transforms
+        self._selection_mesh.instance_transforms = transforms
+        self._placeholder_mesh.instance_transforms = transforms
+
+    def cancel(self):
+        """Stop building the geometry. The sections that have been built so far are still drawn."""
+        self._cancel.set()
+
+    def unload(self):
+        """Stop building the geometry and unload all OpenGL data. Must be called from the thread with the context."""
+        self.cancel()
+        self._mesh.unload()
+        self._selection_mesh.unload()
+        self._placeholder_mesh.unload()
+
+    def draw(self, transformation_matrix: numpy.ndarray, camera_position: PointCoordinatesAny = None):
+        """Draw the structure and its selection boxes at every location.
+        :param transformation_matrix: 4x4 transformation matrix for the camera
+        :param camera_position: The position of the camera. The sections nearest this are built first.
+        """
+        if camera_position is not None:
+            self._camera_position = numpy.array(camera_position, dtype=numpy.float32)
+        self._start_build()
+        self._merge_built_sections()
+        self._mesh.draw(transformation_matrix)
+        if self.building:
+            self._placeholder_mesh.draw(transformation_matrix)
+        self._selection_mesh.draw(transformation_matrix)
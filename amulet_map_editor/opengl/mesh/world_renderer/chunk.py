@@ -1,7 +1,8 @@
 import numpy
-from typing import TYPE_CHECKING, Tuple, List, Union
+from typing import TYPE_CHECKING, Tuple, List, Union, Optional, Dict
 import weakref
 import itertools
+import hashlib
 
 import minecraft_model_reader
 from amulet.api.errors import ChunkLoadError, ChunkDoesNotExist
@@ -9,18 +10,40 @@ from amulet.api.chunk.blocks import Blocks
 from amulet.api.data_types import Dimension
 
 from amulet_map_editor.opengl.mesh import new_empty_verts
-from amulet_map_editor.opengl.mesh.base.chunk_builder import RenderChunkBuilder
+from amulet_map_editor.opengl.mesh.base.chunk_builder import RenderChunkBuilder, SubChunkType, ModelTemplateType
+from amulet_map_editor.opengl.mesh.base.compact_tri_mesh import CompactTriMesh
 
 if TYPE_CHECKING:
     from .world import RenderWorld
     from amulet.api.chunk import Chunk
 
 
+# the sub-chunk y coordinate used in RenderChunk.section_ranges for geometry that is not part of a section
+NO_SECTION = -2**31
+
+
+class RenderSection:
+    def __init__(self, key: bytes, verts: numpy.ndarray, verts_translucent: int, visibility: int):
+        """The geometry of one 16x16x16 sub-chunk.
+        :param key: The hash of the block array the geometry was created from (including the neighbouring blocks)
+        :param verts: The vertex array
+        :param verts_translucent: The offset into verts from which the faces can be translucent
+        :param visibility: Which faces of the sub-chunk can see each other. See occlusion.section_visibility
+        """
+        self.key = key
+        self.verts = verts
+        self.verts_translucent = verts_translucent
+        self.visibility = visibility
+
+
 class RenderChunk(RenderChunkBuilder):
-    def __init__(self, render_world: 'RenderWorld', region_size: int, chunk_coords: Tuple[int, int], dimension: Dimension, texture: int):
+    compact_vertices = False  # is the geometry stored in the compact vertex format
+
+    def __init__(self, render_world: 'RenderWorld', region_size: int, chunk_coords: Tuple[int, int], dimension: Dimension, texture: int, lod: int = 0):
         # the chunk geometry is stored in chunk space (floating point)
         # at shader time it is transformed by the players transform
         super().__init__(render_world.context_identifier, texture)
+        self._lod = lod  # the level of detail. 0 is every block. 1 is a height map of the top surface.
         self._render_world_ = weakref.ref(render_world)
         self._region_size = region_size
         self._coords = chunk_coords
@@ -29,7 +52,12 @@ class RenderChunk(RenderChunkBuilder):
         self._changed_time = 0
         self._rebuild = True
         self.verts_translucent = 0  # the offset into the above from which the faces can be translucent
-        # self.chunk_lod1: numpy.ndarray = new_empty_verts()
+        self._y_range = (0, 16)  # the vertical extent of the geometry. Used for frustum culling.
+        self._sections: Dict[int, RenderSection] = {}  # the geometry of each sub-chunk
+        self._previous_sections: Dict[int, RenderSection] = {}  # sections that can be reused if they have not changed
+        self._pending_sections: List[Tuple[int, bytes, Optional[bytes]]] = []  # sections being generated in another process
+        # the sub-chunk y coordinate and the opaque and translucent (first, count) of each section in vertices
+        self._section_ranges: List[Tuple[int, int, int, int, int]] = []
 
     def __repr__(self):
         return f'RenderChunk({self._coords[0]}, {self._coords[1]})'
@@ -51,14 +79,26 @@ class RenderChunk(RenderChunkBuilder):
     def _texture_bounds(self, texture):
         return self._render_world.get_texture_bounds(texture)
 
+    def _get_model_template(self, block_temp_id: int) -> ModelTemplateType:
+        return self._render_world.get_block_template(block_temp_id, self.compact_vertices)
+
     @property
     def offset(self) -> numpy.ndarray:
         return 16 * (numpy.array([self._coords[0], 0, self._coords[1]]) % self._region_size)
 
+    @property
+    def greedy_meshing(self) -> bool:
+        return self._render_world.greedy_meshing
+
     @property
     def dimension(self) -> str:
         return self._dimension
 
+    @property
+    def lod(self) -> int:
+        """The level of detail of the geometry. 0 is every block. 1 is a height map of the top surface."""
+        return self._lod
+
     @property
     def cx(self) -> int:
         return self._coords[0]
@@ -71,6 +111,39 @@ class RenderChunk(RenderChunkBuilder):
     def coords(self) -> Tuple[int, int]:
         return self._coords
 
+    @property
+    def bounds(self) -> numpy.ndarray:
+        """The axis aligned bounding box of the geometry in world space. Shape (2, 3)"""
+        x, z = self._coords[0] * 16, self._coords[1] * 16
+        return numpy.array([(x, self._y_range[0], z), (x + 16, self._y_range[1], z + 16)])
+
+    @property
+    def section_ranges(self) -> numpy.ndarray:
+        """The vertex ranges of each section so that sections can be drawn separately.
+        Geometry that is not part of a section (eg the chunk plane or the low detail geometry) is in a row with y of NO_SECTION.
+        :return: int array of shape (n, 5). The sub-chunk y coordinate, the first vertex and vertex count of the opaque geometry
+            and the first vertex and vertex count of the translucent geometry.
+            The opaque and translucent vertices are relative to the start of the opaque and translucent geometry respectively.
+        """
+        ranges = list(self._section_ranges)
+        count = self.verts_translucent // self._vert_len
+        translucent_count = (self.verts.size - self.verts_translucent) // self._vert_len
+        first = sum(section_range[2] for section_range in ranges)
+        translucent_first = sum(section_range[4] for section_range in ranges)
+        if count > first or translucent_count > translucent_first:
+            ranges.append((NO_SECTION, first, count - first, translucent_first, translucent_count - translucent_first))
+        return numpy.array(ranges, dtype=numpy.int64).reshape((-1, 5))
+
+    @property
+    def section_visibility(self) -> Tuple[numpy.ndarray, numpy.ndarray]:
+        """The sub-chunk y coordinate and the face connectivity of each section that has been meshed.
+        Sections that are not in here are empty or not known."""
+        cys = sorted(self._sections)
+        return (
+            numpy.array(cys, dtype=numpy.int64),
+            numpy.array([self._sections[cy].visibility for cy in cys], dtype=numpy.uint64)
+        )
+
     @property
     def chunk(self) -> "Chunk":
         return self._render_world.world.get_chunk(self.cx, self.cz, self._dimension)
@@ -79,8 +152,16 @@ class RenderChunk(RenderChunkBuilder):
     def chunk_state(self) -> int:
         return self._chunk_state
 
+    def needs_lod_change(self) -> bool:
+        """Does the chunk need rebuilding at a different level of detail.
+        This does not access the world data so is cheap to call."""
+        return self._render_world.chunk_lod(self._coords, self._lod) != self._lod
+
     def needs_rebuild(self):
-        """has the chunk data changed since the last rebuild"""
+        """has the chunk data changed since the last rebuild or does it need a different level of detail
+        This loads the chunk from the world so should only be used when it is not known which chunks have changed."""
+        if self.needs_lod_change():
+            return True
         try:
             chunk = self.chunk
         except ChunkDoesNotExist:
@@ -93,7 +174,7 @@ class RenderChunk(RenderChunkBuilder):
                 return True
         return chunk_state != self._chunk_state
 
-    def _sub_chunks(self, blocks: Blocks) -> List[Tuple[numpy.ndarray, numpy.ndarray, Tuple[int, int, int]]]:
+    def _sub_chunks(self, blocks: Blocks) -> List[SubChunkType]:
         sub_chunks = []
         neighbour_chunks = {}
         for dx, dz in ((-1, 0), (1, 0), (0, -1), (0, 1)):
@@ -123,9 +204,15 @@ class RenderChunk(RenderChunkBuilder):
                 larger_blocks[1:-1, -1, 1:-1] = blocks.get_sub_chunk(cy+1)[:, 0, :]
             unique_blocks = numpy.unique(larger_blocks)
             sub_chunks.append((larger_blocks, unique_blocks, (0, cy*16, 0)))
+        if sub_chunks:
+            sub_chunk_y = [offset[1] for _, _, offset in sub_chunks]
+            # the chunk plane is at y=0 so that must be included
+            self._y_range = (min(0, min(sub_chunk_y)), max(16, max(sub_chunk_y) + 16))
         return sub_chunks
 
-    def create_geometry(self):
+    def _load_chunk(self) -> Optional["Chunk"]:
+        """Load the chunk and update the chunk state.
+        If the chunk could not be loaded the placeholder geometry is created and None is returned."""
         try:
             chunk = self.chunk
         except ChunkDoesNotExist:
@@ -138,27 +225,158 @@ class RenderChunk(RenderChunkBuilder):
         else:
             self._changed_time = chunk.changed_time
             self._chunk_state = 2
-            self._create_lod0_multi(self._sub_chunks(chunk.blocks))
-            plane: numpy.ndarray = numpy.ones((self._vert_len*12), dtype=numpy.float32).reshape((-1, self._vert_len))
-            plane[:, :3], plane[:, 3:5] = self._create_chunk_plane(-0.01)
-            plane[:, 5:9] = self._texture_bounds(('amulet', 'ui/translucent_white'))
-            if (self.cx+self.cz) % 2:
-                plane[:, 9:12] = [0.55, 0.5, 0.9]
-            else:
-                plane[:, 9:12] = [0.4, 0.4, 0.85]
-            self.verts = numpy.concatenate([self.verts, plane.ravel()], 0)
-            self.draw_count += 12
+            return chunk
+
+    def inherit_sections(self, render_chunk: "RenderChunk"):
+        """Reuse the geometry of the sections of an older RenderChunk for the same chunk that have not changed.
+        Must be called before the geometry is created."""
+        if type(render_chunk) is type(self) and render_chunk.lod == self._lod == 0:
+            self._previous_sections = render_chunk._sections.copy()
+
+    def _cache_key(self, cy: int, larger_blocks: numpy.ndarray, unique_blocks: numpy.ndarray) -> bytes:
+        """The key of a sub-chunk in the mesh cache.
+        Unlike the section key this does not depend on the palette indexes so it is the same between sessions.
+        The model digest changes if the translator or the resource packs change so the old geometry is not reused."""
+        key = hashlib.blake2b(digest_size=20)
+        key.update(repr((
+            self._dimension, self.cx, self.cz, cy, self._region_size,
+            self.greedy_meshing, self.compact_vertices
+        )).encode())
+        key.update(self._render_world.model_digest)
+        key.update(self._render_world.texture_digest)
+        key.update(numpy.searchsorted(unique_blocks, larger_blocks).astype(numpy.uint32).tobytes())
+        key.update('\n'.join(self._render_world.get_block_string(block_temp_id) for block_temp_id in unique_blocks).encode())
+        return key.digest()
+
+    def _dirty_sub_chunks(self, sub_chunks: List[SubChunkType]) -> List[Tuple[int, bytes, Optional[bytes], SubChunkType]]:
+        """Find the sub-chunks that have changed since the inherited sections were created.
+        The unchanged sections and the sections found in the mesh cache are added to this chunk.
+        The sub-chunk arrays include the neighbouring blocks so a change next to a section also needs a rebuild.
+        :return: A list of the sub-chunk y coordinate, the section key, the mesh cache key (None if the cache is disabled)
+            and the sub-chunk data for each sub-chunk that needs generating"""
+        previous_sections = self._previous_sections
+        self._previous_sections = {}
+        self._sections = {}
+        mesh_cache = self._render_world.mesh_cache
+        dirty_sub_chunks = []
+        for sub_chunk in sub_chunks:
+            larger_blocks, unique_blocks, offset = sub_chunk
+            cy = offset[1] // 16
+            key = hashlib.blake2b(larger_blocks.tobytes(), digest_size=16).digest()
+            section = previous_sections.get(cy)
+            if section is not None and section.key == key:
+                self._sections[cy] = section
+                continue
+            cache_key = None
+            if mesh_cache is not None:
+                cache_key = self._cache_key(cy, larger_blocks, unique_blocks)
+                cached = mesh_cache.get(cache_key)
+                if cached is not None:
+                    self._sections[cy] = RenderSection(key, *cached)
+                    continue
+            dirty_sub_chunks.append((cy, key, cache_key, sub_chunk))
+        return dirty_sub_chunks
+
+    def _add_section(self, cy: int, key: bytes, cache_key: Optional[bytes], verts: numpy.ndarray, verts_translucent: int, visibility: int):
+        """Add newly generated section geometry to the chunk and the mesh cache."""
+        self._sections[cy] = RenderSection(key, verts, verts_translucent, visibility)
+        mesh_cache = self._render_world.mesh_cache
+        if cache_key is not None and mesh_cache is not None:
+            mesh_cache.put(cache_key, verts, verts_translucent, visibility)
+
+    def _set_section_verts(self):
+        """Join the geometry of the sections into the chunk geometry.
+        The opaque geometry of all the sections is put before the translucent geometry."""
+        sections = [self._sections[cy] for cy in sorted(self._sections)]
+        section_verts = [section.verts[:section.verts_translucent] for section in sections]
+        self.verts_translucent = sum(verts.size for verts in section_verts)
+        section_verts_translucent = [section.verts[section.verts_translucent:] for section in sections]
+        section_ranges = []
+        first = translucent_first = 0
+        for cy, verts, verts_translucent in zip(sorted(self._sections), section_verts, section_verts_translucent):
+            count = verts.size // self._vert_len
+            translucent_count = verts_translucent.size // self._vert_len
+            section_ranges.append((cy, first, count, translucent_first, translucent_count))
+            first += count
+            translucent_first += translucent_count
+        self._section_ranges = section_ranges
+        section_verts += section_verts_translucent
+        if section_verts:
+            self.verts = numpy.concatenate(section_verts, 0)
+        else:
+            self.verts = new_empty_verts()
+        self.draw_count = int(self.verts.size // self._vert_len)
+
+    def create_geometry(self):
+        chunk = self._load_chunk()
+        if chunk is not None and self._lod:
+            self._create_lod1(chunk.blocks)
+            self._add_chunk_plane()
+        elif chunk is not None:
+            for cy, key, cache_key, sub_chunk in self._dirty_sub_chunks(self._sub_chunks(chunk.blocks)):
+                self._add_section(cy, key, cache_key, *self._create_lod0_section(*sub_chunk))
+            self._set_section_verts()
+            self._add_chunk_plane()
+        self._rebuild = True
+
+    def create_geometry_job(self) -> Optional[Tuple[List[SubChunkType], Dict[int, minecraft_model_reader.MinecraftMesh], numpy.ndarray, bool, bool]]:
+        """Load the data required to create the geometry in a different process.
+        Only the sub-chunks that have changed and are not in the mesh cache are included.
+        The returned data is the arguments for mesh_worker.create_lod0 and the result should be given to set_lod0_verts.
+        If the chunk could not be loaded, no sub-chunks have changed or the chunk is low detail
+        the geometry is finished here and None is returned."""
+        chunk = self._load_chunk()
+        if chunk is None:
+            self._rebuild = True
+            return None
+        if self._lod:
+            self._create_lod1(chunk.blocks)
+            self._add_chunk_plane()
+            self._rebuild = True
+            return None
+        dirty_sub_chunks = self._dirty_sub_chunks(self._sub_chunks(chunk.blocks))
+        if not dirty_sub_chunks:
+            self.set_lod0_verts([])
+            return None
+        self._pending_sections = [(cy, key, cache_key) for cy, key, cache_key, _ in dirty_sub_chunks]
+        sub_chunks = [sub_chunk for _, _, _, sub_chunk in dirty_sub_chunks]
+        models = {}
+        for _, unique_blocks, _ in sub_chunks:
+            for block_temp_id in unique_blocks:
+                if block_temp_id not in models:
+                    models[block_temp_id] = self._get_model(block_temp_id)
+        return sub_chunks, models, self.offset, self.greedy_meshing, self.compact_vertices
+
+    def set_lod0_verts(self, section_verts: List[Tuple[numpy.ndarray, int, int]]):
+        """Set the geometry created from the data returned by create_geometry_job.
+        :param section_verts: The vertex array, translucent offset and face connectivity for each sub-chunk in the job"""
+        for (cy, key, cache_key), (verts, verts_translucent, visibility) in zip(self._pending_sections, section_verts):
+            self._add_section(cy, key, cache_key, verts, verts_translucent, visibility)
+        self._pending_sections = []
+        self._set_section_verts()
+        self._add_chunk_plane()
         self._rebuild = True
 
+    def _add_chunk_plane(self):
+        plane: numpy.ndarray = numpy.ones((self._table_vert_len*12), dtype=numpy.float32).reshape((-1, self._table_vert_len))
+        plane[:, :3], plane[:, 3:5] = self._create_chunk_plane(-0.01)
+        plane[:, 5:9] = self._texture_bounds(('amulet', 'ui/translucent_white'))
+        if (self.cx+self.cz) % 2:
+            plane[:, 9:12] = [0.55, 0.5, 0.9]
+        else:
+            plane[:, 9:12] = [0.4, 0.4, 0.85]
+        self.verts = numpy.concatenate([self.verts, self._pack_verts(plane.ravel())], 0)
+        self.draw_count += 12
+
     def _create_empty_geometry(self):
-        plane: numpy.ndarray = numpy.ones((self._vert_len * 12), dtype=numpy.float32).reshape((-1, self._vert_len))
+        plane: numpy.ndarray = numpy.ones((self._table_vert_len * 12), dtype=numpy.float32).reshape((-1, self._table_vert_len))
         plane[:, :3], plane[:, 3:5] = self._create_chunk_plane(0)
         plane[:, 5:9] = self._texture_bounds(('amulet', 'ui/translucent_white'))
         if (self.cx + self.cz) % 2:
             plane[:, 9:12] = [0.3, 0.3, 0.3]
         else:
             plane[:, 9:12] = [0.2, 0.2, 0.2]
-        self.verts = plane.ravel()
+        self.verts = self._pack_verts(plane.ravel())
         self.draw_count = 12
 
     def _create_chunk_plane(self, height: Union[int, float]) -> Tuple[numpy.ndarray, numpy.ndarray]:
@@ -185,17 +403,49 @@ class RenderChunk(RenderChunkBuilder):
         return _box_coordinates[_cube_face_lut[_tri_face]].reshape((-1, 3)), box[_texture_index[_uv_slice]].reshape(-1, 2)[_tri_face, :].reshape((-1, 2))
 
     def _create_error_geometry(self):
-        plane: numpy.ndarray = numpy.ones((self._vert_len*12), dtype=numpy.float32).reshape((-1, self._vert_len))
+        plane: numpy.ndarray = numpy.ones((self._table_vert_len*12), dtype=numpy.float32).reshape((-1, self._table_vert_len))
         plane[:, :3], plane[:, 3:5] = self._create_chunk_plane(0)
         plane[:, 5:9] = self._texture_bounds(('amulet', 'ui/translucent_white'))
         if (self.cx + self.cz) % 2:
             plane[:, 9:12] = [1, 0.2, 0.2]
         else:
             plane[:, 9:12] = [0.75, 0.2, 0.2]
-        self.verts = plane.ravel()
+        self.verts = self._pack_verts(plane.ravel())
         self.draw_count = 12
 
-    def _create_lod1(self, blocks: numpy.ndarray, larger_blocks: numpy.ndarray, unique_blocks: numpy.ndarray):
-        # TODO
-        self.verts: numpy.ndarray = new_empty_verts()
-        # self.chunk_lod1: numpy.ndarray = new_empty_verts()
+    def _create_lod1(self, blocks: Blocks):
+        """Create the low detail geometry for drawing far from the camera.
+        This is a height map of the highest block in each column that has a model."""
+        heights = numpy.zeros((16, 16), dtype=numpy.int64)
+        top_blocks = numpy.zeros((16, 16), dtype=numpy.uint32)
+        exists = numpy.zeros((16, 16), dtype=numpy.bool_)
+        for cy in sorted(blocks.sub_chunks, reverse=True):
+            sub_chunk = blocks.get_sub_chunk(cy)
+            unique_blocks = numpy.unique(sub_chunk)
+            visible_lut = numpy.array([bool(self._get_model(block_temp_id).faces) for block_temp_id in unique_blocks], dtype=numpy.bool_)
+            visible = visible_lut[numpy.searchsorted(unique_blocks, sub_chunk)]
+            # the columns that have their highest block in this sub-chunk
+            new_columns = numpy.logical_and(visible.any(axis=1), numpy.logical_not(exists))
+            if not new_columns.any():
+                continue
+            top = 15 - numpy.argmax(visible[:, ::-1, :], axis=1)
+            x, z = numpy.nonzero(new_columns)
+            heights[new_columns] = cy * 16 + top[new_columns]
+            top_blocks[new_columns] = sub_chunk[x, top[new_columns], z]
+            exists |= new_columns
+            if exists.all():
+                break
+        self._sections = {}
+        self._set_verts(self._create_lod1_array(heights, top_blocks, exists), [])
+        if exists.any():
+            # the walls go down to the lowest column and the chunk plane is at y=0
+            self._y_range = (min(0, int(heights[exists].min())), max(16, int(heights[exists].max()) + 1))
+
+
+class CompactRenderChunk(CompactTriMesh, RenderChunk):
+    """A RenderChunk that stores the geometry in the compact vertex format.
+    The texture bounds are replaced with the index of the texture."""
+    compact_vertices = True
+
+    def _texture_bounds(self, texture):
+        return self._render_world.get_texture_index(texture), 0, 0, 0
@@ -0,0 +1,131 @@
+import os
+import numpy
+from collections import OrderedDict
+from typing import Optional, Tuple, Dict
+
+from amulet_map_editor import log
+
+_path = os.path.abspath(os.path.join('.', 'cache', 'mesh'))
+# increment this if the format of the entries changes. Entries from other versions are ignored and eventually trimmed.
+_cache_version = 2
+
+
+class MeshCache:
+    def __init__(self, path: str = _path, max_size: int = 1024 * 2**20):
+        """A least recently used disk cache of section geometry.
+        Each entry is stored as a .npy file and is loaded memory mapped so only the pages that are read come from disk.
+        This is not safe to use from more than one thread.
+        :param path: The directory to store the cache in.
+        :param max_size: The maximum size of the cache in bytes. The least recently used entries are deleted above this.
+        """
+        self._path = path
+        self._max_size = max_size
+        self._size = 0
+        self._entries: Dict[str, int] = OrderedDict()  # file name: file size. Least recently used first.
+        os.makedirs(self._path, exist_ok=True)
+        entries = []
+        for entry in os.scandir(self._path):
+            if entry.is_file() and entry.name.endswith('.npy'):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, entry.name, stat.st_size))
+        for _, name, size in sorted(entries):
+            self._entries[name] = size
+            self._size += size
+        self._trim()
+
+    @property
+    def path(self) -> str:
+        return self._path
+
+    @property
+    def size(self) -> int:
+        """The size of the cache in bytes."""
+        return self._size
+
+    @property
+    def max_size(self) -> int:
+        """The maximum size of the cache in bytes."""
+        return self._max_size
+
+    @max_size.setter
+    def max_size(self, max_size: int):
+        assert isinstance(max_size, int) and max_size >= 0, 'max_size must be a positive int'
+        self._max_size = max_size
+        self._trim()
+
+    @staticmethod
+    def _file_name(key: bytes) -> str:
+        return f'{key.hex()}_{_cache_version}.npy'
+
+    def get(self, key: bytes) -> Optional[Tuple[numpy.ndarray, int, int]]:
+        """Get the geometry stored under a key.
+        :param key: The key the geometry was stored under.
+        :return: The vertex array, the offset into it of the translucent geometry and the face connectivity.
+            The vertex array is a read-only memory mapped view of the entry and must not be modified.
+            None if the key is not cached.
+        """
+        name = self._file_name(key)
+        if name not in self._entries:
+            return None
+        path = os.path.join(self._path, name)
+        try:
+            data = numpy.load(path, mmap_mode='r')
+            # the header is the translucent offset stored as a uint32 and the face connectivity stored as a uint64
+            verts_translucent = int(data[:1].view(numpy.uint32)[0])
+            visibility = int(numpy.array(data[1:3]).view(numpy.uint64)[0])
+            verts = data[3:]
+            os.utime(path)
+        except Exception:
+            log.debug(f'Failed loading mesh cache entry {name}', exc_info=True)
+            self._remove(name)
+            return None
+        self._entries.move_to_end(name)
+        return verts, verts_translucent, visibility
+
+    def put(self, key: bytes, verts: numpy.ndarray, verts_translucent: int, visibility: int):
+        """Store geometry under a key.
+        :param key: The key to store the geometry under.
+        :param verts: The float32 vertex array
+        :param verts_translucent: The offset into verts of the translucent geometry
+        :param visibility: The face connectivity of the section
+        """
+        name = self._file_name(key)
+        path = os.path.join(self._path, name)
+        data = numpy.concatenate(
+            [
+                numpy.array([verts_translucent], dtype=numpy.uint32).view(numpy.float32),
+                numpy.array([visibility], dtype=numpy.uint64).view(numpy.float32),
+                verts.astype(numpy.float32, copy=False)
+            ]
+        )
+        temp_path = f'{path}.{os.getpid()}.tmp'
+        try:
+            with open(temp_path, 'wb') as f:
+                numpy.save(f, data)
+            os.replace(temp_path, path)
+        except OSError:
+            log.debug(f'Failed writing mesh cache entry {name}', exc_info=True)
+            return
+        if name in self._entries:
+            self._size -= self._entries.pop(name)
+        size = os.path.getsize(path)
+        self._entries[name] = size
+        self._size += size
+        self._trim()
+
+    def _remove(self, name: str):
+        self._size -= self._entries.pop(name)
+        try:
+            os.remove(os.path.join(self._path, name))
+        except OSError:
+            pass
+
+    def _trim(self):
+        """Delete the least recently used entries until the cache is below the maximum size."""
+        while self._size > self._max_size and self._entries:
+            self._remove(next(iter(self._entries)))
+
+    def clear(self):
+        """Delete all entries in the cache."""
+        while self._entries:
+            self._remove(next(iter(self._entries)))
@@ -1,16 +1,46 @@
 from OpenGL.GL import *
-from typing import Dict, Tuple
+from OpenGL.error import GLError
+from typing import Dict, Tuple, Optional, List
 import numpy
 import queue
-from .chunk import RenderChunk, new_empty_verts
+import time
+from .chunk import RenderChunk, NO_SECTION
 from amulet_map_editor.opengl.mesh.base.tri_mesh import TriMesh
+from amulet_map_editor.opengl.mesh.base.compact_tri_mesh import CompactTriMesh
+from amulet_map_editor.opengl.mesh.base.buffer_allocator import BufferAllocator
+from amulet_map_editor.opengl.frustum import frustum_planes, aabb_in_frustum, aabbs_in_frustum
+from amulet_map_editor.opengl.occlusion import SectionVisibility, find_visible_sections, ALL_VISIBLE
+from amulet_map_editor.opengl.frame_profiler import FrameProfiler
+from amulet_map_editor import log
+
+# section coordinates, chunk index, box min, box max, opaque ranges, translucent ranges. See RenderRegion._get_draw_ranges
+DrawRangesType = Tuple[numpy.ndarray, numpy.ndarray, numpy.ndarray, numpy.ndarray, numpy.ndarray, numpy.ndarray]
 
 
 class ChunkManager:
+    _visibility_interval = 0.5  # the minimum time in seconds between finding the visible sections when chunks change
+
     def __init__(self, context_identifier: str, texture: int, region_size=16):
         self.context_identifier = context_identifier
         self._texture = texture
         self.region_size = region_size
+        self.compact_vertices = False  # should new regions store the geometry in the compact vertex format
+        self.frustum_culling = True  # should regions and chunks outside the view of the camera be skipped
+        self.profiler = FrameProfiler()  # replace with the profiler of the canvas to record the time spent in here
+        # the number of regions and chunks not drawn in the last draw call due to frustum culling
+        self.culled_regions = 0
+        self.culled_chunks = 0
+        # the number of draw calls and vertices submitted in the last draw call
+        self.draw_calls = 0
+        self.draw_vertices = 0
+        self.culled_sections = 0  # the number of sections not drawn in the last draw call because they could not be seen
+        self.occlusion_culling = True  # should sections that cannot be seen through the opaque blocks around the camera be skipped
+        self.occlusion_distance = 16  # the distance in chunks from the camera to search for sections that cannot be seen
+        self._section_visibility: Optional[SectionVisibility] = None
+        self._visibility_camera: Optional[Tuple[int, int, int]] = None  # the camera section the visibility was found from
+        self._visibility_time = 0.0
+        self._visibility_changed = True  # have chunks been added since the visibility was found
+        self._chunks_changed = True  # have chunks been added or removed since the last draw call
         self._regions: Dict[Tuple[int, int], RenderRegion] = {}
         # added chunks are put in here and then processed on the next call of draw
         # This is because add_render_chunk can be called from a different thread to draw
@@ -30,6 +60,9 @@ class ChunkManager:
     def render_chunk_needs_rebuild(self, chunk_coords: Tuple[int, int]) -> bool:
         return chunk_coords not in self._chunk_temp_set and self.render_chunk_in_main_database(chunk_coords) and self.get_render_chunk(chunk_coords).needs_rebuild()
 
+    def render_chunk_needs_lod_change(self, chunk_coords: Tuple[int, int]) -> bool:
+        return chunk_coords not in self._chunk_temp_set and self.render_chunk_in_main_database(chunk_coords) and self.get_render_chunk(chunk_coords).needs_lod_change()
+
     def get_render_chunk(self, chunk_coords: Tuple[int, int]) -> RenderChunk:
         """Get a RenderChunk from the database.
         Might throw a key error if it has not been added to the real database yet."""
@@ -38,10 +71,15 @@ class ChunkManager:
     def _merge_chunk_temp(self):
         for _ in range(self._chunk_temp.qsize()):
             render_chunk = self._chunk_temp.get()
+            self.profiler.count('merged_chunk_count')
+            self.profiler.count('merged_vertex_count', render_chunk.draw_count)
             region_coords = self.region_coords(render_chunk.cx, render_chunk.cz)
             if region_coords not in self._regions:
-                self._regions[region_coords] = RenderRegion(region_coords[0], region_coords[1], self.region_size, self.context_identifier, self._texture)
+                region_class = CompactRenderRegion if self.compact_vertices else RenderRegion
+                self._regions[region_coords] = region_class(region_coords[0], region_coords[1], self.region_size, self.context_identifier, self._texture)
             self._regions[region_coords].add_render_chunk(render_chunk)
+            self._visibility_changed = True
+            self._chunks_changed = True
         self._chunk_temp_set.clear()
 
     def __contains__(self, chunk_coords: Tuple[int, int]):
@@ -54,15 +92,106 @@ class ChunkManager:
     def region_coords(self, cx, cz):
         return cx // self.region_size, cz // self.region_size
 
+    @property
+    def buffer_size(self) -> int:
+        """The number of bytes of vertex data held in OpenGL buffers by all the regions."""
+        return sum(region.buffer_size for region in self._regions.values())
+
+    @property
+    def redraw_required(self) -> bool:
+        """Will the next draw call look different to the last one with the same camera.
+        Chunks are merged at the end of draw so they are shown on the draw call after they are merged."""
+        return (
+            self._chunks_changed
+            or not self._chunk_temp.empty()
+            or (self.occlusion_culling and self._visibility_changed)
+        )
+
     def draw(self, camera_transform, camera):
+        self._chunks_changed = False
         cam_rx, cam_rz = numpy.floor(numpy.array(camera)[[0, 2]]/(16*self.region_size))
         cam_cx, cam_cz = numpy.floor(numpy.array(camera)[[0, 2]]/16)
+        planes = frustum_planes(camera_transform) if self.frustum_culling else None
+        with self.profiler.stage('visibility'):
+            visibility = self._get_section_visibility(camera) if self.occlusion_culling else None
+        self.profiler.set('chunk_queue', self._chunk_temp.qsize())
+        culled_regions = culled_chunks = culled_sections = draw_calls = draw_vertices = 0
         for region in sorted(self._regions.values(), key=lambda x: abs(x.rx-cam_rx) + abs(x.rz-cam_rz), reverse=True):
-            region.draw(camera_transform, cam_cx, cam_cz)
-        self._merge_chunk_temp()
+            if planes is not None and not region.in_frustum(planes):
+                culled_regions += 1
+                culled_chunks += region.chunk_count
+                continue
+            culled_chunks += region.draw(camera_transform, cam_cx, cam_cz, planes, visibility)
+            culled_sections += region.culled_sections
+            draw_calls += region.draw_calls
+            draw_vertices += region.draw_vertices
+        self.culled_regions = culled_regions
+        self.culled_chunks = culled_chunks
+        self.culled_sections = culled_sections
+        self.draw_calls = draw_calls
+        self.draw_vertices = draw_vertices
+        profiler = self.profiler
+        profiler.set('regions', len(self._regions))
+        profiler.set('culled_regions', culled_regions)
+        profiler.set('culled_chunks', culled_chunks)
+        profiler.set('culled_sections', culled_sections)
+        profiler.set('draw_calls', draw_calls)
+        profiler.set('draw_vertices', draw_vertices)
+        with profiler.stage('merge'):
+            self._merge_chunk_temp()
+
+    def _get_section_visibility(self, camera) -> SectionVisibility:
+        """Get the sections that can be seen from the camera.
+        This is found again when the camera moves into a different section
+        or when chunks have changed if it has not been found recently."""
+        camera_section = tuple(int(v) for v in numpy.floor(numpy.array(camera) / 16))
+        if (
+            self._section_visibility is None
+            or camera_section != self._visibility_camera
+            or (self._visibility_changed and time.time() - self._visibility_time > self._visibility_interval)
+        ):
+            self._section_visibility = self._find_section_visibility(camera_section)
+            self._visibility_camera = camera_section
+            self._visibility_time = time.time()
+            self._visibility_changed = False
+        return self._section_visibility
+
+    def _find_section_visibility(self, camera_section: Tuple[int, int, int]) -> SectionVisibility:
+        """Flood fill through the sections around the camera to find the ones that can be seen.
+        Sections that have not been meshed are treated as if they can be seen through."""
+        cam_cx, cam_cy, cam_cz = camera_section
+        distance = self.occlusion_distance
+        min_rx, min_rz = self.region_coords(cam_cx - distance, cam_cz - distance)
+        max_rx, max_rz = self.region_coords(cam_cx + distance, cam_cz + distance)
+        chunk_visibility = []
+        min_cy = max_cy = cam_cy
+        for region in self._regions.values():
+            if not (min_rx <= region.rx <= max_rx and min_rz <= region.rz <= max_rz):
+                continue
+            for chunk in region.render_chunks:
+                if abs(chunk.cx - cam_cx) > distance or abs(chunk.cz - cam_cz) > distance:
+                    continue
+                cys, visibility = chunk.section_visibility
+                if cys.size:
+                    chunk_visibility.append((chunk.cx, chunk.cz, cys, visibility))
+                    min_cy = min(min_cy, int(cys.min()))
+                    max_cy = max(max_cy, int(cys.max()))
+        # one section of open space above and below so the camera can see around the top and bottom
+        min_cy -= 1
+        max_cy += 1
+        grid = numpy.full((distance * 2 + 1, max_cy - min_cy + 1, distance * 2 + 1), ALL_VISIBLE, dtype=numpy.uint64)
+        for cx, cz, cys, visibility in chunk_visibility:
+            grid[cx - cam_cx + distance, cys - min_cy, cz - cam_cz + distance] = visibility
+        visible = find_visible_sections(grid, (distance, cam_cy - min_cy, distance))
+        return SectionVisibility((cam_cx - distance, min_cy, cam_cz - distance), visible)
 
     def unload(self, safe_area: Tuple[int, int, int, int] = None):
+        """Unload the regions outside the safe area. Everything is unloaded if it is None.
+        A redraw is only required if something was removed."""
         if safe_area is None:
+            if self._regions or not self._chunk_temp.empty():
+                self._chunks_changed = True
+            self._section_visibility = None
             for _ in range(self._chunk_temp.qsize()):
                 self._chunk_temp.get()
             self._chunk_temp_set.clear()
@@ -80,6 +209,8 @@ class ChunkManager:
 
             for region in delete_regions:
                 del self._regions[region]
+            if delete_regions:
+                self._chunks_changed = True
 
     def rebuild(self):
         """Rebuild a single region which was last rebuild the longest ago.
@@ -90,18 +221,38 @@ class ChunkManager:
         if self._rebuild_regions:
             region = self._rebuild_regions.pop(0)
             if region in self._regions:
-                self._regions[region].rebuild()
+                with self.profiler.stage('region_rebuild'):
+                    self._regions[region].rebuild()
 
 
 class RenderRegion(TriMesh):
+    # Each region has one vertex buffer split into an opaque arena followed by a translucent arena.
+    # Chunks are sub-allocated from these so changing one chunk only writes that chunk's data.
+    _buffer_headroom = 0.25  # the fraction of extra space to allocate when the buffer is recreated
+    _min_buffer_headroom = 1024  # the minimum number of free vertices in each arena when the buffer is recreated
+    _max_fragmentation = 0.5  # compact the buffer when more than this fraction of the used part of an arena is free
+
     def __init__(self, rx: int, rz: int, region_size: int, context_identifier: str, texture: int):
         """A group of RenderChunks to minimise the number of draw calls"""
         super().__init__(context_identifier, texture)
         self.rx = rx
         self.rz = rz
         self._chunks: Dict[Tuple[int, int], RenderChunk] = {}
+        # chunk coords: (offset, size, translucent offset, translucent size) in vertices relative to the arena
         self._merged_chunk_locations: Dict[Tuple[int, int], Tuple[int, int, int, int]] = {}
+        self._opaque_allocator = BufferAllocator()
+        self._translucent_allocator = BufferAllocator()
+        # the bounds and draw ranges of the merged chunks. None if they need rebuilding
+        self._draw_ranges: Optional[DrawRangesType] = None
+        self._draw_first = numpy.zeros(0, dtype=numpy.int32)  # the first vertex of each range to draw
+        self._draw_counts = numpy.zeros(0, dtype=numpy.int32)  # the number of vertices in each range to draw
+        # the number of draw calls and vertices submitted in the last draw call
+        self.draw_calls = 0
+        self.draw_vertices = 0
+        self.culled_sections = 0  # the number of sections not drawn in the last draw call because they could not be seen
         self._manual_chunks: Dict[Tuple[int, int], RenderChunk] = {}
+        self._region_size = region_size
+        self._y_range = (0, 16)  # the vertical extent of the chunks in the region. Used for frustum culling.
 
         self.region_transform = numpy.eye(4, dtype=numpy.float64)
         self.region_transform[3, [0, 2]] = numpy.array([rx, rz]) * region_size * 16
@@ -124,56 +275,197 @@ class RenderRegion(TriMesh):
         self._disable_merged_chunk(chunk_coords)
         self._chunks[chunk_coords] = render_chunk
         self._manual_chunks[chunk_coords] = render_chunk
+        min_y, max_y = render_chunk.bounds[:, 1]
+        self._y_range = (min(self._y_range[0], min_y), max(self._y_range[1], max_y))
+
+    @property
+    def bounds(self) -> numpy.ndarray:
+        """The axis aligned bounding box of the region in world space. Shape (2, 3)"""
+        x, z = self.region_transform[3, [0, 2]]
+        size = self._region_size * 16
+        return numpy.array([(x, self._y_range[0], z), (x + size, self._y_range[1], z + size)])
+
+    def in_frustum(self, planes: numpy.ndarray) -> bool:
+        """Is any part of the region visible.
+        :param planes: The world space frustum planes from frustum.frustum_planes"""
+        box_min, box_max = self.bounds
+        return aabb_in_frustum(planes, box_min, box_max)
+
+    @property
+    def render_chunks(self) -> List[RenderChunk]:
+        """The chunks in the region."""
+        return list(self._chunks.values())
+
+    @property
+    def chunk_count(self) -> int:
+        """The number of chunks in the region."""
+        return len(self._chunks)
+
+    @property
+    def buffer_size(self) -> int:
+        """The number of bytes of vertex data in the region buffer and the buffers of the chunks not merged into it."""
+        capacity = self._opaque_allocator.capacity + self._translucent_allocator.capacity
+        return (capacity * self._vert_len + sum(chunk.verts.size for chunk in list(self._manual_chunks.values()))) * 4
+
+    @property
+    def manual_chunk_count(self) -> int:
+        """The number of chunks that are drawn separately because they have not been merged yet."""
+        return len(self._manual_chunks)
 
     def get_render_chunk(self, chunk_coords: Tuple[int, int]):
         return self._chunks[chunk_coords]
 
     def _disable_merged_chunk(self, chunk_coords: Tuple[int, int]):
-        """Zero out the region of memory in the merged chunks related to a given chunk"""
+        """Free the space in the region buffer used by a given chunk.
+        The old data is left in the buffer but is no longer in the draw ranges."""
         if chunk_coords in self._merged_chunk_locations:
             offset, size, translucent_offset, translucent_size = self._merged_chunk_locations.pop(chunk_coords)
+            self._opaque_allocator.free(offset, size)
+            self._translucent_allocator.free(translucent_offset, translucent_size)
+            self._draw_ranges = None
+
+    def _write_verts(self, offset: int, verts: numpy.ndarray):
+        """Write vertices into the bound buffer.
+        :param offset: The offset in vertices into the buffer
+        :param verts: The vertex array to write
+        """
+        if verts.size:
+            glBufferSubData(GL_ARRAY_BUFFER, offset * self._vert_len * 4, verts.size * 4, verts)
+
+    def _chunk_sizes(self, chunk: RenderChunk) -> Tuple[int, int]:
+        """The number of opaque and translucent vertices in a chunk"""
+        return chunk.verts_translucent // self._vert_len, (chunk.verts.size - chunk.verts_translucent) // self._vert_len
+
+    def _buffer_capacity(self, used: int) -> int:
+        """The size of an arena that holds the given number of vertices with room to grow"""
+        return used + max(int(used * self._buffer_headroom), self._min_buffer_headroom)
+
+    def _write_manual_chunks(self) -> bool:
+        """Write the chunks that have not been merged into free space in the existing buffer.
+        Chunks that do not fit are left to be drawn separately.
+        :return: True if all the chunks were merged.
+        """
+        try:
             glBindVertexArray(self._vao)
             glBindBuffer(GL_ARRAY_BUFFER, self._vbo)
-            glBufferSubData(GL_ARRAY_BUFFER, offset*4, size*4, numpy.zeros(size, dtype=numpy.float32))
-            glBufferSubData(GL_ARRAY_BUFFER, translucent_offset*4, translucent_size*4, numpy.zeros(translucent_size, dtype=numpy.float32))
-            glBindVertexArray(0)
-            glBindBuffer(GL_ARRAY_BUFFER, 0)
+        except GLError:
+            log.debug(f'Failed binding the OpenGL state for {self}. Recreating the buffer.')
+            return False
+        translucent_start = self._opaque_allocator.capacity
+        for chunk_coords, chunk in list(self._manual_chunks.items()):
+            size, translucent_size = self._chunk_sizes(chunk)
+            offset = self._opaque_allocator.allocate(size)
+            if offset is None:
+                continue
+            translucent_offset = self._translucent_allocator.allocate(translucent_size)
+            if translucent_offset is None:
+                self._opaque_allocator.free(offset, size)
+                continue
+            self._write_verts(offset, chunk.verts[:chunk.verts_translucent])
+            self._write_verts(translucent_start + translucent_offset, chunk.verts[chunk.verts_translucent:])
+            self._merged_chunk_locations[chunk_coords] = (offset, size, translucent_offset, translucent_size)
+            del self._manual_chunks[chunk_coords]
+            chunk.unload()
+            self._draw_ranges = None
+        glBindVertexArray(0)
+        glBindBuffer(GL_ARRAY_BUFFER, 0)
+        return not self._manual_chunks
 
-    def rebuild(self):
-        """If there are any chunks that have not been merged recreate the merged vertex table"""
-        self._setup()
-        if self._manual_chunks and self._vao and self._vbo:
-            region_verts = []
-            region_verts_translucent = []
-            merged_locations: Dict[Tuple[int, int], Tuple[int, int, int, int]] = {}
-            offset = 0
-            translucent_offset = 0
-            for chunk_location, chunk in self._chunks.items():
-                region_verts.append(chunk.verts[:chunk.verts_translucent])
-                region_verts_translucent.append(chunk.verts[chunk.verts_translucent:])
-                merged_locations[chunk_location] = [
-                    offset, chunk.verts_translucent,
-                    translucent_offset, chunk.verts.size - chunk.verts_translucent
-                ]
-                offset += chunk.verts_translucent
-                translucent_offset += chunk.verts.size - chunk.verts_translucent
-
-            for val in merged_locations.values():
-                val[2] += offset
-
-            region_verts += region_verts_translucent
-
-            if region_verts:
-                verts = numpy.concatenate(region_verts)
+    def _write_all_chunks(self):
+        """Recreate the region buffer with every chunk packed at the start of each arena.
+        This is used when the buffer runs out of space and to compact it when it gets fragmented."""
+        sizes = {chunk_coords: self._chunk_sizes(chunk) for chunk_coords, chunk in self._chunks.items()}
+        opaque_capacity = self._buffer_capacity(sum(size for size, _ in sizes.values()))
+        translucent_capacity = self._buffer_capacity(sum(size for _, size in sizes.values()))
+        verts = numpy.zeros((opaque_capacity + translucent_capacity) * self._vert_len, dtype=numpy.float32)
+
+        merged_locations: Dict[Tuple[int, int], Tuple[int, int, int, int]] = {}
+        offset = 0
+        translucent_offset = 0
+        vert_len = self._vert_len
+        for chunk_coords, chunk in self._chunks.items():
+            size, translucent_size = sizes[chunk_coords]
+            verts[offset * vert_len:(offset + size) * vert_len] = chunk.verts[:chunk.verts_translucent]
+            translucent_start = (opaque_capacity + translucent_offset) * vert_len
+            verts[translucent_start:translucent_start + translucent_size * vert_len] = chunk.verts[chunk.verts_translucent:]
+            merged_locations[chunk_coords] = (offset, size, translucent_offset, translucent_size)
+            offset += size
+            translucent_offset += translucent_size
+
+        self._opaque_allocator.reset(opaque_capacity, offset)
+        self._translucent_allocator.reset(translucent_capacity, translucent_offset)
+        self._merged_chunk_locations = merged_locations
+        self._draw_ranges = None
+        self.change_verts(verts)
+        for chunk in self._manual_chunks.values():
+            chunk.unload()
+        self._manual_chunks.clear()
+
+    def _get_draw_ranges(self) -> DrawRangesType:
+        """The draw ranges of each section of the merged chunks. Rebuilt when a chunk is merged or removed.
+        :return: The chunk x, sub-chunk y and chunk z of each section (n, 3). y is NO_SECTION for geometry outside of a section.
+            The index of the chunk each section is part of (n,)
+            The minimum and maximum point of each section's bounding box (n, 3)
+            The opaque and translucent (first, count) of each section in vertices (n, 2)
+        """
+        if self._draw_ranges is None:
+            sections = []
+            chunk_index = []
+            opaque = []
+            translucent = []
+            box_min = []
+            box_max = []
+            translucent_start = self._opaque_allocator.capacity
+            for index, (chunk_coords, (offset, _, translucent_offset, _)) in enumerate(self._merged_chunk_locations.items()):
+                chunk = self._chunks[chunk_coords]
+                ranges = chunk.section_ranges
+                cy = ranges[:, 0]
+                section_min = numpy.empty((len(ranges), 3), dtype=numpy.int64)
+                section_min[:] = (chunk.cx * 16, 0, chunk.cz * 16)
+                section_min[:, 1] = cy * 16
+                section_max = section_min + 16
+                # geometry outside of a section uses the bounds of the chunk
+                whole_chunk = cy == NO_SECTION
+                section_min[whole_chunk], section_max[whole_chunk] = chunk.bounds
+                sections.append(numpy.stack((numpy.full(len(ranges), chunk.cx), cy, numpy.full(len(ranges), chunk.cz)), axis=1))
+                chunk_index.append(numpy.full(len(ranges), index))
+                opaque.append(ranges[:, 1:3] + (offset, 0))
+                translucent.append(ranges[:, 3:5] + (translucent_start + translucent_offset, 0))
+                box_min.append(section_min)
+                box_max.append(section_max)
+            if sections:
+                self._draw_ranges = (
+                    numpy.concatenate(sections),
+                    numpy.concatenate(chunk_index),
+                    numpy.concatenate(box_min),
+                    numpy.concatenate(box_max),
+                    numpy.concatenate(opaque).astype(numpy.int32),
+                    numpy.concatenate(translucent).astype(numpy.int32),
+                )
             else:
-                verts = new_empty_verts()
-            self.draw_count = int(verts.size//self._vert_len)
-            self._merged_chunk_locations = merged_locations
+                self._draw_ranges = (
+                    numpy.zeros((0, 3), dtype=numpy.int64),
+                    numpy.zeros(0, dtype=numpy.int64),
+                    numpy.zeros((0, 3), dtype=numpy.int64),
+                    numpy.zeros((0, 3), dtype=numpy.int64),
+                    numpy.zeros((0, 2), dtype=numpy.int32),
+                    numpy.zeros((0, 2), dtype=numpy.int32),
+                )
+        return self._draw_ranges
 
-            self.change_verts(verts)
-            for chunk in self._manual_chunks.values():
-                chunk.unload()
-            self._manual_chunks.clear()
+    def _draw_arrays(self):
+        glMultiDrawArrays(self.draw_mode, self._draw_first, self._draw_counts, self._draw_first.size)
+
+    def rebuild(self):
+        """If there are chunks that could not be merged recreate the region buffer with room for them.
+        The buffer is also recreated if it gets too fragmented."""
+        buffer_lost = self._vao is None and bool(self._merged_chunk_locations)
+        self._setup()
+        if self._vao and self._vbo:
+            if buffer_lost or (self._manual_chunks and not self._write_manual_chunks()):
+                self._write_all_chunks()
+            elif max(self._opaque_allocator.fragmentation, self._translucent_allocator.fragmentation) > self._max_fragmentation:
+                self._write_all_chunks()
 
     def unload(self):
         """Unload all opengl data"""
@@ -181,9 +473,76 @@ class RenderRegion(TriMesh):
         for chunk in self._chunks.values():
             chunk.unload()
         self._chunks.clear()
+        self._manual_chunks.clear()
+        self._merged_chunk_locations.clear()
+        self._opaque_allocator.reset(0)
+        self._translucent_allocator.reset(0)
+        self._draw_ranges = None
+
+    def draw(
+        self,
+        transformation_matrix: numpy.ndarray,
+        cam_cx,
+        cam_cz,
+        planes: numpy.ndarray = None,
+        visibility: SectionVisibility = None
+    ) -> int:
+        """Draw the merged geometry and the chunks that have not been merged yet.
+        New chunks are written into free space in the region buffer here if they fit.
+        The merged chunks are drawn with one glMultiDrawArrays call with a range for each visible section.
+        :param transformation_matrix: The world space transformation matrix
+        :param cam_cx: The chunk x coordinate of the camera
+        :param cam_cz: The chunk z coordinate of the camera
+        :param planes: The world space frustum planes. If defined sections outside the frustum will not be drawn.
+        :param visibility: The sections that can be seen from the camera. If defined the sections that cannot will not be drawn.
+        :return: The number of chunks that were not drawn due to being outside the frustum
+        """
+        self._setup()
+        if self._manual_chunks and self._vao and self._vbo:
+            self._write_manual_chunks()
+        region_transformation_matrix = numpy.matmul(self.region_transform, transformation_matrix)
+        culled_chunks = 0
+        self.culled_sections = 0
+        self.draw_calls = 0
+
+        sections, chunk_index, box_min, box_max, opaque, translucent = self._get_draw_ranges()
+        if len(sections):
+            visible = numpy.ones(len(sections), dtype=numpy.bool_)
+            if planes is not None:
+                visible = aabbs_in_frustum(planes, box_min, box_max)
+                culled_chunks += len(self._merged_chunk_locations) - len(numpy.unique(chunk_index[visible]))
+            if visibility is not None:
+                in_section = numpy.logical_and(visible, sections[:, 1] != NO_SECTION)
+                occluded = numpy.zeros(len(sections), dtype=numpy.bool_)
+                occluded[in_section] = numpy.logical_not(visibility.is_visible(*sections[in_section].T))
+                self.culled_sections = int(numpy.count_nonzero(occluded))
+                visible &= numpy.logical_not(occluded)
+            opaque = opaque[visible]
+            translucent = translucent[visible]
+        # all the opaque geometry is drawn before the translucent geometry
+        ranges = numpy.concatenate([opaque[opaque[:, 1] > 0], translucent[translucent[:, 1] > 0]])
+        self._draw_first = numpy.ascontiguousarray(ranges[:, 0])
+        self._draw_counts = numpy.ascontiguousarray(ranges[:, 1])
+        self.draw_count = int(self._draw_counts.sum())
+        self.draw_vertices = self.draw_count
+        if self._draw_first.size:
+            super().draw(region_transformation_matrix)
+            self.draw_calls += 1
+
+        chunks = list(self._manual_chunks.values())
+        if planes is not None and chunks:
+            bounds = numpy.array([chunk.bounds for chunk in chunks])
+            visible = aabbs_in_frustum(planes, bounds[:, 0], bounds[:, 1])
+            culled_chunks += len(chunks) - int(numpy.count_nonzero(visible))
+            chunks = [chunk for chunk, chunk_visible in zip(chunks, visible) if chunk_visible]
+        for chunk in sorted(chunks, key=lambda x: abs(x.cx-cam_cx) + abs(x.cz-cam_cz), reverse=True):
+            chunk.draw(region_transformation_matrix)
+            self.draw_calls += 1
+            self.draw_vertices += chunk.draw_count
+        return culled_chunks
 
-    def draw(self, transformation_matrix: numpy.ndarray, cam_cx, cam_cz):
-        transformation_matrix = numpy.matmul(self.region_transform, transformation_matrix)
-        super().draw(transformation_matrix)
-        for chunk in sorted(self._manual_chunks.values(), key=lambda x: abs(x.cx-cam_cx) + abs(x.cz-cam_cz), reverse=True):
-            chunk.draw(transformation_matrix)
+
+class CompactRenderRegion(CompactTriMesh, RenderRegion):
+    """A RenderRegion for CompactRenderChunks"""
+    def __repr__(self):
+        return f'CompactRenderRegion({self.rx}, {self.rz})'
@@ -1,7 +1,11 @@
 import numpy
-from typing import TYPE_CHECKING, Tuple, Generator, Union, Optional, Dict, Any, Set
+from typing import TYPE_CHECKING, Tuple, Generator, Union, Optional, Dict, Any, Set, List, Iterable
 import math
-from concurrent.futures import ThreadPoolExecutor, Future
+import queue
+import heapq
+import itertools
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, Future
+from concurrent.futures.process import BrokenProcessPool
 import time
 import weakref
 
@@ -11,11 +15,14 @@ from amulet.api.block import BlockManager
 from amulet.api.data_types import Dimension
 
 from amulet_map_editor import log
-from .chunk import RenderChunk
+from .chunk import RenderChunk, CompactRenderChunk
 from .region import ChunkManager
+from .mesh_cache import MeshCache
 from amulet_map_editor.opengl.data_types import CameraLocationType, CameraRotationType
 from amulet_map_editor.opengl.resource_pack import ResourcePackManager
 from amulet_map_editor.opengl.mesh.base.tri_mesh import Drawable
+from amulet_map_editor.opengl.mesh.base import mesh_worker
+from amulet_map_editor.opengl.mesh.base import compact_tri_mesh
 
 if TYPE_CHECKING:
     from amulet.api.world import World
@@ -45,85 +52,292 @@ def atan(x: Union[int, float]) -> float:
 
 
 class ChunkGenerator(ThreadPoolExecutor):
-    def __init__(self, render_world: 'RenderWorld'):
+    _lod_checks = 64  # the number of loaded chunks to check for a level of detail change each time a chunk is found to generate
+
+    def __init__(self, render_world: 'RenderWorld', processes: int = 0, chunk_interval: float = 1/60):
+        """Generates the chunk geometry in a background thread.
+        :param render_world: The RenderWorld to generate chunks for.
+        :param processes: The number of processes to create the chunk geometry in. If 0 the geometry is created in the background thread.
+        :param chunk_interval: The minimum time in seconds between each chunk being generated (per process if processes is more than 0)
+        """
         super().__init__(max_workers=1)
         self._render_world = weakref.ref(render_world)
         self._region_size = render_world.chunk_manager.region_size
         self._enabled = False
         self._generator: Optional[Future] = None
         self._chunk_rebuilds: Set[Tuple[int, int]] = set()
+        # the chunks that chunks_changed has been called with. None if every chunk should be checked
+        # This is a queue because it can be called from a different thread to the generator
+        self._changed_chunks: queue.Queue = queue.Queue()
+        self._processes = processes
+        self._chunk_interval = chunk_interval
+        self._process_pool: Optional[ProcessPoolExecutor] = None
+        self._pending_chunks: Dict[Tuple[int, int], Tuple[RenderChunk, Future]] = {}  # chunks being generated in the process pool
+        # the state the chunk priorities were calculated for. None if they need recalculating
+        self._order_key: Optional[Tuple[Tuple[int, int], int, int]] = None
+        self._chunk_order: List[Tuple[int, int]] = []  # the chunks in the render distance from highest to lowest priority
+        self._load_queue: List[Tuple[float, Tuple[int, int]]] = []  # heap of the chunks that were not loaded when the order was calculated
+        self._lod_index = 0  # the position in _chunk_order to continue checking for level of detail changes from
 
     @property
     def render_world(self) -> "RenderWorld":
         return self._render_world()
 
+    @property
+    def enabled(self) -> bool:
+        """Is the generator running."""
+        return self._enabled
+
+    @property
+    def queue_depth(self) -> int:
+        """The approximate number of chunks waiting to be generated."""
+        return len(self._load_queue) + len(self._chunk_rebuilds) + len(self._pending_chunks)
+
+    @property
+    def processes(self) -> int:
+        """The number of processes to create the chunk geometry in.
+        If 0 the geometry is created in the background thread."""
+        return self._processes
+
+    @processes.setter
+    def processes(self, processes: int):
+        assert isinstance(processes, int) and processes >= 0, 'processes must be an int greater than or equal to 0'
+        if processes != self._processes:
+            enabled = self._enabled
+            self.stop()
+            self._processes = processes
+            self._shutdown_process_pool()
+            if enabled:
+                self.start()
+
+    @property
+    def chunk_interval(self) -> float:
+        """The minimum time in seconds between each chunk being generated.
+        When the process pool is used this is the time per process."""
+        return self._chunk_interval
+
+    @chunk_interval.setter
+    def chunk_interval(self, chunk_interval: float):
+        assert isinstance(chunk_interval, (int, float)) and chunk_interval >= 0, 'chunk_interval must be a positive number'
+        self._chunk_interval = chunk_interval
+
     def start(self):
         if not self._enabled:
             self._enabled = True
+            # chunks may have been unloaded while stopped so the load queue is recreated
+            self._order_key = None
+            if self._processes and self._process_pool is None:
+                self._process_pool = ProcessPoolExecutor(
+                    self._processes,
+                    initializer=mesh_worker.init_worker,
+                    initargs=(self.render_world.texture_bounds,)
+                )
             self._generator = self.submit(self._generate_chunks)
 
     def stop(self):
         if self._enabled:
             self._enabled = False
             self._generator.result()
-
-    def _generate_chunks(self):
-        while self._enabled:
-            start_time = time.time()
-            # first check if there is a chunk that exists and needs rebuilding
-            chunk_coords = next(
-                (
-                    c for c in self.render_world.chunk_coords() if
-                    self.render_world.chunk_manager.render_chunk_needs_rebuild(c)
-                ),
-                None
-            )
-            if chunk_coords is not None:
-                # if there was a chunk found that needs rebuilding then add the surrounding chunks for rebuilding
+            # chunks that have not been merged yet will get picked up again when restarted.
+            for _, future in self._pending_chunks.values():
+                future.cancel()
+            self._pending_chunks.clear()
+
+    def _shutdown_process_pool(self):
+        if self._process_pool is not None:
+            self._process_pool.shutdown(wait=False)
+            self._process_pool = None
+
+    def reset_process_pool(self):
+        """Recreate the process pool. This must be called when the texture bounds change."""
+        enabled = self._enabled
+        self.stop()
+        self._shutdown_process_pool()
+        if enabled:
+            self.start()
+
+    def shutdown(self, wait=True):
+        self.stop()
+        self._shutdown_process_pool()
+        super().shutdown(wait)
+
+    def _update_chunk_order(self):
+        """Recalculate the chunk priorities if the camera has moved into a different chunk or turned.
+        The chunks that are not loaded are put into a heap so the next one to load can be found in O(log n)."""
+        render_world = self.render_world
+        camera_chunk = (int(render_world.camera_location[0]) >> 4, int(render_world.camera_location[2]) >> 4)
+        # the priorities change with the direction the camera is facing so they are recalculated every 45 degrees
+        order_key = (camera_chunk, round(render_world.camera_rotation[1] / 45) % 8, render_world.render_distance)
+        if order_key == self._order_key:
+            return
+        self._order_key = order_key
+        chunk_coords, priorities = render_world.chunk_priorities()
+        order = numpy.argsort(priorities, kind='stable')
+        self._chunk_order = [tuple(c) for c in chunk_coords[order].tolist()]
+        chunk_manager = render_world.chunk_manager
+        self._load_queue = [
+            (priority, c) for priority, c in zip(priorities[order].tolist(), self._chunk_order)
+            if c not in chunk_manager
+        ]
+        heapq.heapify(self._load_queue)
+        self._lod_index = 0
+
+    def chunks_changed(self, chunk_coords: Optional[Iterable[Tuple[int, int]]] = None):
+        """Notify the generator that the world data of some chunks has changed.
+        The chunks and their neighbours will be rebuilt if they are loaded.
+        This can be called from any thread.
+        :param chunk_coords: The chunks in the current dimension that have changed.
+            If None all chunks in the render distance are checked against the world data once.
+        """
+        self._changed_chunks.put(None if chunk_coords is None else set(chunk_coords))
+
+    def _process_changed_chunks(self):
+        """Queue the chunks that chunks_changed has been called with for rebuilding."""
+        chunk_manager = self.render_world.chunk_manager
+        for _ in range(self._changed_chunks.qsize()):
+            changed_chunks = self._changed_chunks.get()
+            if changed_chunks is None:
+                changed_chunks = [
+                    c for c in self._chunk_order if
+                    c not in self._pending_chunks and
+                    chunk_manager.render_chunk_needs_rebuild(c)
+                ]
+            for cx, cz in changed_chunks:
+                # the surrounding chunks are also rebuilt
                 # (this deals with if the chunk was deleted or the blocks up to the chunk boundary were deleted)
-                for offset in [(-1, 0), (1, 0), (0, -1), (0, 1)]:
-                    chunk_coords_ = (chunk_coords[0] + offset[0], chunk_coords[1] + offset[1])
-                    if chunk_coords_ in self.render_world.chunk_manager:
-                        self._chunk_rebuilds.add(chunk_coords_)
-            elif self._chunk_rebuilds:
-                # if a chunk was not found that needs rebuilding due to it changing but a previously
-                # identified neighbour chunk needs rebuilding do that.
-                chunk_coords = self._chunk_rebuilds.pop()
-            else:
-                # if no chunks need rebuilding then find a new chunk to load.
-                chunk_coords = next(
-                    (
-                        c for c in self.render_world.chunk_coords() if
-                        c not in self.render_world.chunk_manager
-                    ),
-                    None
-                )
-            if chunk_coords is not None:
-                # if chunk coords is in here then remove it so it doesn't get generated twice.
-                if chunk_coords in self._chunk_rebuilds:
-                    self._chunk_rebuilds.remove(chunk_coords)
-
-                # generate the chunk
-                chunk = RenderChunk(
-                    self.render_world,
-                    self._region_size,
-                    chunk_coords,
-                    self.render_world.dimension,
-                    self._render_world().texture
-                )
-
+                for dx, dz in ((0, 0), (-1, 0), (1, 0), (0, -1), (0, 1)):
+                    chunk_coords = (cx + dx, cz + dz)
+                    if chunk_coords in chunk_manager:
+                        self._chunk_rebuilds.add(chunk_coords)
+
+    def _find_lod_change(self) -> Optional[Tuple[int, int]]:
+        """Find a loaded chunk that needs rebuilding at a different level of detail.
+        Only a fixed number of chunks are checked each call. The highest priority chunks are checked every call
+        and the rest are checked a few at a time in turn."""
+        chunk_manager = self.render_world.chunk_manager
+        order = self._chunk_order
+        check_count = self._lod_checks // 2
+        near = order[:check_count]
+        far = order[check_count:]
+        if far:
+            self._lod_index %= len(far)
+            far = far[self._lod_index:self._lod_index + check_count]
+            self._lod_index += check_count
+        return next(
+            (
+                c for c in itertools.chain(near, far) if
+                c not in self._pending_chunks and
+                chunk_manager.render_chunk_needs_lod_change(c)
+            ),
+            None
+        )
+
+    def _next_chunk_coords(self) -> Optional[Tuple[int, int]]:
+        """Find the next chunk that should be generated."""
+        self._update_chunk_order()
+        self._process_changed_chunks()
+        if self._chunk_rebuilds:
+            # first rebuild the chunks that have changed and their neighbours
+            chunk_coords = self._chunk_rebuilds.pop()
+        else:
+            # then rebuild chunks that have moved in or out of the level of detail distance
+            chunk_coords = self._find_lod_change()
+        if chunk_coords is None:
+            # if no chunks need rebuilding then load the highest priority chunk that has not been loaded.
+            chunk_manager = self.render_world.chunk_manager
+            while self._load_queue:
+                _, c = heapq.heappop(self._load_queue)
+                if c not in chunk_manager and c not in self._pending_chunks:
+                    chunk_coords = c
+                    break
+        return chunk_coords
+
+    def _new_render_chunk(self, chunk_coords: Tuple[int, int]) -> RenderChunk:
+        chunk_class = CompactRenderChunk if self.render_world.compact_vertices else RenderChunk
+        chunk = chunk_class(
+            self.render_world,
+            self._region_size,
+            chunk_coords,
+            self.render_world.dimension,
+            self._render_world().texture,
+            self.render_world.chunk_lod(chunk_coords)
+        )
+        chunk_manager = self.render_world.chunk_manager
+        if chunk_manager.render_chunk_in_main_database(chunk_coords):
+            # only the sections that have changed need to be generated again
+            try:
+                chunk.inherit_sections(chunk_manager.get_render_chunk(chunk_coords))
+            except KeyError:  # the chunk was unloaded from the main thread
+                pass
+        return chunk
+
+    def _generate_chunk(self, chunk_coords: Tuple[int, int]):
+        """Generate the chunk geometry in this thread."""
+        chunk = self._new_render_chunk(chunk_coords)
+        try:
+            chunk.create_geometry()
+        except compact_tri_mesh.PositionRangeError:
+            self.render_world.compact_range_exceeded()
+        except:
+            log.error(f'Failed generating chunk geometry for chunk {chunk_coords}', exc_info=True)
+
+        self.render_world.chunk_manager.add_render_chunk(
+            chunk
+        )
+
+    def _submit_chunk(self, chunk_coords: Tuple[int, int]):
+        """Load the chunk data in this thread and send it to the process pool to generate the geometry."""
+        chunk = self._new_render_chunk(chunk_coords)
+        try:
+            job = chunk.create_geometry_job()
+        except:
+            log.error(f'Failed generating chunk geometry for chunk {chunk_coords}', exc_info=True)
+            job = None
+        if job is None:
+            self.render_world.chunk_manager.add_render_chunk(chunk)
+            return
+        try:
+            self._pending_chunks[chunk_coords] = (chunk, self._process_pool.submit(mesh_worker.create_lod0, *job))
+        except BrokenProcessPool:
+            log.error('The chunk generation process pool broke. Falling back to generating chunks in a thread.', exc_info=True)
+            self._process_pool = None
+            self._generate_chunk(chunk_coords)
+
+    def _merge_pending_chunks(self):
+        """Pass the chunks that have finished generating in the process pool to the chunk manager."""
+        for chunk_coords, (chunk, future) in list(self._pending_chunks.items()):
+            if future.done():
+                del self._pending_chunks[chunk_coords]
                 try:
-                    chunk.create_geometry()
+                    chunk.set_lod0_verts(future.result())
+                except compact_tri_mesh.PositionRangeError:
+                    self.render_world.compact_range_exceeded()
                 except:
                     log.error(f'Failed generating chunk geometry for chunk {chunk_coords}', exc_info=True)
-
                 self.render_world.chunk_manager.add_render_chunk(
                     chunk
                 )
+
+    def _generate_chunks(self):
+        while self._enabled:
+            start_time = time.time()
+            if self._process_pool is None:
+                chunk_coords = self._next_chunk_coords()
+                if chunk_coords is not None:
+                    self._generate_chunk(chunk_coords)
+                chunk_interval = self._chunk_interval
+            else:
+                self._merge_pending_chunks()
+                # keep enough chunks queued that the processes are not waiting on this thread.
+                if len(self._pending_chunks) < self._processes * 2:
+                    chunk_coords = self._next_chunk_coords()
+                    if chunk_coords is not None:
+                        self._submit_chunk(chunk_coords)
+                chunk_interval = self._chunk_interval / self._processes
             delta_time = time.time() - start_time
-            if delta_time < 1/60:
+            if delta_time < chunk_interval:
                 # go to sleep so this thread doesn't lock up the main thread.
-                time.sleep(1/60-delta_time)
+                time.sleep(chunk_interval-delta_time)
 
 
 class RenderWorld(ResourcePackManager, Drawable):
@@ -143,6 +357,12 @@ class RenderWorld(ResourcePackManager, Drawable):
         self._dimension: Dimension = "overworld"
         self._render_distance = 10
         self._garbage_distance = 20
+        self._lod_distance = 16
+        self._greedy_meshing = False
+        self._compact_vertices = False
+        self._compact_range_exceeded = False  # has geometry been found that the compact vertex format cannot store
+        self._mesh_cache: Optional[MeshCache] = None
+        self._texture_bounds_changed = True  # does the texture bounds buffer need uploading
         self._chunk_manager = ChunkManager(self.context_identifier, self.texture)
         self._chunk_generator = ChunkGenerator(self)
 
@@ -178,6 +398,23 @@ class RenderWorld(ResourcePackManager, Drawable):
 
     def close(self):
         self.disable()
+        self._chunk_generator.shutdown()
+        compact_tri_mesh.unload_texture_bounds(self.context_identifier)
+        self.save_model_cache()
+
+    def set_resource_pack(
+        self,
+        resource_pack: minecraft_model_reader.BaseRPHandler,
+        texture_bounds: Dict[Any, Tuple[float, float, float, float]]
+    ):
+        enabled = self._chunk_generator.enabled
+        self._chunk_generator.stop()
+        super().set_resource_pack(resource_pack, texture_bounds)
+        self._texture_bounds_changed = True
+        # the worker processes have a copy of the texture bounds
+        self._chunk_generator.reset_process_pool()
+        if enabled:
+            self._chunk_generator.start()
 
     @property
     def camera_location(self) -> CameraLocationType:
@@ -226,6 +463,95 @@ class RenderWorld(ResourcePackManager, Drawable):
         assert isinstance(val, int), 'garbage distance must be an int'
         self._garbage_distance = val
 
+    @property
+    def lod_distance(self) -> int:
+        """The distance from the camera outside which chunks are drawn as a low detail height map.
+        This allows a larger render distance without the memory cost of full detail chunks."""
+        return self._lod_distance
+
+    @lod_distance.setter
+    def lod_distance(self, val: int):
+        assert isinstance(val, int) and val >= 0, 'lod distance must be a positive int'
+        self._lod_distance = val
+
+    def chunk_lod(self, chunk_coords: Tuple[int, int], current_lod: Optional[int] = None) -> int:
+        """The level of detail a chunk should be drawn at based on its distance from the camera.
+        0 is every block. 1 is a height map of the top surface.
+        :param chunk_coords: The chunk coordinates
+        :param current_lod: The level of detail the chunk is currently drawn at.
+            Full detail chunks are kept until they are two chunks further than lod_distance
+            so that small camera movements do not rebuild chunks back and forth.
+        """
+        cx, cz = int(self.camera_location[0]) >> 4, int(self.camera_location[2]) >> 4
+        distance = max(abs(chunk_coords[0] - cx), abs(chunk_coords[1] - cz))
+        lod_distance = self._lod_distance
+        if current_lod == 0:
+            lod_distance += 2
+        return 0 if distance <= lod_distance else 1
+
+    @property
+    def greedy_meshing(self) -> bool:
+        """Should the faces of full opaque blocks be merged into larger faces.
+        This reduces the size of the geometry of large flat areas."""
+        return self._greedy_meshing
+
+    @greedy_meshing.setter
+    def greedy_meshing(self, greedy_meshing: bool):
+        greedy_meshing = bool(greedy_meshing)
+        if greedy_meshing != self._greedy_meshing:
+            enabled = self._chunk_generator.enabled
+            self._chunk_generator.stop()
+            self._greedy_meshing = greedy_meshing
+            self._chunk_manager.unload()
+            if enabled:
+                self._chunk_generator.start()
+
+    @property
+    def compact_vertices(self) -> bool:
+        """Should the chunk geometry be stored in the compact vertex format.
+        This uses a third of the GPU memory of the default format."""
+        return self._compact_vertices
+
+    @compact_vertices.setter
+    def compact_vertices(self, compact_vertices: bool):
+        compact_vertices = bool(compact_vertices)
+        if compact_vertices and self._chunk_manager.region_size > compact_tri_mesh.max_region_size:
+            log.warning(
+                f'The compact vertex format does not support a region size above {compact_tri_mesh.max_region_size}. '
+                f'Using the default format.'
+            )
+            compact_vertices = False
+        if compact_vertices != self._compact_vertices:
+            enabled = self._chunk_generator.enabled
+            self._chunk_generator.stop()
+            self._compact_vertices = compact_vertices
+            self._chunk_manager.unload()
+            self._chunk_manager.compact_vertices = compact_vertices
+            if enabled:
+                self._chunk_generator.start()
+
+    @property
+    def mesh_cache(self) -> Optional[MeshCache]:
+        """The disk cache to load and store the section geometry in. None if disabled.
+        This is only accessed from the chunk generator thread."""
+        return self._mesh_cache
+
+    @mesh_cache.setter
+    def mesh_cache(self, mesh_cache: Optional[MeshCache]):
+        assert mesh_cache is None or isinstance(mesh_cache, MeshCache), 'mesh_cache must be a MeshCache or None'
+        enabled = self._chunk_generator.enabled
+        self._chunk_generator.stop()
+        self._mesh_cache = mesh_cache
+        if enabled:
+            self._chunk_generator.start()
+
+    def chunks_changed(self, chunk_coords: Optional[Iterable[Tuple[int, int]]] = None):
+        """Notify the renderer that the world data of some chunks has changed so their geometry needs rebuilding.
+        :param chunk_coords: The chunks in the current dimension that have changed.
+            If None all chunks in the render distance are checked for changes.
+        """
+        self._chunk_generator.chunks_changed(chunk_coords)
+
     def chunk_coords(self) -> Generator[Tuple[int, int], None, None]:
         """Get all of the chunks to draw/load"""
         cx, cz = int(self.camera_location[0]) >> 4, int(self.camera_location[2]) >> 4
@@ -242,7 +568,36 @@ class RenderWorld(ResourcePackManager, Drawable):
             sign *= -1
             length += 1
 
+    def chunk_priorities(self) -> Tuple[numpy.ndarray, numpy.ndarray]:
+        """The chunks within the render distance and the priority to load them in. Lower values are loaded first.
+        The priority is the distance from the camera with chunks behind the camera counted as up to twice as far away.
+        :return: The chunk coordinates (n, 2) and the priority of each chunk (n,)
+        """
+        cx, cz = int(self.camera_location[0]) >> 4, int(self.camera_location[2]) >> 4
+        render_distance = self.render_distance
+        offsets = numpy.mgrid[-render_distance:render_distance + 1, -render_distance:render_distance + 1].reshape((2, -1)).T
+        distance = numpy.hypot(offsets[:, 0], offsets[:, 1])
+        yaw = self.camera_rotation[1]
+        facing = numpy.array([sin(yaw), -cos(yaw)])
+        cos_angle = numpy.ones(len(offsets))
+        numpy.divide(offsets @ facing, distance, out=cos_angle, where=distance > 0)
+        priorities = distance * (1.5 - 0.5 * cos_angle)
+        return offsets + (cx, cz), priorities
+
+    def compact_range_exceeded(self):
+        """Report that chunk geometry was found that the compact vertex format cannot store.
+        The world is drawn in the default format from the next frame. This can be called from any thread."""
+        self._compact_range_exceeded = True
+
     def draw(self, transformation_matrix: numpy.ndarray):
+        if self._compact_range_exceeded:
+            self._compact_range_exceeded = False
+            if self._compact_vertices:
+                log.warning('The world has geometry outside the range of the compact vertex format. Using the default format.')
+                self.compact_vertices = False
+        if self._compact_vertices and self._texture_bounds_changed:
+            compact_tri_mesh.set_texture_bounds(self.context_identifier, self.texture_bounds_array)
+            self._texture_bounds_changed = False
         self._chunk_manager.draw(transformation_matrix, self.camera_location)
 
     def run_garbage_collector(self, remove_all=False):
@@ -0,0 +1,146 @@
+"""Functions to find which sections of the world can be seen from the camera through non-opaque blocks.
+While meshing, the connectivity of each 16x16x16 section is found. This is which of the six faces of the
+section can be seen from each other through the blocks in the section.
+At draw time a flood fill from the section the camera is in finds the sections that can be reached.
+Sections only visible through opaque blocks (eg caves below the camera) do not need drawing.
+
+Face connectivity is stored as an int with bit (a * 6 + b) set if face a can see face b."""
+
+from typing import Tuple
+import numpy
+
+# the faces of a section. The opposite face of face n is n ^ 1
+# down, up, north, south, west, east
+FACE_DIRECTIONS = numpy.array([
+    (0, -1, 0),
+    (0, 1, 0),
+    (0, 0, -1),
+    (0, 0, 1),
+    (-1, 0, 0),
+    (1, 0, 0),
+])
+ALL_VISIBLE = (1 << 36) - 1  # every face can see every other face. Used for empty and unknown sections.
+_face_slices = (
+    (slice(None), 0, slice(None)),
+    (slice(None), -1, slice(None)),
+    (slice(None), slice(None), 0),
+    (slice(None), slice(None), -1),
+    (0, slice(None), slice(None)),
+    (-1, slice(None), slice(None)),
+)
+
+
+def _label_regions(open_blocks: numpy.ndarray) -> numpy.ndarray:
+    """Label the connected regions of open blocks.
+    Each open block gets the smallest flat index in its region. Closed blocks are -1.
+    Labels are spread along every run of open blocks in one axis at a time until nothing changes.
+    This takes a few passes for most sections rather than one per block of path length."""
+    labels = numpy.where(open_blocks, numpy.arange(open_blocks.size, dtype=numpy.int32).reshape(open_blocks.shape), -1)
+    changed = True
+    while changed:
+        changed = False
+        for axis in range(3):
+            rows = numpy.moveaxis(labels, axis, -1)
+            shape = rows.shape
+            rows = rows.reshape((-1, shape[-1]))
+            mask = numpy.moveaxis(open_blocks, axis, -1).reshape((-1, shape[-1]))
+            run_starts = mask.copy()
+            run_starts[:, 1:] &= numpy.logical_not(mask[:, :-1])
+            values = rows[mask]
+            starts = run_starts[mask]
+            run_min = numpy.minimum.reduceat(values, numpy.flatnonzero(starts))
+            new_values = run_min[numpy.cumsum(starts) - 1]
+            if numpy.any(new_values != values):
+                changed = True
+                rows[mask] = new_values
+                labels = numpy.moveaxis(rows.reshape(shape), -1, axis)
+    return labels
+
+
+def section_visibility(opaque: numpy.ndarray) -> int:
+    """Find which faces of a section can see each other.
+    :param opaque: bool array of shape (16, 16, 16) in x, y, z order. True where the block cannot be seen through.
+    :return: The face connectivity as an int with bit (a * 6 + b) set if face a can see face b
+    """
+    open_blocks = numpy.logical_not(opaque)
+    if open_blocks.all():
+        return ALL_VISIBLE
+    if not open_blocks.any():
+        return 0
+    labels = _label_regions(open_blocks)
+    face_labels = []
+    for face_slice in _face_slices:
+        face = labels[face_slice]
+        face_labels.append(numpy.unique(face[face >= 0]))
+    visibility = 0
+    for face_a in range(6):
+        for face_b in range(face_a, 6):
+            if face_labels[face_a].size and face_labels[face_b].size and numpy.intersect1d(face_labels[face_a], face_labels[face_b], assume_unique=True).size:
+                visibility |= (1 << (face_a * 6 + face_b)) | (1 << (face_b * 6 + face_a))
+    return visibility
+
+
+def find_visible_sections(visibility: numpy.ndarray, camera: Tuple[int, int, int]) -> numpy.ndarray:
+    """Flood fill from the camera section through the faces that can see each other.
+    The fill only moves away from the camera along each axis so that it does not wrap around opaque regions
+    and come back towards the camera. This is conservative in the direction of visibility.
+    :param visibility: uint64 array of the face connectivity of each section. Shape (x, y, z)
+    :param camera: The index of the camera section in the visibility array
+    :return: bool array of the same shape. True for sections that may be visible.
+    """
+    shape = visibility.shape
+    exits = numpy.stack([
+        ((visibility >> numpy.uint64(face * 6)) & numpy.uint64(63)).astype(numpy.uint8) for face in range(6)
+    ])
+    # the directions that each section can be left in without moving towards the camera
+    indexes = numpy.indices(shape)
+    away = numpy.zeros(shape, dtype=numpy.uint8)
+    for face, direction in enumerate(FACE_DIRECTIONS):
+        axis = int(numpy.flatnonzero(direction)[0])
+        away[(indexes[axis] - camera[axis]) * direction[axis] >= 0] |= 1 << face
+
+    reached = numpy.zeros(shape, dtype=numpy.bool_)
+    reached[camera] = True
+    entered = numpy.zeros(shape, dtype=numpy.uint8)  # the faces each section has been entered through
+    leaving = numpy.zeros(shape, dtype=numpy.uint8)  # the faces to leave each section through in this step
+    leaving[camera] = 63
+    while True:
+        leaving &= away
+        new_entered = numpy.zeros(shape, dtype=numpy.uint8)
+        for face, direction in enumerate(FACE_DIRECTIONS):
+            leave = (leaving >> face) & 1
+            src = tuple(slice(max(0, -d), s - max(0, d)) for d, s in zip(direction, shape))
+            dst = tuple(slice(max(0, d), s - max(0, -d)) for d, s in zip(direction, shape))
+            new_entered[dst] |= leave[src] << (face ^ 1)
+        new_entered &= ~entered
+        if not new_entered.any():
+            break
+        entered |= new_entered
+        reached |= new_entered.astype(numpy.bool_)
+        leaving = numpy.zeros(shape, dtype=numpy.uint8)
+        for face in range(6):
+            leaving |= exits[face] * ((new_entered >> face) & 1)
+    return reached
+
+
+class SectionVisibility:
+    def __init__(self, origin: Tuple[int, int, int], visible: numpy.ndarray):
+        """The result of find_visible_sections.
+        :param origin: The section coordinates of index (0, 0, 0) of the visible array
+        :param visible: bool array. True for sections that may be visible
+        """
+        self._origin = numpy.array(origin)
+        self._visible = visible
+
+    def is_visible(self, cx: numpy.ndarray, cy: numpy.ndarray, cz: numpy.ndarray) -> numpy.ndarray:
+        """Look up if sections may be visible. Sections outside the searched area are visible.
+        :param cx: int array of section x coordinates
+        :param cy: int array of section y coordinates
+        :param cz: int array of section z coordinates
+        :return: bool array
+        """
+        index = numpy.stack((cx, cy, cz)) - self._origin[:, numpy.newaxis]
+        inside = numpy.all((index >= 0) & (index < numpy.array(self._visible.shape)[:, numpy.newaxis]), axis=0)
+        visible = numpy.ones(len(cx), dtype=numpy.bool_)
+        visible[inside] = self._visible[tuple(index[:, inside])]
+        return visible
@@ -1,9 +1,48 @@
-from typing import Any, Dict, Tuple
+from typing import Any, Dict, Tuple, Optional, List
+import numpy
+import hashlib
+import os
 
 import minecraft_model_reader
 import PyMCTranslate
 from amulet.api.block import BlockManager
 
+from amulet_map_editor import log
+from amulet_map_editor.opengl import disk_cache
+from amulet_map_editor.opengl.mesh.base.chunk_builder import create_model_template, ModelTemplateType
+
+_model_cache_path = os.path.abspath(os.path.join('.', 'cache', 'block_models'))
+_model_cache_version = 1  # increment if the MinecraftMesh format changes
+_model_cache_entries = 4  # the number of translator and resource pack combinations to keep on disk
+
+
+def _model_reader_version() -> Optional[str]:
+    """The installed version of minecraft_model_reader. An upgrade can change how the models are created.
+    None if it could not be found."""
+    version = getattr(minecraft_model_reader, '__version__', None)
+    if version is None:
+        try:
+            from importlib.metadata import version as package_version
+            version = package_version('minecraft-resource-pack')
+        except Exception:
+            return None
+    return str(version)
+
+
+def _resource_pack_files(resource_pack: minecraft_model_reader.BaseRPHandler) -> List[str]:
+    """The blockstate and model files of each resource pack in the order the packs are loaded."""
+    paths = []
+    for pack_path in resource_pack.pack_paths:
+        assets = os.path.join(pack_path, 'assets')
+        if not os.path.isdir(assets):
+            continue
+        for namespace in sorted(os.listdir(assets)):
+            for folder in ('blockstates', 'models'):
+                for root, dirs, files in os.walk(os.path.join(assets, namespace, folder)):
+                    dirs.sort()
+                    paths += [os.path.join(root, file) for file in sorted(files)]
+    return paths
+
 
 class ResourcePackManager:
     def __init__(
@@ -18,28 +57,93 @@ class ResourcePackManager:
         self._texture = texture
         self._resource_pack = resource_pack
         self._texture_bounds: Dict[Any, Tuple[float, float, float, float]] = texture_bounds
+        self._texture_index: Dict[Any, int] = {}
+        self._texture_bounds_array: numpy.ndarray = None
+        self._texture_digest = b''
+        self._model_digest: Optional[bytes] = None  # created when first used because it reads every model file
+        self._set_texture_index()
         self._resource_pack_translator = translator
 
         self._block_models: Dict[int, minecraft_model_reader.MinecraftMesh] = {}
+        self._block_templates: Dict[Tuple[int, bool], ModelTemplateType] = {}
+        self._block_strings: Dict[int, str] = {}
+
+        # block string: model. Loaded from disk by load_model_cache and shared between sessions.
+        self._model_cache: Dict[str, minecraft_model_reader.MinecraftMesh] = {}
+        self._model_cache_id: Optional[str] = None  # the file the model cache is stored in. None if disabled.
+        self._model_cache_changed = False
 
     def set_resource_pack(
         self,
         resource_pack: minecraft_model_reader.BaseRPHandler,
         texture_bounds: Dict[Any, Tuple[float, float, float, float]]
     ):
+        model_cache_enabled = self._model_cache_id is not None
+        self.save_model_cache()
         self._resource_pack = resource_pack
         self._texture_bounds = texture_bounds
+        self._model_digest = None
+        self._set_texture_index()
         self._block_models.clear()
+        self._block_templates.clear()
+        if model_cache_enabled:
+            self.load_model_cache()
+
+    def _set_texture_index(self):
+        """Number the textures so that they can be looked up by index in the compact vertex format."""
+        self._texture_index = {texture: index for index, texture in enumerate(self._texture_bounds)}
+        self._texture_bounds_array = numpy.array(
+            list(self._texture_bounds.values()), dtype=numpy.float32
+        ).reshape((-1, 4))
+        # identifies the textures and the texture indexes. The order matters for the texture indexes.
+        self._texture_digest = hashlib.blake2b(
+            repr(list(self._texture_bounds.items())).encode(), digest_size=16
+        ).digest()
 
     @property
     def texture(self) -> int:
         return self._texture
 
+    @property
+    def texture_bounds(self) -> Dict[Any, Tuple[float, float, float, float]]:
+        return self._texture_bounds
+
     def get_texture_bounds(self, texture):
         if texture not in self._texture_bounds:
             texture = ('minecraft', 'missing_no')
         return self._texture_bounds[texture]
 
+    @property
+    def texture_bounds_array(self) -> numpy.ndarray:
+        """The texture bounds in the order of the texture indexes. Shape (texture_count, 4)"""
+        return self._texture_bounds_array
+
+    @property
+    def texture_digest(self) -> bytes:
+        """A hash of the texture bounds. Changes if the textures or their locations in the atlas change."""
+        return self._texture_digest
+
+    @property
+    def model_digest(self) -> bytes:
+        """A hash of everything the block models are created from.
+        Changes if the translator, the minecraft_model_reader version or any blockstate, model or texture file in the resource packs changes."""
+        if self._model_digest is None:
+            key = hashlib.blake2b(digest_size=20)
+            translator = self._resource_pack_translator
+            key.update(repr((translator.platform, translator.version_number)).encode())
+            key.update(repr(_model_reader_version()).encode())
+            for path in _resource_pack_files(self._resource_pack):
+                key.update(repr((path, disk_cache.file_state(path))).encode())
+            for texture_id, texture_path in self._resource_pack.textures.items():
+                key.update(repr((texture_id, texture_path, disk_cache.file_state(texture_path))).encode())
+            self._model_digest = key.digest()
+        return self._model_digest
+
+    def get_texture_index(self, texture) -> int:
+        if texture not in self._texture_index:
+            texture = ('minecraft', 'missing_no')
+        return self._texture_index[texture]
+
     @property
     def _palette(self) -> BlockManager:
         raise NotImplementedError
@@ -50,9 +154,75 @@ class ResourcePackManager:
 
     @translator.setter
     def translator(self, translator: PyMCTranslate.Version):
+        model_cache_enabled = self._model_cache_id is not None
+        self.save_model_cache()
         self._resource_pack_translator = translator
+        self._model_digest = None
+        self._block_models.clear()
+        self._block_templates.clear()
+        if model_cache_enabled:
+            self.load_model_cache()
+
+    def _get_model_cache_id(self) -> str:
+        """The identifier of the model cache for the current translator, resource packs and model reader."""
+        key = hashlib.blake2b(digest_size=20)
+        key.update(repr(_model_cache_version).encode())
+        key.update(self.model_digest)
+        return key.hexdigest()
+
+    def load_model_cache(self):
+        """Enable the disk cache of block models and load the models cached by previous sessions.
+        The models for the blocks already in the palette are looked up in bulk.
+        This reads the state of every blockstate, model and texture file in the resource packs
+        so it is not enabled unless this is called."""
+        if _model_reader_version() is None:
+            log.info('The block model cache is disabled because the minecraft_model_reader version could not be found')
+            return
+        self._model_cache_id = self._get_model_cache_id()
+        self._model_cache = disk_cache.load_entry(_model_cache_path, self._model_cache_id) or {}
+        self._model_cache_changed = False
+        for pallete_index in range(len(self._palette)):
+            block_string = self.get_block_string(pallete_index)
+            if block_string in self._model_cache:
+                self._block_models[pallete_index] = self._model_cache[block_string]
+        log.info(f'Loaded {len(self._model_cache)} block models from the cache')
+
+    def save_model_cache(self):
+        """Save the block model cache to disk if anything has been added to it."""
+        if self._model_cache_id is None or not self._model_cache_changed:
+            return
+        if disk_cache.save_entry(_model_cache_path, self._model_cache_id, self._model_cache, _model_cache_entries):
+            self._model_cache_changed = False
+
+    def _get_texture_index_bounds(self, texture) -> Tuple[int, int, int, int]:
+        return self.get_texture_index(texture), 0, 0, 0
+
+    def get_block_template(self, pallete_index: int, texture_index: bool = False) -> ModelTemplateType:
+        """Get the vertex template of the block model. See chunk_builder.create_model_template.
+        :param pallete_index: The index of the block in the palette
+        :param texture_index: If True the texture bounds are replaced with the texture index for the compact vertex format.
+        """
+        key = (pallete_index, texture_index)
+        if key not in self._block_templates:
+            self._block_templates[key] = create_model_template(
+                self.get_block_model(pallete_index),
+                self._get_texture_index_bounds if texture_index else self.get_texture_bounds
+            )
+        return self._block_templates[key]
+
+    def get_block_string(self, pallete_index: int) -> str:
+        """A string representation of the block that is the same between sessions.
+        The palette index is only valid for this session."""
+        if pallete_index not in self._block_strings:
+            self._block_strings[pallete_index] = repr(self._palette[pallete_index])
+        return self._block_strings[pallete_index]
 
     def get_block_model(self, pallete_index: int) -> minecraft_model_reader.MinecraftMesh:
+        if pallete_index not in self._block_models and self._model_cache_id is not None:
+            block_string = self.get_block_string(pallete_index)
+            if block_string in self._model_cache:
+                self._block_models[pallete_index] = self._model_cache[block_string]
+
         if pallete_index not in self._block_models:
             block = self._palette[pallete_index]
             extra_blocks = tuple()
@@ -70,5 +240,8 @@ class ResourcePackManager:
             self._block_models[pallete_index] = self._resource_pack.get_model(
                 block
             )
+            if self._model_cache_id is not None:
+                self._model_cache[self.get_block_string(pallete_index)] = self._block_models[pallete_index]
+                self._model_cache_changed = True
 
         return self._block_models[pallete_index]
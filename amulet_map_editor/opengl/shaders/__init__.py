@@ -1,25 +1,44 @@
 from OpenGL.GL import *
 import OpenGL.GL.shaders
 import os
-from typing import Dict, Tuple, Any
+from typing import Dict, Tuple, Any, Union
 
 shader_dir = os.path.join(os.path.dirname(__file__))
-_shaders: Dict[Tuple[str, str], Any] = {}
+# the name of the vertex and fragment shader files without the extension.
+# A single name is used for both. A tuple of (vertex name, fragment name) lets shaders share a fragment shader.
+ShaderNameType = Union[str, Tuple[str, str]]
+_shaders: Dict[Tuple[str, ShaderNameType], Any] = {}
+_sampler_units = {  # the texture unit each sampler uniform reads from
+    'image': 0,
+    'texture_bounds': 1,
+}
 
 
-def get_shader(context_identifier: str, shader_name: str) -> OpenGL.GL.shaders.ShaderProgram:
+def get_shader(context_identifier: str, shader_name: ShaderNameType) -> OpenGL.GL.shaders.ShaderProgram:
     shader_key = (context_identifier, shader_name)
     if shader_key not in _shaders:
-        def compile_shader():
-            return OpenGL.GL.shaders.compileProgram(
-                _load_shader(os.path.join(shader_dir, f'{shader_name}.vert'), GL_VERTEX_SHADER),
-                _load_shader(os.path.join(shader_dir, f'{shader_name}.frag'), GL_FRAGMENT_SHADER)
-            )
+        if isinstance(shader_name, str):
+            vert_name = frag_name = shader_name
+        else:
+            vert_name, frag_name = shader_name
+        shader = OpenGL.GL.shaders.compileProgram(
+            _load_shader(os.path.join(shader_dir, f'{vert_name}.vert'), GL_VERTEX_SHADER),
+            _load_shader(os.path.join(shader_dir, f'{frag_name}.frag'), GL_FRAGMENT_SHADER),
+            validate=False
+        )
+        # Every sampler defaults to texture unit 0 and samplers of different types may not share a unit
+        # so the units are set before the program is validated.
+        glUseProgram(shader)
+        for sampler_name, unit in _sampler_units.items():
+            location = glGetUniformLocation(shader, sampler_name)
+            if location != -1:
+                glUniform1i(location, unit)
+        glUseProgram(0)
         try:
-            shader = compile_shader()
+            shader.check_validate()
         except OpenGL.GL.shaders.ShaderValidationError: # on Mac the above fails if there is no VBO bound
             glBindVertexArray(glGenVertexArrays(1))
-            shader = compile_shader()
+            shader.check_validate()
             glBindVertexArray(0)
 
         _shaders[shader_key] = shader
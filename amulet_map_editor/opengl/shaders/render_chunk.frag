@@ -5,14 +5,20 @@ in vec3 fTint;
 
 out vec4 outColor;
 
-uniform sampler2D image;
+uniform sampler2DArray image;
 
 void main(){
+    // the texture bounds are relative to all the layers of the atlas side by side.
+    // The layer is found from the left edge which is offset by half a pixel to avoid rounding errors.
+    ivec3 atlasSize = textureSize(image, 0);
+    float layers = float(atlasSize.z);
+    float layer = floor(fTexOffset.x * layers + 0.5 / float(atlasSize.x));
     vec4 texColor = texture(
     	image,
-    	vec2(
-			mix(fTexOffset.x, fTexOffset.z, mod(fTexCoord.x, 1.0)),
-			mix(fTexOffset.y, fTexOffset.w, mod(fTexCoord.y, 1.0))
+    	vec3(
+			mix(fTexOffset.x, fTexOffset.z, mod(fTexCoord.x, 1.0)) * layers - layer,
+			mix(fTexOffset.y, fTexOffset.w, mod(fTexCoord.y, 1.0)),
+			layer
 		)
 	);
 	if(texColor.a < 0.02)
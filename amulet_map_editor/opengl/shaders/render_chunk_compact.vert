@@ -0,0 +1,19 @@
+# version 330
+layout(location = 0) in vec3 positions;
+layout(location = 1) in vec2 vTexCoord;
+layout(location = 2) in uint vTexIndex;
+layout(location = 3) in vec3 vTint;
+
+out vec2 fTexCoord;
+out vec4 fTexOffset;
+out vec3 fTint;
+
+uniform mat4 transformation_matrix;
+uniform samplerBuffer texture_bounds;
+
+void main(){
+    gl_Position = transformation_matrix * vec4(positions / 64.0, 1.0);
+    fTexCoord = vTexCoord;
+    fTexOffset = texelFetch(texture_bounds, int(vTexIndex));
+    fTint = vTint;
+}
\ No newline at end of file
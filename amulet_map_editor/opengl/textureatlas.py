@@ -25,8 +25,16 @@
 from PIL import Image
 import numpy
 import math
+import os
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
 from typing import Dict, Tuple, List, Any, Optional
 from amulet_map_editor import log
+from amulet_map_editor.opengl import disk_cache
+
+_cache_path = os.path.abspath(os.path.join('.', 'cache', 'texture_atlas'))
+_cache_version = 2  # increment if the atlas layout or the cache format changes
+_cache_entries = 4  # the number of atlases to keep in the cache
 
 DESCRIPTION = """Packs many smaller images into one larger image, a Texture
 Atlas. A companion file (.map), is created that defines where each texture is
@@ -145,16 +153,24 @@ class PackRegion(object):
         return self._sub1.pack(packable, border) or self._sub2.pack(packable, border)
 
 
+def load_image(filename: str) -> Image.Image:
+    """Load an image and close the file."""
+    image: Image.Image = Image.open(filename)
+    image_copy = image.copy()
+    image.close()
+    return image_copy
+
+
 class Frame(Packable):
     """An image file that can be packed into a PackRegion."""
 
-    def __init__(self, filename: str):
+    def __init__(self, filename: str, image: Image.Image = None):
         self._filename = filename
 
         # Determine frame dimensions
-        image: Image.Image = Image.open(filename)
-        self._image: Image.Image = image.copy()
-        image.close()
+        if image is None:
+            image = load_image(filename)
+        self._image: Image.Image = image
 
         width, height = self._image.size
 
@@ -201,10 +217,26 @@ class TextureAtlas(PackRegion):
 
     def pack(self, texture: Texture):
         """Pack a Texture into this atlas."""
-        self._textures.append(texture)
+        if not self.try_pack(texture):
+            raise AtlasTooSmall('Failed to pack texture %s' % texture.name)
+
+    def try_pack(self, texture: Texture) -> bool:
+        """Pack a Texture into this atlas. Returns False if there was not space.
+        If a texture with more than one frame does not fit the space used by the frames that did fit is not reclaimed."""
         for frame in texture.frames:
-            if not super(TextureAtlas, self).pack(frame, self._border):
-                raise AtlasTooSmall('Failed to pack frame %s' % frame.filename)
+            if not self._pack_frame(frame):
+                return False
+        self._textures.append(texture)
+        return True
+
+    def _pack_frame(self, frame: Frame) -> bool:
+        """Pack a Frame into this atlas. Returns False if there was not space."""
+        return super(TextureAtlas, self).pack(frame, self._border)
+
+    @property
+    def fill_ratio(self) -> float:
+        """The fraction of the atlas area used by frames."""
+        return sum(f.width * f.height for t in self._textures for f in t.frames) / (self.width * self.height)
 
     def to_dict(self) -> Dict[str, Tuple[int, int, int, int]]:
         return {
@@ -230,6 +262,85 @@ class TextureAtlas(PackRegion):
         out.save(filename)
 
 
+class SkylineTextureAtlas(TextureAtlas):
+    """Texture Atlas generator using the bottom-left skyline algorithm.
+    Unlike the binary tree packer in PackRegion this is not recursive and
+    the time to pack a frame depends on the width of the atlas rather than the number of frames packed."""
+
+    def __init__(self, width: int, height: int, border: int = 0):
+        super(SkylineTextureAtlas, self).__init__(width, height, border)
+        # The top edge of the packed frames. Each segment is [x, y, width] ordered by x and covering the full width.
+        self._skyline: List[List[int]] = [[0, 0, width]]
+
+    def _find_position(self, width: int, height: int) -> Optional[Tuple[int, int, int]]:
+        """Find the position that leaves the top of the frame lowest.
+        :return: The index of the skyline segment the frame starts at, the x position and the y position. None if it does not fit."""
+        best = None
+        best_top = best_width = None
+        skyline = self._skyline
+        for index in range(len(skyline)):
+            x = skyline[index][0]
+            if x + width > self._width:
+                break
+            # the frame must sit on the highest segment it spans
+            y = 0
+            remaining = width
+            end = index
+            while remaining > 0:
+                y = max(y, skyline[end][1])
+                remaining -= skyline[end][2]
+                end += 1
+            top = y + height
+            if top > self._height:
+                continue
+            segment_width = skyline[index][2]
+            if best is None or top < best_top or (top == best_top and segment_width < best_width):
+                best = (index, x, y)
+                best_top = top
+                best_width = segment_width
+        return best
+
+    def _pack_frame(self, frame: Frame) -> bool:
+        width = frame.width + self._border * 2
+        height = frame.height + self._border * 2
+        position = self._find_position(width, height)
+        if position is None:
+            return False
+        index, x, y = position
+        frame.x = x + self._border
+        frame.y = y + self._border
+
+        skyline = self._skyline
+        skyline.insert(index, [x, y + height, width])
+        # shrink or remove the segments now below the frame
+        right = x + width
+        index += 1
+        while index < len(skyline) and skyline[index][0] < right:
+            segment = skyline[index]
+            segment_right = segment[0] + segment[2]
+            if segment_right <= right:
+                del skyline[index]
+            else:
+                segment[2] = segment_right - right
+                segment[0] = right
+                break
+        # merge neighbouring segments of the same height
+        index = 0
+        while index < len(skyline) - 1:
+            if skyline[index][1] == skyline[index + 1][1]:
+                skyline[index][2] += skyline[index + 1][2]
+                del skyline[index + 1]
+            else:
+                index += 1
+        return True
+
+
+_packers = {
+    'tree': TextureAtlas,
+    'skyline': SkylineTextureAtlas
+}
+
+
 class TextureAtlasMap(object):
     """Texture Atlas Map file generator."""
 
@@ -241,22 +352,38 @@ class TextureAtlasMap(object):
         raise Exception('Not Implemented')
 
 
-def create_atlas(texture_dict: Dict[Any, str]) -> Tuple[numpy.ndarray, Dict[Any, Tuple[float, float, float, float]], int, int]:
-    log.info('Creating texture atlas')
-    # Parse texture names
-    textures = []
-    for texture in texture_dict.values():
-        # Look for a texture name
-        name, frames = texture, [texture]
-
-        # Build frame objects
-        frames = [Frame(f) for f in frames]
-
-        # Add frames to texture object list
-        textures.append(Texture(name, frames))
-
-    # Sort textures by perimeter size in non-increasing order
-    textures = sorted(textures, key=lambda i: i.frames[0].perimeter, reverse=True)
+def _cache_key(texture_dict: Dict[Any, str], packer: str, max_size: Optional[int]) -> Optional[str]:
+    """The cache key of an atlas. Changes if any of the texture files change.
+    Returns None if a texture file could not be found."""
+    key = hashlib.blake2b(digest_size=20)
+    key.update(repr((_cache_version, packer, max_size)).encode())
+    for tex_id, texture_path in texture_dict.items():
+        state = disk_cache.file_state(texture_path)
+        if state is None:
+            return None
+        key.update(repr((tex_id, texture_path, state)).encode())
+    return key.hexdigest()
+
+
+def _sort_textures(textures: List[Texture], packer: str) -> List[Texture]:
+    """Sort the textures into the order they should be packed in."""
+    if packer == 'skyline':
+        # the skyline packer leaves less space when the tallest frames are packed first
+        return sorted(textures, key=lambda i: (i.frames[0].height, i.frames[0].width), reverse=True)
+    else:
+        # Sort textures by perimeter size in non-increasing order
+        return sorted(textures, key=lambda i: i.frames[0].perimeter, reverse=True)
+
+
+def pack_textures(textures: List[Texture], packer: str = 'tree', max_size: int = None) -> TextureAtlas:
+    """Pack the textures into the smallest square power of two atlas they fit in.
+    :param textures: The textures to pack
+    :param packer: The packing algorithm to use. "tree" for the binary tree packer or "skyline" for the skyline packer.
+    :param max_size: The maximum width and height of the atlas. AtlasTooSmall is raised if the textures do not fit. None for no limit.
+    :return: The packed atlas
+    """
+    atlas_class = _packers[packer]
+    textures = _sort_textures(textures, packer)
 
     height = 0
     width = 0
@@ -276,10 +403,12 @@ def create_atlas(texture_dict: Dict[Any, str]) -> Tuple[numpy.ndarray, Dict[Any,
     atlas_created = False
     atlas = None
     while not atlas_created:
+        if max_size is not None and size > max_size:
+            raise AtlasTooSmall(f'The textures do not fit in an image of size {max_size}x{max_size}')
         try:
             # Create the atlas and pack textures in
             log.info(f'Trying to pack textures into image of size {size}x{size}')
-            atlas = TextureAtlas(size, size)
+            atlas = atlas_class(size, size)
 
             for texture in textures:
                 atlas.pack(texture)
@@ -289,11 +418,106 @@ def create_atlas(texture_dict: Dict[Any, str]) -> Tuple[numpy.ndarray, Dict[Any,
             size *= 2
 
     log.info(f'Successfully packed textures into an image of size {size}x{size}')
+    return atlas
+
+
+def pack_texture_pages(textures: List[Texture], packer: str = 'skyline', max_size: int = None) -> List[TextureAtlas]:
+    """Pack the textures into one or more atlases of the same size.
+    If the textures fit in one atlas no larger than max_size this is the same as pack_textures.
+    Otherwise the textures are packed into as many atlases of size max_size as are needed.
+    :param textures: The textures to pack
+    :param packer: The packing algorithm to use. "tree" for the binary tree packer or "skyline" for the skyline packer.
+    :param max_size: The maximum width and height of each atlas. None for no limit.
+    :return: The packed atlases
+    """
+    try:
+        return [pack_textures(textures, packer, max_size)]
+    except AtlasTooSmall:
+        pass
+
+    atlas_class = _packers[packer]
+    pages: List[TextureAtlas] = []
+    # the textures are sorted largest first so textures of a similar size end up in the same page
+    for texture in _sort_textures(textures, packer):
+        for page in pages:
+            if page.try_pack(texture):
+                break
+        else:
+            page = atlas_class(max_size, max_size)
+            if not page.try_pack(texture):
+                raise AtlasTooSmall(f'Texture {texture.name} is larger than {max_size}x{max_size}')
+            pages.append(page)
+
+    log.info(f'Successfully packed textures into {len(pages)} images of size {max_size}x{max_size}')
+    return pages
+
+
+def create_atlas(texture_dict: Dict[Any, str], use_cache: bool = True, threads: int = None, packer: str = 'skyline') -> Tuple[numpy.ndarray, Dict[Any, Tuple[float, float, float, float]], int, int]:
+    """Pack the textures into one image.
+    :param texture_dict: A dictionary mapping texture identifier to the path of the texture file.
+    :param use_cache: Should the atlas be loaded from and saved to the disk cache. The cache is invalidated when any texture file changes.
+    :param threads: The number of threads to load the images in. Defaults to the ThreadPoolExecutor default.
+    :param packer: The packing algorithm to use. "tree" for the binary tree packer or "skyline" for the skyline packer.
+    :return: The flat RGBA atlas array, a dictionary mapping texture identifier to texture bounds, the atlas width, the atlas height
+    """
+    texture_atlas, texture_bounds, width, height, _ = create_atlas_array(texture_dict, None, use_cache, threads, packer)
+    return texture_atlas, texture_bounds, width, height
+
+
+def create_atlas_array(texture_dict: Dict[Any, str], max_size: Optional[int], use_cache: bool = True, threads: int = None, packer: str = 'skyline') -> Tuple[numpy.ndarray, Dict[Any, Tuple[float, float, float, float]], int, int, int]:
+    """Pack the textures into one or more images of the same size to be used as the layers of an array texture.
+    The texture bounds are relative to all the layers placed side by side.
+    The layer of a texture is floor(bounds[0] * layers) and the x bounds within the layer are bounds[0::2] * layers - layer.
+    If everything fits in one layer the texture bounds are the same as a normal 2D atlas.
+    :param texture_dict: A dictionary mapping texture identifier to the path of the texture file.
+    :param max_size: The maximum width and height of each layer. Use the OpenGL maximum texture size. None for no limit.
+    :param use_cache: Should the atlas be loaded from and saved to the disk cache. The cache is invalidated when any texture file changes.
+    :param threads: The number of threads to load the images in. Defaults to the ThreadPoolExecutor default.
+    :param packer: The packing algorithm to use. "tree" for the binary tree packer or "skyline" for the skyline packer.
+    :return: The flat RGBA atlas array (layer, row, column, channel), a dictionary mapping texture identifier to texture bounds, the layer width, the layer height, the number of layers
+    """
+    assert packer in _packers, f'packer must be one of {list(_packers)}'
+    key = _cache_key(texture_dict, packer, max_size) if use_cache else None
+    if key is not None:
+        atlas = disk_cache.load_entry(_cache_path, key)
+        if atlas is not None:
+            log.info('Loaded texture atlas from the cache')
+            return atlas
+
+    log.info('Creating texture atlas')
+    # Decode the images in parallel. Each file is only loaded once.
+    texture_paths = list(dict.fromkeys(texture_dict.values()))
+    with ThreadPoolExecutor(threads) as executor:
+        images = dict(zip(texture_paths, executor.map(load_image, texture_paths)))
+
+    # Parse texture names
+    textures = []
+    for texture in texture_dict.values():
+        # Look for a texture name
+        name, frames = texture, [texture]
+
+        # Build frame objects
+        frames = [Frame(f, images[f]) for f in frames]
+
+        # Add frames to texture object list
+        textures.append(Texture(name, frames))
+
+    pages = pack_texture_pages(textures, packer, max_size)
+    layers = len(pages)
+    width, height = pages[0].width, pages[0].height
+
+    texture_atlas = numpy.stack(
+        [numpy.array(page.generate('RGBA'), numpy.uint8) for page in pages]
+    ).ravel()
 
-    texture_atlas = numpy.array(atlas.generate('RGBA'), numpy.uint8).ravel()
+    path_bounds = {}
+    for layer, page in enumerate(pages):
+        for texture_path, (x1, y1, x2, y2) in page.to_dict().items():
+            path_bounds[texture_path] = ((layer + x1) / layers, y1, (layer + x2) / layers, y2)
+    texture_bounds = {tex_id: path_bounds[texture_path] for tex_id, texture_path in texture_dict.items()}
 
-    texture_bounds = atlas.to_dict()
-    texture_bounds = {tex_id: texture_bounds[texture_path] for tex_id, texture_path in texture_dict.items()}
+    if key is not None:
+        disk_cache.save_entry(_cache_path, key, (texture_atlas, texture_bounds, width, height, layers), _cache_entries)
 
     log.info('Finished creating texture atlas')
-    return texture_atlas, texture_bounds, atlas.width, atlas.height
+    return texture_atlas, texture_bounds, width, height, layers
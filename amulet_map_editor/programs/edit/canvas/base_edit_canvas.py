@@ -17,6 +17,7 @@ from amulet_map_editor.opengl.mesh.world_renderer.world import RenderWorld, cos,
 from amulet_map_editor.opengl.mesh.structure import RenderStructure
 from amulet_map_editor.opengl import textureatlas
 from amulet_map_editor.opengl.canvas.base import BaseCanvas
+from amulet_map_editor.opengl.frame_profiler import FrameProfiler
 from amulet_map_editor import log
 from .render_selection import EditProgramRenderSelectionGroup
 from amulet_map_editor.programs.edit.canvas.events import (
@@ -29,6 +30,10 @@ from amulet_map_editor.programs.edit.canvas.events import (
 if TYPE_CHECKING:
     from amulet.api.world import World
 
+# the maximum width and height of each layer of the texture atlas.
+# Larger layers can waste a lot of memory when the last layer is mostly empty.
+_max_atlas_size = 8192
+
 
 class BaseEditCanvas(BaseCanvas):
     """Adds base logic for drawing everything related to the edit program to the BaseCanvas.
@@ -98,6 +103,14 @@ class BaseEditCanvas(BaseCanvas):
         self._structure_locations: List[numpy.ndarray] = []  # TODO rewrite this
 
         self._draw_timer = wx.Timer(self)
+        self._draw_interval = 33  # the time in ms between frames while the scene is changing
+        self._idle_draw_interval = 250  # the time in ms between checks for changes while the scene is not changing
+        self._idle_ticks = 8  # the number of frames without changes before the timer slows to the idle interval
+        self._ticks_since_draw = 0
+        self._on_demand_draw = True  # only redraw when something has changed
+        self._redraw_required = True
+        self.profiler = FrameProfiler()  # set enabled to True to record where the frame time goes
+        self._render_world.chunk_manager.profiler = self.profiler
         self._gc_timer = wx.Timer(self)
         self._rebuild_timer = wx.Timer(self)
         self._bind_base_events()
@@ -111,6 +124,7 @@ class BaseEditCanvas(BaseCanvas):
 
     def _bind_base_events(self):
         self.Bind(wx.EVT_TIMER, self._on_draw, self._draw_timer)
+        self.Bind(wx.EVT_PAINT, self._on_paint)
         self.Bind(wx.EVT_TIMER, self._gc, self._gc_timer)
         self.Bind(wx.EVT_TIMER, self._rebuild, self._rebuild_timer)
 
@@ -143,12 +157,14 @@ class BaseEditCanvas(BaseCanvas):
     @active_selection_corners.setter
     def active_selection_corners(self, box_corners: Tuple[BlockCoordinates, BlockCoordinates]):
         self._selection_group.active_selection_corners = box_corners
+        self.request_redraw()
 
     def enable(self):
         """Enable the canvas and start it working."""
         self.SetCurrent(self._context)
         self._render_world.enable()
-        self._draw_timer.Start(33)
+        self._redraw_required = True
+        self._draw_timer.Start(self._draw_interval)
         self._gc_timer.Start(10000)
         self._rebuild_timer.Start(1000)
 
@@ -159,6 +175,23 @@ class BaseEditCanvas(BaseCanvas):
         self._rebuild_timer.Stop()
         self._render_world.disable()
 
+    @property
+    def on_demand_draw(self) -> bool:
+        """If True the scene is only drawn when something has changed. If False it is drawn on every tick of the draw timer."""
+        return self._on_demand_draw
+
+    @on_demand_draw.setter
+    def on_demand_draw(self, on_demand_draw: bool):
+        self._on_demand_draw = bool(on_demand_draw)
+        self.request_redraw()
+
+    def request_redraw(self):
+        """Let the canvas know that the scene has changed and needs drawing again.
+        Code that changes what is drawn without using the properties of this class should call this."""
+        self._redraw_required = True
+        if self._draw_timer.IsRunning() and self._draw_timer.GetInterval() != self._draw_interval:
+            self._draw_timer.Start(self._draw_interval)
+
     def _disable_threads(self):
         """Stop the generation of new chunk geometry.
         Makes it safe to modify the world data."""
@@ -171,6 +204,10 @@ class BaseEditCanvas(BaseCanvas):
     def close(self):
         """Close and destroy the canvas and all contained data."""
         self._render_world.close()
+        if self._structure is not None:
+            self._structure.unload()
+        self._selection_group.unload()
+        self.profiler.unload()
         super()._close()
 
     def is_closeable(self):
@@ -182,13 +219,16 @@ class BaseEditCanvas(BaseCanvas):
         self._create_atlas()
 
     def _create_atlas(self):
-        """Create and bind the atlas texture."""
-        texture_atlas, self._texture_bounds, width, height = textureatlas.create_atlas(
-            self._resource_pack.textures
+        """Create and bind the atlas texture.
+        If the textures do not fit in the maximum texture size they are split over more than one layer."""
+        max_size = min(int(glGetIntegerv(GL_MAX_TEXTURE_SIZE)), _max_atlas_size)
+        texture_atlas, self._texture_bounds, width, height, layers = textureatlas.create_atlas_array(
+            self._resource_pack.textures,
+            max_size
         )
-        glBindTexture(GL_TEXTURE_2D, self._gl_texture_atlas)
-        glTexImage2D(GL_TEXTURE_2D, 0, GL_RGBA, width, height, 0, GL_RGBA, GL_UNSIGNED_BYTE, texture_atlas)
-        glBindTexture(GL_TEXTURE_2D, 0)
+        glBindTexture(GL_TEXTURE_2D_ARRAY, self._gl_texture_atlas)
+        glTexImage3D(GL_TEXTURE_2D_ARRAY, 0, GL_RGBA, width, height, layers, 0, GL_RGBA, GL_UNSIGNED_BYTE, texture_atlas)
+        glBindTexture(GL_TEXTURE_2D_ARRAY, 0)
         log.info('Finished setting up texture atlas in OpenGL')
 
     @property
@@ -196,15 +236,23 @@ class BaseEditCanvas(BaseCanvas):
         return self._structure
 
     @structure.setter
-    def structure(self, structure: Structure):
-        self._structure = RenderStructure(
-            self.context_identifier,
-            structure,
-            self._resource_pack,
-            self._gl_texture_atlas,
-            self._texture_bounds,
-            self._resource_pack_translator
-        )
+    def structure(self, structure: Optional[Structure]):
+        """Set the structure to draw at the structure locations.
+        Its geometry is built in the background. Set to None to stop building and drawing it."""
+        if self._structure is not None:
+            self._structure.unload()
+        if structure is None:
+            self._structure = None
+        else:
+            self._structure = RenderStructure(
+                self.context_identifier,
+                structure,
+                self._resource_pack,
+                self._gl_texture_atlas,
+                self._texture_bounds,
+                self._resource_pack_translator
+            )
+        self.request_redraw()
 
     @property
     def draw_structure(self) -> bool:
@@ -214,6 +262,7 @@ class BaseEditCanvas(BaseCanvas):
     @draw_structure.setter
     def draw_structure(self, draw_structure: bool):
         self._draw_structure = bool(draw_structure)
+        self.request_redraw()
 
     @property
     def structure_locations(self) -> List[numpy.ndarray]:
@@ -229,6 +278,7 @@ class BaseEditCanvas(BaseCanvas):
     @draw_selection.setter
     def draw_selection(self, draw_selection: bool):
         self._draw_selection = bool(draw_selection)
+        self.request_redraw()
 
     @property
     def selection_editable(self) -> bool:
@@ -238,6 +288,7 @@ class BaseEditCanvas(BaseCanvas):
     @selection_editable.setter
     def selection_editable(self, selection_editable: bool):
         self._selection_group.editable = bool(selection_editable)
+        self.request_redraw()
 
     @property
     def select_distance(self) -> int:
@@ -264,6 +315,7 @@ class BaseEditCanvas(BaseCanvas):
     @dimension.setter
     def dimension(self, dimension: Dimension):
         self._render_world.dimension = dimension
+        self.request_redraw()
         wx.PostEvent(self, DimensionChangeEvent(dimension=dimension))
 
     @property
@@ -276,6 +328,7 @@ class BaseEditCanvas(BaseCanvas):
         self._camera_location = location
         self._transformation_matrix = None
         self._selection_moved = True
+        self.request_redraw()
         wx.PostEvent(self, CameraMoveEvent(location=self.camera_location))
 
     @property
@@ -288,6 +341,7 @@ class BaseEditCanvas(BaseCanvas):
         self._camera_rotation = rotation
         self._transformation_matrix = None
         self._selection_moved = True
+        self.request_redraw()
         wx.PostEvent(self, CameraRotateEvent(rotation=self.camera_rotation))
 
     @property
@@ -444,27 +498,58 @@ class BaseEditCanvas(BaseCanvas):
         else:
             self.aspect_ratio = 1
         self.DoSetSize(0, 0, width, height, 0)  # I don't know if this is how you are supposed to do this
+        self.request_redraw()
+
+    def _on_paint(self, event):
+        wx.PaintDC(self)  # this must be created in paint events even if it is not used
+        self.request_redraw()
+
+    def _needs_redraw(self) -> bool:
+        """Has anything changed since the last frame was drawn."""
+        return (
+            not self._on_demand_draw
+            or self._redraw_required
+            or self._selection_moved
+            or self._render_world.chunk_manager.redraw_required
+            or (self._draw_structure and self._structure is not None and self._structure.redraw_required)
+        )
 
     def _on_draw(self, event):
-        self.draw()
+        if self._needs_redraw():
+            self._ticks_since_draw = 0
+            if self._draw_timer.GetInterval() != self._draw_interval:
+                self._draw_timer.Start(self._draw_interval)
+            self.draw()
+        else:
+            self.profiler.skip_frame()
+            self._ticks_since_draw += 1
+            if self._ticks_since_draw == self._idle_ticks:
+                # nothing is changing so check less often
+                self._draw_timer.Start(self._idle_draw_interval)
         event.Skip()
 
     def draw(self):
+        profiler = self.profiler
+        profiler.begin_frame()
+        self._redraw_required = False
         glClear(GL_COLOR_BUFFER_BIT | GL_DEPTH_BUFFER_BIT)
-        self._render_world.draw(self.transformation_matrix)
+        with profiler.stage('world'):
+            self._render_world.draw(self.transformation_matrix)
         if self._draw_structure and self._structure is not None:
-            transform = numpy.eye(4, dtype=numpy.float64)
-            for location in self.structure_locations:
-                transform[3, 0:3] = location
-                self._structure.draw(numpy.matmul(transform, self.transformation_matrix), 0, 0)
-        if self._selection_moved:
-            self._selection_moved = False
-            self._change_box_location()
-        self._selection_group.draw(
-            self.transformation_matrix,
-            tuple(self.camera_location),
-            self.draw_selection
-        )
+            with profiler.stage('structure'):
+                self._structure.locations = self.structure_locations
+                self._structure.draw(self.transformation_matrix, tuple(self.camera_location))
+        with profiler.stage('selection'):
+            if self._selection_moved:
+                self._selection_moved = False
+                self._change_box_location()
+            self._selection_group.draw(
+                self.transformation_matrix,
+                tuple(self.camera_location),
+                self.draw_selection
+            )
+        profiler.set('generator_queue', self._render_world.chunk_generator.queue_depth)
+        profiler.end_frame()
         self.SwapBuffers()
 
     def _gc(self, event):
@@ -76,6 +76,8 @@ class ControllableEditCanvas(BaseEditCanvas):
         key = serialise_key_event(evt)
         if key is None:
             return
+        # most actions change what is drawn
+        self.request_redraw()
         if key in self._key_binds:
             action = self._key_binds[key]
             if action in {
@@ -1,14 +1,16 @@
 import wx
-from typing import TYPE_CHECKING, Callable, Any
+from typing import TYPE_CHECKING, Callable, Any, Optional, Set, Tuple, List
 from types import GeneratorType
 import time
 import traceback
 
-from amulet.api.data_types import OperationReturnType
+from amulet.api.data_types import OperationReturnType, Dimension
+from amulet.api.selection import SelectionGroup
 from amulet.api.structure import Structure, structure_cache
 
 from amulet_map_editor import CONFIG, log
 from amulet_map_editor.programs.edit.edit import EDIT_CONFIG_ID
+from amulet_map_editor.opengl.mesh.world_renderer.mesh_cache import MeshCache
 from amulet_map_editor.programs.edit.key_config import DefaultKeys, DefaultKeybindGroupId, PresetKeybinds
 from amulet_map_editor.programs.edit.canvas.ui.goto import show_goto
 from amulet_map_editor.programs.edit.canvas.ui.tool import Tool
@@ -28,6 +30,7 @@ from amulet_map_editor.programs.edit.canvas.events import (
 )
 from amulet_map_editor.programs.edit.canvas.controllable_edit_canvas import ControllableEditCanvas
 from amulet_map_editor.programs.edit.canvas.ui.file import FilePanel
+from amulet_map_editor.programs.edit.canvas.ui.frame_profiler import FrameProfilerPanel
 
 if TYPE_CHECKING:
     from amulet.api.world import World
@@ -73,6 +76,8 @@ class EditCanvas(ControllableEditCanvas):
     """Adds embedded UI elements to the canvas."""
     def __init__(self, parent: wx.Window, world: "World"):
         super().__init__(parent, world)
+        # the dimension and coordinates of the chunks each undo point changed. None if run_operation did not know them.
+        self._undo_chunks: List[Optional[Set[Tuple[Dimension, int, int]]]] = []
         config = CONFIG.get(EDIT_CONFIG_ID, {})
         user_keybinds = config.get("user_keybinds", {})
         group = config.get("keybind_group", DefaultKeybindGroupId)
@@ -85,11 +90,28 @@ class EditCanvas(ControllableEditCanvas):
         self.set_key_binds(
             keybinds
         )
+        self._render_world.chunk_generator.processes = config.get("mesh_processes", 0)
+        self._render_world.render_distance = config.get("render_distance", self._render_world.render_distance)
+        self._render_world.garbage_distance = max(self._render_world.garbage_distance, self._render_world.render_distance + 10)
+        self._render_world.lod_distance = config.get("lod_distance", self._render_world.lod_distance)
+        self._render_world.greedy_meshing = config.get("greedy_meshing", False)
+        self._render_world.chunk_manager.occlusion_culling = config.get("occlusion_culling", True)
+        self._render_world.compact_vertices = config.get("compact_vertices", False)
+        self.on_demand_draw = config.get("on_demand_draw", True)
+        self.profiler.enabled = config.get("frame_profiler", False)
+        if config.get("mesh_cache", False):
+            self._render_world.mesh_cache = MeshCache(max_size=config.get("mesh_cache_size", 1024) * 2**20)
+        if config.get("model_cache", False):
+            self._render_world.load_model_cache()
 
         canvas_sizer = wx.BoxSizer(wx.VERTICAL)
         self.SetSizer(canvas_sizer)
 
         file_sizer = wx.BoxSizer(wx.HORIZONTAL)
+        self._profiler_panel: Optional[FrameProfilerPanel] = None
+        if self.profiler.enabled:
+            self._profiler_panel = FrameProfilerPanel(self)
+            file_sizer.Add(self._profiler_panel, 0, wx.EXPAND, 0)
         file_sizer.AddStretchSpacer(1)
         self._file_panel = FilePanel(self)
         file_sizer.Add(self._file_panel, 0, wx.EXPAND, 0)
@@ -102,6 +124,8 @@ class EditCanvas(ControllableEditCanvas):
 
     def bind_events(self):
         self._file_panel.bind_events()
+        if self._profiler_panel is not None:
+            self._profiler_panel.bind_events()
         self._tool_sizer.bind_events()
 
     def run_operation(
@@ -109,11 +133,23 @@ class EditCanvas(ControllableEditCanvas):
             operation: Callable[[], OperationReturnType],
             title="",
             msg="",
-            throw_exceptions=False
+            throw_exceptions=False,
+            changed_area: Optional[SelectionGroup] = None
     ) -> Any:
+        """Run an operation and create an undo point.
+        :param operation: The operation to run
+        :param title: The title of the progress dialog
+        :param msg: The message of the progress dialog
+        :param throw_exceptions: Should exceptions from the operation be raised after they are shown
+        :param changed_area: The area in the current dimension the operation can change.
+            The chunks in it are rebuilt after the operation and when it is undone or redone.
+            If None the changed chunks are looked up in the world history.
+        :return: The value returned by the operation
+        """
         self._disable_threads()
         err = None
         out = None
+        undo_count = self.world.chunk_history_manager.undo_count
         try:
             out = show_loading_dialog(
                 operation,
@@ -122,6 +158,19 @@ class EditCanvas(ControllableEditCanvas):
                 self,
             )
             self.world.create_undo_point()
+            if self.world.chunk_history_manager.undo_count != undo_count:
+                # an undo point is only created if something changed
+                undo_index = self.world.chunk_history_manager.undo_count - 1
+                # the redo history has been replaced by this undo point
+                del self._undo_chunks[undo_index:]
+                self._undo_chunks += [None] * (undo_index - len(self._undo_chunks))
+                if changed_area is None:
+                    self._undo_chunks.append(None)
+                else:
+                    self._undo_chunks.append(
+                        {(self.dimension, cx, cz) for cx, cz in changed_area.chunk_locations()}
+                    )
+                self._render_world.chunks_changed(self._undo_point_chunks(undo_index))
             wx.PostEvent(self, CreateUndoEvent())
         except OperationError as e:
             msg = f"Error running operation: {e}"
@@ -149,12 +198,37 @@ class EditCanvas(ControllableEditCanvas):
             raise err
         return out
 
+    def _undo_point_chunks(self, undo_index: int) -> Optional[Set[Tuple[int, int]]]:
+        """Find the chunks in the current dimension that were changed by an undo point.
+        :param undo_index: The index of the undo point. The latest undo point is undo_count - 1
+        :return: The chunk coordinates. None if they could not be found from the world history.
+        """
+        if undo_index < 0:
+            return set()
+        if undo_index < len(self._undo_chunks) and self._undo_chunks[undo_index] is not None:
+            return {(cx, cz) for dimension, cx, cz in self._undo_chunks[undo_index] if dimension == self.dimension}
+        # TODO: this is a temporary fallback for operations that do not give their changed area.
+        #  amulet-core does not have a public way to get the chunks in an undo point yet so this reads the history manager.
+        #  Remove it once it does or once every operation gives its changed area.
+        try:
+            snapshot = self.world.chunk_history_manager._snapshots[undo_index]
+            return {(cx, cz) for dimension, cx, cz in snapshot if dimension == self.dimension}
+        except (AttributeError, IndexError, TypeError, ValueError) as e:
+            log.warning(
+                f'Could not find the chunks changed by undo point {undo_index} from the world history ({e!r}). '
+                f'Checking every loaded chunk for changes instead.'
+            )
+            return None
+
     def undo(self):
+        changed_chunks = self._undo_point_chunks(self.world.chunk_history_manager.undo_count - 1)
         self.world.undo()
+        self._render_world.chunks_changed(changed_chunks)
         wx.PostEvent(self, UndoEvent())
 
     def redo(self):
         self.world.redo()
+        self._render_world.chunks_changed(self._undo_point_chunks(self.world.chunk_history_manager.undo_count - 1))
         wx.PostEvent(self, RedoEvent())
 
     def cut(self):
@@ -163,7 +237,8 @@ class EditCanvas(ControllableEditCanvas):
                 self.world,
                 self.dimension,
                 self.selection_group
-            )
+            ),
+            changed_area=self.selection_group
         )
 
     def copy(self):
@@ -191,7 +266,8 @@ class EditCanvas(ControllableEditCanvas):
                 self.world,
                 self.dimension,
                 self.selection_group
-            )
+            ),
+            changed_area=self.selection_group
         )
 
     def goto(self):
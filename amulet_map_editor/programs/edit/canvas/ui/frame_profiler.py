@@ -0,0 +1,66 @@
+from typing import TYPE_CHECKING
+import os
+import time
+import wx
+
+from .base_ui import BaseUI
+from amulet_map_editor import log
+
+if TYPE_CHECKING:
+    from amulet_map_editor.programs.edit.canvas.edit_canvas import EditCanvas
+
+# the stages recorded by the canvas and chunk manager in the order they are displayed
+_stages = ('world', 'visibility', 'merge', 'structure', 'selection', 'region_rebuild')
+
+
+class FrameProfilerPanel(wx.BoxSizer, BaseUI):
+    def __init__(self, canvas: 'EditCanvas'):
+        """Shows the frame statistics recorded by the canvas profiler over the canvas."""
+        wx.BoxSizer.__init__(self, wx.VERTICAL)
+        BaseUI.__init__(self, canvas)
+
+        self._text = wx.StaticText(canvas)
+        self.Add(self._text, 0, wx.ALL, 5)
+
+        button_sizer = wx.BoxSizer(wx.HORIZONTAL)
+        self.Add(button_sizer, 0, wx.LEFT, 5)
+        for file_type in ('json', 'csv'):
+            button = wx.Button(canvas, label=f'Save {file_type.upper()}')
+            button.Bind(wx.EVT_BUTTON, lambda evt, file_type_=file_type: self._save(file_type_))
+            button_sizer.Add(button, 0, wx.RIGHT, 5)
+
+        self._timer = wx.Timer(canvas)
+
+    def bind_events(self):
+        self.canvas.Bind(wx.EVT_TIMER, self._update, self._timer)
+        self._timer.Start(500)
+
+    def _update(self, evt):
+        summary = self.canvas.profiler.summary()
+        if summary:
+            lines = [
+                f"{summary['frames']} fps  cpu {summary['frame_ms']:.2f} ms  gpu {summary.get('gpu_ms', 0):.2f} ms",
+                '  '.join(f"{stage} {summary[f'{stage}_ms']:.2f} ms" for stage in _stages if f'{stage}_ms' in summary),
+                f"draw calls {summary.get('draw_calls', 0):.0f}  vertices {summary.get('draw_vertices', 0):.0f}",
+                f"regions {summary.get('regions', 0):.0f}  culled regions {summary.get('culled_regions', 0):.0f}  "
+                f"chunks {summary.get('culled_chunks', 0):.0f}  sections {summary.get('culled_sections', 0):.0f}",
+                f"chunk queue {summary.get('chunk_queue', 0):.0f}  generator queue {summary.get('generator_queue', 0):.0f}",
+                f"meshed {summary.get('merged_chunk_per_second', 0):.1f} chunks/s  "
+                f"{summary.get('merged_vertex_per_second', 0):.0f} vertices/s",
+            ]
+        else:
+            lines = ['No frames drawn']
+        label = '\n'.join(lines)
+        if label != self._text.GetLabel():
+            self._text.SetLabel(label)
+            self.canvas.Layout()
+        evt.Skip()
+
+    def _save(self, file_type: str):
+        """Write the recorded frames to a file in the logs directory."""
+        path = os.path.abspath(os.path.join('logs', f"frame_profile_{time.strftime('%Y%m%d-%H%M%S')}.{file_type}"))
+        if file_type == 'json':
+            self.canvas.profiler.dump_json(path)
+        else:
+            self.canvas.profiler.dump_csv(path)
+        log.info(f'Saved frame profile to {path}')
@@ -70,3 +70,4 @@ class SelectLocationUI(SimplePanel, BaseUI):
 
     def _on_location_change(self, evt):
         self.canvas.structure_locations[-1] = numpy.array(self.location)
+        self.canvas.request_redraw()
@@ -1,6 +1,8 @@
 from typing import TYPE_CHECKING, Type, Any, Optional
 import wx
+import numpy
 
+from amulet.api.selection import SelectionGroup, SelectionBox
 from amulet.operations.paste import paste_iter
 
 from amulet_map_editor.amulet_wx.util.validators import IntValidator
@@ -84,6 +86,8 @@ class SelectOptions(wx.BoxSizer, BaseToolUI):
         if self._paste_panel is not None:
             self._paste_panel.Destroy()
             self._paste_panel = None
+            # stop building the geometry of the abandoned paste
+            self.canvas.structure = None
 
     def _paste(self, evt):
         structure = evt.structure
@@ -95,14 +99,20 @@ class SelectOptions(wx.BoxSizer, BaseToolUI):
         self.Layout()
 
     def _paste_confirm(self):
+        structure = self._paste_panel.structure
+        # the minimum point of the structure is pasted at the location
+        offset = numpy.array(self._paste_panel.location) - structure.selection.min
         self.canvas.run_operation(
             lambda: paste_iter(
                 self.canvas.world,
                 self.canvas.dimension,
-                self._paste_panel.structure,
+                structure,
                 [self._paste_panel.location],
                 self._paste_panel.copy_air
-            )
+            ),
+            changed_area=SelectionGroup([
+                SelectionBox(box.min + offset, box.max + offset) for box in structure.selection.selection_boxes
+            ])
         )
 
     def enable(self):
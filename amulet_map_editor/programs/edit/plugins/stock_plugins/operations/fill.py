@@ -63,7 +63,8 @@ class Fill(wx.Panel, OperationUI):
                 self.canvas.dimension,
                 self.canvas.selection_group,
                 self._get_fill_block()
-            )
+            ),
+            changed_area=self.canvas.selection_group
         )
 
 
@@ -67,7 +67,8 @@ class Replace(SimpleScrollablePanel, OperationUI):
 
     def _run_operation(self, _):
         self.canvas.run_operation(
-            lambda: self._replace()
+            lambda: self._replace(),
+            changed_area=self.canvas.selection_group
         )
 
     def _replace(self):
@@ -58,7 +58,8 @@ class Waterlog(wx.Panel, OperationUI):
 
     def _run_operation(self, _):
         self.canvas.run_operation(
-            lambda: self._waterlog()
+            lambda: self._waterlog(),
+            changed_area=self.canvas.selection_group
         )
 
     def _waterlog(self):
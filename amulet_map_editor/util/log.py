@@ -1,6 +1,7 @@
 import logging
 import sys
 import os
+import multiprocessing
 
 log = logging.getLogger("amulet_map_editor")
 log_level = logging.DEBUG if "amulet-debug" in sys.argv else logging.INFO
@@ -10,7 +11,10 @@ log.setLevel(log_level)
 _formatter = logging.Formatter("%(asctime)s - %(name)s - %(levelname)s - %(message)s")
 
 os.makedirs("./logs", exist_ok=True)
-_log_file = logging.FileHandler("./logs/amulet_map_editor.log", "w")
+# worker processes (eg. the chunk meshing pool) import this module again on some platforms.
+# Only the main process should clear the log file.
+_log_mode = "w" if multiprocessing.current_process().name == "MainProcess" else "a"
+_log_file = logging.FileHandler("./logs/amulet_map_editor.log", _log_mode)
 _log_file.setLevel(log_level)
 _log_file.setFormatter(_formatter)
 log.addHandler(_log_file)
@@ -0,0 +1,128 @@
+"""Benchmark the chunk mesher on synthetic sub-chunk arrays.
+Compares RenderChunkBuilder._create_lod0_array against the same method with the old per-block full array scans
+and times the full mesher.
+Run from the repository root with
+    python -m benchmarks.chunk_mesher [--unique 200] [--sub-chunks 16]
+"""
+
+import argparse
+import time
+from typing import List, Tuple
+
+import numpy
+
+from amulet_map_editor.opengl.mesh.base import mesh_worker
+from benchmarks.synthetic import cube_model, air_model
+
+
+def synthetic_sub_chunks(unique: int, count: int, seed: int = 0) -> List[mesh_worker.SubChunkType]:
+    """Sub-chunks with half air and the rest a random mix of the given number of blocks."""
+    rng = numpy.random.default_rng(seed)
+    sub_chunks = []
+    for cy in range(count):
+        larger_blocks = rng.integers(1, unique + 1, (18, 18, 18)).astype(numpy.uint32)
+        larger_blocks[rng.random(larger_blocks.shape) < 0.5] = 0
+        sub_chunks.append((larger_blocks, numpy.unique(larger_blocks), (0, cy * 16, 0)))
+    return sub_chunks
+
+
+class LegacyChunkBuilder(mesh_worker.WorkerChunkBuilder):
+    """RenderChunkBuilder._create_lod0_array with the old block grouping, which compared the whole array for every unique block.
+    The vertex tables are built the same way as the real mesher so only the grouping differs."""
+    def _create_lod0_array(self, larger_blocks: numpy.ndarray, unique_blocks: numpy.ndarray, offset: Tuple[int, int, int] = None):
+        offset = offset or (0, 0, 0)
+        blocks = larger_blocks[1:-1, 1:-1, 1:-1]
+        transparent_array = numpy.zeros(larger_blocks.shape, dtype=numpy.uint8)
+        models = {}
+        for block_temp_id in unique_blocks:
+            model = models[block_temp_id] = self._get_model(block_temp_id)
+            transparent_array[larger_blocks == block_temp_id] = model.is_transparent
+
+        def get_transparent_array(offset_transparent_array, transparent_array_):
+            return numpy.logical_and(
+                offset_transparent_array,
+                numpy.logical_not((offset_transparent_array == 1) * (offset_transparent_array == transparent_array_))
+            )
+
+        middle_transparent_array = transparent_array[1:-1, 1:-1, 1:-1]
+        show_map = {
+            'up': get_transparent_array(transparent_array[1:-1, 2:, 1:-1], middle_transparent_array),
+            'down': get_transparent_array(transparent_array[1:-1, :-2, 1:-1], middle_transparent_array),
+            'north': get_transparent_array(transparent_array[1:-1, 1:-1, :-2], middle_transparent_array),
+            'south': get_transparent_array(transparent_array[1:-1, 1:-1, 2:], middle_transparent_array),
+            'east': get_transparent_array(transparent_array[2:, 1:-1, 1:-1], middle_transparent_array),
+            'west': get_transparent_array(transparent_array[:-2, 1:-1, 1:-1], middle_transparent_array),
+        }
+
+        chunk_verts = []
+        chunk_verts_translucent = []
+        for block_temp_id, model in models.items():
+            all_block_locations = numpy.argwhere(blocks == block_temp_id)
+            if not all_block_locations.size:
+                continue
+            where = tuple(all_block_locations.T)
+            for cull_dir, template in self._get_model_template(block_temp_id).items():
+                if cull_dir is None:
+                    block_locations = all_block_locations
+                else:
+                    block_locations = all_block_locations[show_map[cull_dir][where]]
+                    if not block_locations.size:
+                        continue
+                vert_table = numpy.empty((len(block_locations), template.shape[0], self._table_vert_len), dtype=numpy.float32)
+                vert_table[:] = template
+                vert_table[:, :, :3] += (block_locations + self.offset + offset).reshape((-1, 1, 3))
+                if model.is_transparent == 1:
+                    chunk_verts_translucent.append(vert_table.ravel())
+                else:
+                    chunk_verts.append(vert_table.ravel())
+        return chunk_verts, chunk_verts_translucent
+
+
+def best_time(func, repeat: int) -> float:
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the chunk mesher.')
+    parser.add_argument('--unique', type=int, default=200, help='The number of unique blocks in each sub-chunk.')
+    parser.add_argument('--sub-chunks', type=int, default=16, help='The number of sub-chunks to mesh.')
+    parser.add_argument('--repeat', type=int, default=5, help='The number of times to run each test. The fastest is reported.')
+    args = parser.parse_args()
+
+    texture_bounds = {('minecraft', 'missing_no'): (0.0, 0.0, 1.0, 1.0)}
+    models = {0: air_model()}
+    for block_temp_id in range(1, args.unique + 1):
+        texture = ('benchmark', str(block_temp_id))
+        texture_bounds[texture] = (0.0, 0.0, 1.0, 1.0)
+        models[block_temp_id] = cube_model(texture, block_temp_id % 3)
+    mesh_worker.init_worker(texture_bounds)
+
+    sub_chunks = synthetic_sub_chunks(args.unique, args.sub_chunks)
+    offset = numpy.zeros(3)
+    builder = mesh_worker.WorkerChunkBuilder(models, offset, False, False)
+    legacy_builder = LegacyChunkBuilder(models, offset, False, False)
+
+    # check both find the same geometry
+    for sub_chunk in sub_chunks:
+        verts, verts_translucent = builder._create_lod0_array(*sub_chunk)
+        legacy_verts, legacy_verts_translucent = legacy_builder._create_lod0_array(*sub_chunk)
+        assert len(verts) == len(legacy_verts) and len(verts_translucent) == len(legacy_verts_translucent)
+        assert all(numpy.array_equal(a, b) for a, b in zip(verts + verts_translucent, legacy_verts + legacy_verts_translucent))
+
+    legacy = best_time(lambda: [legacy_builder._create_lod0_array(*sub_chunk) for sub_chunk in sub_chunks], args.repeat)
+    current = best_time(lambda: [builder._create_lod0_array(*sub_chunk) for sub_chunk in sub_chunks], args.repeat)
+    mesh = best_time(lambda: mesh_worker.create_lod0(sub_chunks, models, offset), args.repeat)
+
+    print(f'{args.sub_chunks} sub-chunks with {args.unique} unique blocks')
+    print(f'{"_create_lod0_array (old)":<28}{legacy * 1000:>10.1f} ms')
+    print(f'{"_create_lod0_array":<28}{current * 1000:>10.1f} ms    {legacy / current:.1f}x faster')
+    print(f'{"full mesher":<28}{mesh * 1000:>10.1f} ms')
+
+
+if __name__ == '__main__':
+    main()
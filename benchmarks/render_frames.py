@@ -0,0 +1,341 @@
+"""Draw a synthetic world with the world renderer in an offscreen OpenGL context and measure the frame rate.
+RenderWorld, ChunkManager and RenderRegion are driven along a scripted camera path using a software
+renderer (Mesa llvmpipe) so this can run on machines without a GPU or a display.
+Reports the time to load every chunk in the render distance, frames/s, draw calls and the size of the vertex buffers.
+Run from the repository root with
+    python -m benchmarks.render_frames [--scene flat] [--render-distance 10] [--frames 600] [--save] [--compare BASELINE]
+EGL is used by default. Set PYOPENGL_PLATFORM=osmesa to use OSMesa instead.
+Mesa needs EGL_PLATFORM=surfaceless to create an EGL display without a window system. This is set if it is not already.
+--save writes the results to benchmarks/baselines/render_frames_<commit>.json.
+"""
+
+import os
+
+# these must be set before OpenGL is imported
+os.environ.setdefault('PYOPENGL_PLATFORM', 'egl')
+os.environ.setdefault('EGL_PLATFORM', 'surfaceless')
+
+import argparse
+import ctypes
+import json
+import math
+import time
+import uuid
+from platform import python_version
+from typing import Dict, Tuple, List
+
+import numpy
+from OpenGL.GL import *
+
+from amulet_map_editor.opengl.data_types import CameraLocationType, CameraRotationType
+from amulet_map_editor.opengl.mesh.world_renderer.world import RenderWorld
+from benchmarks.suite import git_commit, load_baseline, compare, ResultType
+from benchmarks.synthetic import SCENES, SyntheticWorld
+
+_baseline_dir = os.path.join(os.path.dirname(__file__), 'baselines')
+_rebuild_interval = 1.0  # the time in seconds between region rebuilds. The same as the edit canvas.
+_gc_interval = 10.0  # the time in seconds between garbage collections. The same as the edit canvas.
+
+
+class OffscreenContext:
+    def __init__(self, width: int, height: int):
+        """An OpenGL 3.3 core profile context that draws to an offscreen buffer.
+        The context is made current when it is created."""
+        self.width = width
+        self.height = height
+        if os.environ['PYOPENGL_PLATFORM'] == 'osmesa':
+            self._create_osmesa()
+        else:
+            self._create_egl()
+
+    def _create_egl(self):
+        from OpenGL import EGL
+        self._egl = EGL
+        self._display = EGL.eglGetDisplay(EGL.EGL_DEFAULT_DISPLAY)
+        major, minor = EGL.EGLint(), EGL.EGLint()
+        EGL.eglInitialize(self._display, ctypes.pointer(major), ctypes.pointer(minor))
+        config_attribs = (EGL.EGLint * 13)(
+            EGL.EGL_SURFACE_TYPE, EGL.EGL_PBUFFER_BIT,
+            EGL.EGL_RENDERABLE_TYPE, EGL.EGL_OPENGL_BIT,
+            EGL.EGL_RED_SIZE, 8,
+            EGL.EGL_GREEN_SIZE, 8,
+            EGL.EGL_BLUE_SIZE, 8,
+            EGL.EGL_DEPTH_SIZE, 24,
+            EGL.EGL_NONE
+        )
+        config = EGL.EGLConfig()
+        config_count = EGL.EGLint()
+        EGL.eglChooseConfig(self._display, config_attribs, ctypes.pointer(config), 1, ctypes.pointer(config_count))
+        if not config_count.value:
+            raise RuntimeError('No EGL config supports drawing OpenGL to a pbuffer')
+        self._surface = EGL.eglCreatePbufferSurface(
+            self._display, config, (EGL.EGLint * 5)(EGL.EGL_WIDTH, self.width, EGL.EGL_HEIGHT, self.height, EGL.EGL_NONE)
+        )
+        EGL.eglBindAPI(EGL.EGL_OPENGL_API)
+        self._context = EGL.eglCreateContext(
+            self._display,
+            config,
+            EGL.EGL_NO_CONTEXT,
+            (EGL.EGLint * 7)(
+                EGL.EGL_CONTEXT_MAJOR_VERSION, 3,
+                EGL.EGL_CONTEXT_MINOR_VERSION, 3,
+                EGL.EGL_CONTEXT_OPENGL_PROFILE_MASK, EGL.EGL_CONTEXT_OPENGL_CORE_PROFILE_BIT,
+                EGL.EGL_NONE
+            )
+        )
+        EGL.eglMakeCurrent(self._display, self._surface, self._surface, self._context)
+
+    def _create_osmesa(self):
+        from OpenGL import osmesa, arrays
+        self._egl = None
+        self._context = osmesa.OSMesaCreateContextAttribs(
+            (ctypes.c_int * 11)(
+                osmesa.OSMESA_FORMAT, osmesa.OSMESA_RGBA,
+                osmesa.OSMESA_DEPTH_BITS, 24,
+                osmesa.OSMESA_PROFILE, osmesa.OSMESA_CORE_PROFILE,
+                osmesa.OSMESA_CONTEXT_MAJOR_VERSION, 3,
+                osmesa.OSMESA_CONTEXT_MINOR_VERSION, 3,
+                0
+            ),
+            None
+        )
+        if not self._context:
+            raise RuntimeError('Failed creating an OpenGL 3.3 core profile OSMesa context')
+        self._buffer = arrays.GLubyteArray.zeros((self.height, self.width, 4))
+        osmesa.OSMesaMakeCurrent(self._context, self._buffer, GL_UNSIGNED_BYTE, self.width, self.height)
+
+    def close(self):
+        if self._egl is None:
+            from OpenGL import osmesa
+            osmesa.OSMesaDestroyContext(self._context)
+        else:
+            EGL = self._egl
+            EGL.eglMakeCurrent(self._display, EGL.EGL_NO_SURFACE, EGL.EGL_NO_SURFACE, EGL.EGL_NO_CONTEXT)
+            EGL.eglDestroyContext(self._display, self._context)
+            EGL.eglDestroySurface(self._display, self._surface)
+            EGL.eglTerminate(self._display)
+
+
+class HeadlessRenderWorld(RenderWorld):
+    def __init__(self, context_identifier: str, world: SyntheticWorld, texture: int):
+        """A RenderWorld that takes the block models from the synthetic palette rather than a resource pack."""
+        super().__init__(context_identifier, world, None, texture, world.palette.texture_bounds, None)
+
+    def get_block_string(self, pallete_index: int) -> str:
+        return f'benchmark:{pallete_index}'
+
+    def get_block_model(self, pallete_index: int):
+        return self.world.palette.models[pallete_index]
+
+
+def transformation_matrix(
+    location: CameraLocationType,
+    rotation: CameraRotationType,
+    aspect_ratio: float,
+    fov: float = 70.0,
+    z_near: float = 0.1,
+    z_far: float = 10000.0
+) -> numpy.ndarray:
+    """The camera transformation matrix.
+    The same as BaseCanvas.transformation_matrix which cannot be imported without wx."""
+    pitch, yaw = rotation
+    c, s = math.cos(math.radians(yaw)), math.sin(math.radians(yaw))
+    y_rot = numpy.array([[c, 0, -s, 0], [0, 1, 0, 0], [s, 0, c, 0], [0, 0, 0, 1]], dtype=numpy.float64)
+    c, s = math.cos(math.radians(pitch)), math.sin(math.radians(pitch))
+    x_rot = numpy.array([[1, 0, 0, 0], [0, c, s, 0], [0, -s, c, 0], [0, 0, 0, 1]], dtype=numpy.float64)
+    f = 1 / math.tan(math.radians(fov) / 2)
+    projection = numpy.array(
+        [
+            [f / aspect_ratio, 0, 0, 0],
+            [0, f, 0, 0],
+            [0, 0, (z_far + z_near) / (z_near - z_far), -1],
+            [0, 0, (2 * z_far * z_near) / (z_near - z_far), 0]
+        ],
+        dtype=numpy.float64
+    )
+    translation = numpy.eye(4, dtype=numpy.float64)
+    translation[3, :3] = numpy.array(location) * -1
+    return translation @ y_rot @ x_rot @ projection
+
+
+def camera_path(frame: int, speed: float) -> Tuple[CameraLocationType, CameraRotationType]:
+    """The camera location and rotation at a frame of the path.
+    The camera flies east at a constant height looking slightly down while turning from side to side."""
+    return (8.0 + frame * speed, 100.0, 8.0), (20.0, 90.0 + 45.0 * math.sin(frame / 60))
+
+
+def _create_texture() -> int:
+    """A one pixel white array texture to stand in for the texture atlas.
+    The synthetic textures all cover the whole atlas."""
+    texture = glGenTextures(1)
+    glBindTexture(GL_TEXTURE_2D_ARRAY, texture)
+    glTexParameteri(GL_TEXTURE_2D_ARRAY, GL_TEXTURE_MIN_FILTER, GL_NEAREST)
+    glTexParameteri(GL_TEXTURE_2D_ARRAY, GL_TEXTURE_MAG_FILTER, GL_NEAREST)
+    glTexImage3D(GL_TEXTURE_2D_ARRAY, 0, GL_RGBA, 1, 1, 1, 0, GL_RGBA, GL_UNSIGNED_BYTE, numpy.full(4, 255, dtype=numpy.uint8))
+    glBindTexture(GL_TEXTURE_2D_ARRAY, 0)
+    return texture
+
+
+class FrameDriver:
+    def __init__(self, render_world: RenderWorld, aspect_ratio: float):
+        """Draws frames and runs the region rebuild and garbage collection on the same intervals as the edit canvas."""
+        self._render_world = render_world
+        self._aspect_ratio = aspect_ratio
+        self._last_rebuild = self._last_gc = time.perf_counter()
+
+    def draw(self, location: CameraLocationType, rotation: CameraRotationType) -> float:
+        """Draw a frame and wait for OpenGL to finish it.
+        :return: The time taken in seconds
+        """
+        render_world = self._render_world
+        start = time.perf_counter()
+        render_world.camera_location = location
+        render_world.camera_rotation = rotation
+        glClear(GL_COLOR_BUFFER_BIT | GL_DEPTH_BUFFER_BIT)
+        render_world.draw(transformation_matrix(location, rotation, self._aspect_ratio))
+        glFinish()
+        end = time.perf_counter()
+        if end - self._last_rebuild > _rebuild_interval:
+            render_world.chunk_manager.rebuild()
+            self._last_rebuild = end
+        if end - self._last_gc > _gc_interval:
+            render_world.run_garbage_collector()
+            self._last_gc = end
+        return end - start
+
+
+def run(args) -> Dict[str, ResultType]:
+    context = OffscreenContext(args.width, args.height)
+    print(f'Drawing with {glGetString(GL_RENDERER).decode()} {glGetString(GL_VERSION).decode()}')
+    glViewport(0, 0, args.width, args.height)
+    glClearColor(0.5, 0.66, 1.0, 1.0)
+    glEnable(GL_DEPTH_TEST)
+    glEnable(GL_CULL_FACE)
+    glDepthFunc(GL_LEQUAL)
+    glEnable(GL_BLEND)
+    glBlendFunc(GL_SRC_ALPHA, GL_ONE_MINUS_SRC_ALPHA)
+    texture = _create_texture()
+
+    world = SyntheticWorld(args.scene, None)
+    render_world = HeadlessRenderWorld(str(uuid.uuid4()), world, texture)
+    render_world.render_distance = args.render_distance
+    render_world.garbage_distance = args.render_distance + 10
+    render_world.lod_distance = args.lod_distance
+    render_world.greedy_meshing = args.greedy_meshing
+    render_world.compact_vertices = args.compact_vertices
+    render_world.chunk_generator.processes = args.processes
+    chunk_manager = render_world.chunk_manager
+    chunk_manager.occlusion_culling = not args.no_occlusion_culling
+    driver = FrameDriver(render_world, args.width / args.height)
+
+    location, rotation = camera_path(0, args.speed)
+    render_world.camera_location = location
+    render_world.camera_rotation = rotation
+    render_world.enable()
+    try:
+        # draw from the start of the path until every chunk in the render distance has been merged
+        chunk_coords = [tuple(coords) for coords in render_world.chunk_priorities()[0].tolist()]
+        fill_frames = 0
+        start = time.perf_counter()
+        while not all(chunk_manager.render_chunk_in_main_database(coords) for coords in chunk_coords):
+            if time.perf_counter() - start > args.fill_timeout:
+                raise RuntimeError(f'The render distance did not fill in {args.fill_timeout} seconds')
+            driver.draw(location, rotation)
+            fill_frames += 1
+        fill_seconds = time.perf_counter() - start
+
+        frame_times: List[float] = []
+        draw_calls: List[int] = []
+        draw_vertices: List[int] = []
+        buffer_bytes: List[int] = []
+        for frame in range(args.frames):
+            frame_times.append(driver.draw(*camera_path(frame, args.speed)))
+            draw_calls.append(chunk_manager.draw_calls)
+            draw_vertices.append(chunk_manager.draw_vertices)
+            buffer_bytes.append(chunk_manager.buffer_size)
+    finally:
+        render_world.close()
+        glDeleteTextures([texture])
+        context.close()
+
+    frame_ms = numpy.array(frame_times) * 1000
+    return {
+        'fill': {
+            'seconds': fill_seconds,
+            'chunks_per_second': len(chunk_coords) / fill_seconds,
+            'frames': fill_frames,
+        },
+        'camera_path': {
+            'frames_per_second': len(frame_times) / sum(frame_times),
+            'frame_ms_mean': float(frame_ms.mean()),
+            'frame_ms_p95': float(numpy.percentile(frame_ms, 95)),
+            'frame_ms_max': float(frame_ms.max()),
+            'draw_calls': float(numpy.mean(draw_calls)),
+            'draw_vertices': float(numpy.mean(draw_vertices)),
+            'buffer_mb': max(buffer_bytes) / 2**20,
+        },
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure the frame rate of the world renderer in an offscreen OpenGL context.')
+    parser.add_argument('--scene', default='flat', choices=list(SCENES), help='The synthetic world to draw.')
+    parser.add_argument('--width', type=int, default=1280, help='The width of the frame in pixels.')
+    parser.add_argument('--height', type=int, default=720, help='The height of the frame in pixels.')
+    parser.add_argument('--render-distance', type=int, default=10, help='The render distance in chunks.')
+    parser.add_argument('--lod-distance', type=int, default=16, help='The distance in chunks outside which chunks are drawn in low detail.')
+    parser.add_argument('--processes', type=int, default=0, help='The number of processes to create the chunk geometry in.')
+    parser.add_argument('--greedy-meshing', action='store_true', help='Merge the faces of neighbouring blocks.')
+    parser.add_argument('--compact-vertices', action='store_true', help='Use the compact vertex format.')
+    parser.add_argument('--no-occlusion-culling', action='store_true', help='Draw sections that are hidden behind opaque blocks.')
+    parser.add_argument('--frames', type=int, default=600, help='The number of frames to draw along the camera path.')
+    parser.add_argument('--speed', type=float, default=0.5, help='The distance in blocks the camera moves each frame.')
+    parser.add_argument('--fill-timeout', type=float, default=600, help='The time in seconds to wait for the render distance to fill.')
+    parser.add_argument('--save', nargs='?', const='', default=None, help='Save the results. Defaults to benchmarks/baselines/render_frames_<commit>.json')
+    parser.add_argument('--compare', help='A commit or the path of a saved result to compare against.')
+    args = parser.parse_args()
+
+    results = run(args)
+    fill, camera_path_result = results['fill'], results['camera_path']
+    print(f"filled {args.render_distance} chunk render distance in {fill['seconds']:.2f} s over {fill['frames']} frames ({fill['chunks_per_second']:.1f} chunks/s)")
+    print(
+        f"{args.frames} frames at {camera_path_result['frames_per_second']:.1f} frames/s  "
+        f"mean {camera_path_result['frame_ms_mean']:.2f} ms  "
+        f"95th percentile {camera_path_result['frame_ms_p95']:.2f} ms  "
+        f"max {camera_path_result['frame_ms_max']:.2f} ms"
+    )
+    print(
+        f"{camera_path_result['draw_calls']:.1f} draw calls  {camera_path_result['draw_vertices']:.0f} vertices  "
+        f"{camera_path_result['buffer_mb']:.1f} MiB of vertex buffers"
+    )
+
+    commit = git_commit()
+    if args.compare:
+        baseline_name = args.compare if os.path.isfile(args.compare) else f'render_frames_{args.compare}'
+        baseline = load_baseline(baseline_name)
+        print(f"\nCompared with {baseline.get('commit', args.compare)} (positive is better)")
+        print(f'{"benchmark":<28}{"metric":<22}{"baseline":>14}{"current":>14}{"change":>10}')
+        print('\n'.join(compare(results, baseline['results'])))
+
+    if args.save is not None:
+        path = args.save or os.path.join(_baseline_dir, f'render_frames_{commit}.json')
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(path, 'w') as f:
+            json.dump(
+                {
+                    'commit': commit,
+                    'time': time.strftime('%Y-%m-%d %H:%M:%S'),
+                    'python': python_version(),
+                    'numpy': numpy.__version__,
+                    'platform': os.environ['PYOPENGL_PLATFORM'],
+                    'arguments': vars(args),
+                    'results': results,
+                },
+                f,
+                indent=1
+            )
+        print(f'\nSaved the results to {path}')
+
+
+if __name__ == '__main__':
+    main()
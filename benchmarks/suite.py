@@ -0,0 +1,261 @@
+"""Benchmark the hot paths of the mesher and renderer on synthetic worlds without a display.
+Covers block grouping and meshing (RenderChunkBuilder._create_lod0_array), reading the sub-chunks and their
+neighbours (RenderChunk._sub_chunks), packing the region buffer (RenderRegion._write_all_chunks, used by rebuild),
+building the texture atlas (textureatlas.create_atlas) and the selection ray walk (BaseEditCanvas._collision_locations).
+Run from the repository root with
+    python -m benchmarks.suite [--scenes flat caves village glass] [--size 8] [--save] [--compare BASELINE]
+--save writes the results to benchmarks/baselines/<commit>.json.
+--compare takes a commit or a path to a saved file and prints the change of each result.
+"""
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import tempfile
+import time
+import tracemalloc
+import types
+from typing import Dict, Callable, Tuple, Any, List
+
+import numpy
+from PIL import Image
+
+from amulet_map_editor.opengl import textureatlas
+from amulet_map_editor.opengl.mesh.base import mesh_worker
+from amulet_map_editor.opengl.mesh.world_renderer.chunk import RenderChunk
+from amulet_map_editor.opengl.mesh.world_renderer.region import RenderRegion
+from benchmarks.synthetic import SCENES, SyntheticWorld
+
+ResultType = Dict[str, float]
+
+_baseline_dir = os.path.join(os.path.dirname(__file__), 'baselines')
+_region_size = 16
+
+
+def measure(func: Callable[[], Any], repeat: int) -> Tuple[float, float]:
+    """Run a function repeat times.
+    The first run is done with tracemalloc running to find the peak memory and is not timed.
+    :return: The fastest time in seconds and the peak memory use in MiB
+    """
+    tracemalloc.start()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return min(times), peak / 2**20
+
+
+class _RenderWorld:
+    def __init__(self, world: SyntheticWorld):
+        """The parts of RenderWorld that RenderChunk._sub_chunks uses."""
+        self.context_identifier = 'benchmark'
+        self.world = world
+
+
+class _HeadlessRenderRegion(RenderRegion):
+    """A RenderRegion that keeps the buffer data rather than sending it to OpenGL."""
+    def change_verts(self, verts=None):
+        if verts is not None:
+            self.verts = verts
+
+
+class _MeshedChunk:
+    def __init__(self, cx: int, cz: int, verts: numpy.ndarray, verts_translucent: int):
+        """The parts of RenderChunk that RenderRegion._write_all_chunks uses."""
+        self.cx = cx
+        self.cz = cz
+        self.verts = verts
+        self.verts_translucent = verts_translucent
+
+    def unload(self):
+        pass
+
+
+def bench_scene(scene: str, size: int, repeat: int) -> Dict[str, ResultType]:
+    world = SyntheticWorld(scene, size)
+    # generate the chunks up front so that it is not timed
+    for chunk_coords in world.chunk_coords:
+        world.get_chunk(*chunk_coords)
+    render_world = _RenderWorld(world)
+    mesh_worker.init_worker(world.palette.texture_bounds)
+    models = world.palette.models
+    chunk_count = len(world.chunk_coords)
+    results = {}
+
+    render_chunks = [RenderChunk(render_world, _region_size, chunk_coords, 'overworld', 0) for chunk_coords in world.chunk_coords]
+
+    def read_sub_chunks():
+        return [render_chunk._sub_chunks(world.get_chunk(*render_chunk.coords).blocks) for render_chunk in render_chunks]
+    seconds, peak = measure(read_sub_chunks, repeat)
+    results[f'sub_chunks/{scene}'] = {'seconds': seconds, 'chunks_per_second': chunk_count / seconds, 'peak_mb': peak}
+
+    chunk_sub_chunks = read_sub_chunks()
+    builders = [
+        mesh_worker.WorkerChunkBuilder(models, render_chunk.offset, False, False)
+        for render_chunk in render_chunks
+    ]
+
+    def mesh():
+        return [
+            [builder._create_lod0_array(*sub_chunk) for sub_chunk in sub_chunks]
+            for builder, sub_chunks in zip(builders, chunk_sub_chunks)
+        ]
+    seconds, peak = measure(mesh, repeat)
+    meshed = mesh()
+    table_vert_len = builders[0]._table_vert_len
+    vertex_count = sum(
+        verts.size for sections in meshed for opaque, translucent in sections for verts in opaque + translucent
+    ) // table_vert_len
+    results[f'mesher/{scene}'] = {
+        'seconds': seconds,
+        'chunks_per_second': chunk_count / seconds,
+        'vertices_per_second': vertex_count / seconds,
+        'vertices': vertex_count,
+        'peak_mb': peak,
+    }
+
+    chunks = {}
+    for builder, render_chunk, sections in zip(builders, render_chunks, meshed):
+        verts, verts_translucent = builder._join_verts(
+            [verts for opaque, _ in sections for verts in opaque],
+            [verts for _, translucent in sections for verts in translucent]
+        )
+        chunks[render_chunk.coords] = _MeshedChunk(*render_chunk.coords, verts, verts_translucent)
+    region = _HeadlessRenderRegion(0, 0, _region_size, 'benchmark', 0)
+    region._chunks = chunks
+    seconds, peak = measure(region._write_all_chunks, repeat)
+    vertex_count = sum(chunk.verts.size for chunk in chunks.values()) // region._vert_len
+    results[f'region_rebuild/{scene}'] = {
+        'seconds': seconds,
+        'chunks_per_second': chunk_count / seconds,
+        'vertices_per_second': vertex_count / seconds,
+        'peak_mb': peak,
+    }
+    return results
+
+
+def bench_texture_atlas(count: int, repeat: int) -> Dict[str, ResultType]:
+    rng = numpy.random.default_rng(0)
+    with tempfile.TemporaryDirectory() as directory:
+        textures = {}
+        for index in range(count):
+            size = 16 * int(rng.choice([1, 1, 1, 1, 2, 4]))
+            height = size * int(rng.choice([1, 1, 1, 1, 1, 2, 4]))
+            path = os.path.join(directory, f'{index}.png')
+            Image.fromarray(rng.integers(0, 256, (height, size, 4), dtype=numpy.uint8)).save(path)
+            textures[('benchmark', str(index))] = path
+        seconds, peak = measure(lambda: textureatlas.create_atlas(textures, use_cache=False), repeat)
+    return {'texture_atlas': {'seconds': seconds, 'textures_per_second': count / seconds, 'peak_mb': peak}}
+
+
+def bench_collision_ray(count: int, repeat: int) -> Dict[str, ResultType]:
+    try:
+        from amulet_map_editor.programs.edit.canvas.base_edit_canvas import BaseEditCanvas
+    except (ImportError, RuntimeError):
+        # the edit program creates bitmaps when it is imported which needs wx to be able to start
+        print('Skipped collision_ray because the edit canvas could not be imported.')
+        return {}
+    rng = numpy.random.default_rng(0)
+    rays = []
+    for _ in range(count):
+        direction = rng.normal(size=3)
+        direction /= numpy.linalg.norm(direction)
+        direction[abs(direction) < 0.000001] = 0.000001
+        # only the attributes _collision_locations reads
+        rays.append(types.SimpleNamespace(camera_location=tuple(rng.random(3) * 100), _look_vector=lambda direction_=direction: direction_))
+
+    def walk():
+        return [sum(1 for _ in BaseEditCanvas._collision_locations(ray)) for ray in rays]
+    seconds, peak = measure(walk, repeat)
+    return {'collision_ray': {'seconds': seconds, 'rays_per_second': count / seconds, 'peak_mb': peak}}
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=os.path.dirname(__file__), stderr=subprocess.DEVNULL
+        ).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def load_baseline(baseline: str) -> Dict[str, Any]:
+    """Load a saved result from a path or the commit it was saved for."""
+    path = baseline if os.path.isfile(baseline) else os.path.join(_baseline_dir, f'{baseline}.json')
+    with open(path) as f:
+        return json.load(f)
+
+
+def compare(results: Dict[str, ResultType], baseline: Dict[str, ResultType]) -> List[str]:
+    """The change of each result relative to the baseline. Positive is better."""
+    lines = []
+    for name, result in results.items():
+        for metric, value in result.items():
+            old = baseline.get(name, {}).get(metric)
+            if not old or metric == 'vertices':
+                continue
+            change = value / old - 1
+            if not metric.endswith('_per_second'):
+                # lower is better for times and memory
+                change = -change
+            lines.append(f'{name:<28}{metric:<22}{old:>14.4g}{value:>14.4g}{change:>+10.1%}')
+    return lines
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the mesher and renderer on synthetic worlds.')
+    parser.add_argument('--scenes', nargs='+', default=list(SCENES), choices=list(SCENES), help='The synthetic worlds to test.')
+    parser.add_argument('--size', type=int, default=8, help='The width in chunks of each synthetic world.')
+    parser.add_argument('--textures', type=int, default=1000, help='The number of textures to pack into the atlas.')
+    parser.add_argument('--rays', type=int, default=100, help='The number of selection rays to walk.')
+    parser.add_argument('--repeat', type=int, default=3, help='The number of times to run each test. The fastest is reported.')
+    parser.add_argument('--save', nargs='?', const='', default=None, help='Save the results. Defaults to benchmarks/baselines/<commit>.json')
+    parser.add_argument('--compare', help='A commit or the path of a saved result to compare against.')
+    args = parser.parse_args()
+
+    results: Dict[str, ResultType] = {}
+    for scene in args.scenes:
+        results.update(bench_scene(scene, args.size, args.repeat))
+    results.update(bench_texture_atlas(args.textures, args.repeat))
+    results.update(bench_collision_ray(args.rays, args.repeat))
+
+    print(f'{"benchmark":<28}{"time (ms)":>12}{"chunks/s":>12}{"vertices/s":>14}{"peak (MiB)":>12}')
+    for name, result in results.items():
+        chunks = f"{result['chunks_per_second']:.0f}" if 'chunks_per_second' in result else '-'
+        vertices = f"{result['vertices_per_second']:.3g}" if 'vertices_per_second' in result else '-'
+        print(f"{name:<28}{result['seconds'] * 1000:>12.2f}{chunks:>12}{vertices:>14}{result['peak_mb']:>12.1f}")
+
+    commit = git_commit()
+    if args.compare:
+        baseline = load_baseline(args.compare)
+        print(f"\nCompared with {baseline.get('commit', args.compare)} (positive is better)")
+        print(f'{"benchmark":<28}{"metric":<22}{"baseline":>14}{"current":>14}{"change":>10}')
+        print('\n'.join(compare(results, baseline['results'])))
+
+    if args.save is not None:
+        path = args.save or os.path.join(_baseline_dir, f'{commit}.json')
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(path, 'w') as f:
+            json.dump(
+                {
+                    'commit': commit,
+                    'time': time.strftime('%Y-%m-%d %H:%M:%S'),
+                    'python': platform.python_version(),
+                    'numpy': numpy.__version__,
+                    'arguments': vars(args),
+                    'results': results,
+                },
+                f,
+                indent=1
+            )
+        print(f'\nSaved the results to {path}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,223 @@
+"""Synthetic block data and models for the benchmarks.
+Nothing in here needs a world, a resource pack or a display."""
+
+from typing import Dict, Tuple, List, Callable, Optional
+
+import numpy
+
+import minecraft_model_reader
+from amulet.api.chunk.blocks import Blocks
+from amulet.api.errors import ChunkDoesNotExist
+
+# the corners of each face of a unit cube
+_cube_faces = {
+    'down': [(0, 0, 1), (0, 0, 0), (1, 0, 0), (1, 0, 1)],
+    'up': [(0, 1, 0), (0, 1, 1), (1, 1, 1), (1, 1, 0)],
+    'north': [(1, 1, 0), (1, 0, 0), (0, 0, 0), (0, 1, 0)],
+    'south': [(0, 1, 1), (0, 0, 1), (1, 0, 1), (1, 1, 1)],
+    'west': [(0, 1, 0), (0, 0, 0), (0, 0, 1), (0, 1, 1)],
+    'east': [(1, 1, 1), (1, 0, 1), (1, 0, 0), (1, 1, 0)],
+}
+_uv = [(0, 0), (0, 1), (1, 1), (1, 0)]
+
+AIR = 0
+SUB_CHUNKS = 8  # the number of sub-chunks in each synthetic chunk
+
+
+def cube_model(texture: Tuple[str, str], transparency: int) -> minecraft_model_reader.MinecraftMesh:
+    """A full block with every face culled by its neighbour."""
+    verts, texture_coords, tint_verts, faces, texture_index = {}, {}, {}, {}, {}
+    for cull_dir, corners in _cube_faces.items():
+        verts[cull_dir] = numpy.array(corners, dtype=numpy.float32).ravel()
+        texture_coords[cull_dir] = numpy.array(_uv, dtype=numpy.float32).ravel()
+        tint_verts[cull_dir] = numpy.ones(12, dtype=numpy.float32)
+        faces[cull_dir] = numpy.array([0, 1, 2, 0, 2, 3], dtype=numpy.uint32)
+        texture_index[cull_dir] = numpy.array([0, 0], dtype=numpy.uint32)
+    return minecraft_model_reader.MinecraftMesh(3, verts, texture_coords, tint_verts, faces, texture_index, (texture,), transparency)
+
+
+def cross_model(texture: Tuple[str, str]) -> minecraft_model_reader.MinecraftMesh:
+    """Two crossed planes like a plant. Never culled."""
+    verts = numpy.array([(0, 0, 0), (0, 1, 0), (1, 1, 1), (1, 0, 1), (1, 0, 0), (1, 1, 0), (0, 1, 1), (0, 0, 1)], dtype=numpy.float32).ravel()
+    texture_coords = numpy.array(_uv * 2, dtype=numpy.float32).ravel()
+    faces = numpy.array([0, 1, 2, 0, 2, 3, 4, 5, 6, 4, 6, 7], dtype=numpy.uint32)
+    return minecraft_model_reader.MinecraftMesh(
+        3,
+        {None: verts},
+        {None: texture_coords},
+        {None: numpy.ones(24, dtype=numpy.float32)},
+        {None: faces},
+        {None: numpy.zeros(4, dtype=numpy.uint32)},
+        (texture,),
+        2
+    )
+
+
+def air_model() -> minecraft_model_reader.MinecraftMesh:
+    return minecraft_model_reader.MinecraftMesh(3, {}, {}, {}, {}, {}, (), 2)
+
+
+class Palette:
+    def __init__(self):
+        """The models of the blocks used by a scene and the texture bounds they need."""
+        self.models: Dict[int, minecraft_model_reader.MinecraftMesh] = {AIR: air_model()}
+        self.texture_bounds: Dict[Tuple[str, str], Tuple[float, float, float, float]] = {
+            ('minecraft', 'missing_no'): (0.0, 0.0, 1.0, 1.0)
+        }
+
+    def add(self, name: str, shape: str = 'cube', transparency: int = 0) -> int:
+        """Add a block and return its id.
+        :param name: The name of the block. Used as the texture name.
+        :param shape: "cube" or "cross"
+        :param transparency: The is_transparent value of cube models. 0 opaque, 1 translucent, 2 partial block
+        """
+        block_id = len(self.models)
+        texture = ('benchmark', name)
+        self.texture_bounds[texture] = (0.0, 0.0, 1.0, 1.0)
+        if shape == 'cross':
+            self.models[block_id] = cross_model(texture)
+        else:
+            self.models[block_id] = cube_model(texture, transparency)
+        return block_id
+
+
+def _split_sub_chunks(blocks: numpy.ndarray) -> Dict[int, numpy.ndarray]:
+    """Split a (16, SUB_CHUNKS * 16, 16) array into sub-chunks leaving out empty ones."""
+    return {
+        cy: blocks[:, cy * 16:(cy + 1) * 16, :].copy()
+        for cy in range(blocks.shape[1] // 16)
+        if blocks[:, cy * 16:(cy + 1) * 16, :].any()
+    }
+
+
+def _coarse_noise(rng: numpy.random.Generator, shape: Tuple[int, ...], scale: int) -> numpy.ndarray:
+    """Blocky value noise. Random values on a grid scale blocks apart repeated to fill the shape."""
+    coarse = rng.random(tuple(-(-size // scale) for size in shape))
+    for axis in range(len(shape)):
+        coarse = numpy.repeat(coarse, scale, axis)
+    return coarse[tuple(slice(size) for size in shape)]
+
+
+def flat_scene(palette: Palette) -> Callable[[int, int], Dict[int, numpy.ndarray]]:
+    """Stone to y=60 then dirt and a grass layer. The common case of a superflat or plains world."""
+    stone, dirt, grass = palette.add('stone'), palette.add('dirt'), palette.add('grass_block')
+
+    def generate(cx: int, cz: int) -> Dict[int, numpy.ndarray]:
+        blocks = numpy.zeros((16, SUB_CHUNKS * 16, 16), dtype=numpy.uint32)
+        blocks[:, :60] = stone
+        blocks[:, 60:63] = dirt
+        blocks[:, 63] = grass
+        return _split_sub_chunks(blocks)
+    return generate
+
+
+def cave_scene(palette: Palette) -> Callable[[int, int], Dict[int, numpy.ndarray]]:
+    """Stone up to y=64 with noise caves and scattered ores. Lots of hidden faces to cull."""
+    stone = palette.add('stone')
+    ores = [palette.add(name) for name in ('coal_ore', 'iron_ore', 'gold_ore', 'diamond_ore', 'gravel', 'andesite')]
+
+    def generate(cx: int, cz: int) -> Dict[int, numpy.ndarray]:
+        rng = numpy.random.default_rng((cx & 0xFFFFFFFF, cz & 0xFFFFFFFF, 1))
+        blocks = numpy.zeros((16, SUB_CHUNKS * 16, 16), dtype=numpy.uint32)
+        blocks[:, :64] = stone
+        ore_mask = rng.random((16, 64, 16)) < 0.05
+        blocks[:, :64][ore_mask] = rng.choice(ores, int(ore_mask.sum()))
+        caves = (_coarse_noise(rng, (16, 64, 16), 4) + 0.5 * rng.random((16, 64, 16))) > 1.1
+        blocks[:, :64][caves] = AIR
+        return _split_sub_chunks(blocks)
+    return generate
+
+
+def village_scene(palette: Palette, states: int = 200) -> Callable[[int, int], Dict[int, numpy.ndarray]]:
+    """A flat ground with buildings made of a large number of different block states.
+    A mix of opaque, translucent and partial blocks like a built up area."""
+    ground = palette.add('grass_block')
+    building_blocks = []
+    for index in range(states):
+        if index % 5 == 3:
+            building_blocks.append(palette.add(f'glass_{index}', transparency=1))
+        elif index % 5 == 4:
+            building_blocks.append(palette.add(f'plant_{index}', shape='cross'))
+        else:
+            building_blocks.append(palette.add(f'block_{index}', transparency=2 if index % 7 == 0 else 0))
+    building_blocks = numpy.array(building_blocks, dtype=numpy.uint32)
+
+    def generate(cx: int, cz: int) -> Dict[int, numpy.ndarray]:
+        rng = numpy.random.default_rng((cx & 0xFFFFFFFF, cz & 0xFFFFFFFF, 2))
+        blocks = numpy.zeros((16, SUB_CHUNKS * 16, 16), dtype=numpy.uint32)
+        blocks[:, :64] = ground
+        for _ in range(3):
+            # a hollow building with walls of random blocks
+            x0, z0 = rng.integers(0, 10, 2)
+            width, depth, height = rng.integers(4, 7, 3)
+            building = rng.choice(building_blocks, (width, height, depth))
+            building[1:-1, :-1, 1:-1] = AIR
+            blocks[x0:x0 + width, 64:64 + height, z0:z0 + depth] = building
+        return _split_sub_chunks(blocks)
+    return generate
+
+
+def glass_scene(palette: Palette) -> Callable[[int, int], Dict[int, numpy.ndarray]]:
+    """A solid box of two alternating glass colours up to y=64.
+    Every face is between two different translucent blocks so none are culled."""
+    glass = numpy.array([palette.add('white_stained_glass', transparency=1), palette.add('light_blue_stained_glass', transparency=1)], dtype=numpy.uint32)
+
+    def generate(cx: int, cz: int) -> Dict[int, numpy.ndarray]:
+        blocks = numpy.zeros((16, SUB_CHUNKS * 16, 16), dtype=numpy.uint32)
+        x, y, z = numpy.indices((16, 64, 16))
+        blocks[:, :64] = glass[(x + y + z) % 2]
+        return _split_sub_chunks(blocks)
+    return generate
+
+
+SCENES = {
+    'flat': flat_scene,
+    'caves': cave_scene,
+    'village': village_scene,
+    'glass': glass_scene,
+}
+
+
+class SyntheticChunk:
+    def __init__(self, cx: int, cz: int, blocks: Blocks):
+        """Stands in for amulet.api.chunk.Chunk. Only has what the renderer reads."""
+        self.cx = cx
+        self.cz = cz
+        self.blocks = blocks
+        self.changed_time = 0.0
+
+
+class SyntheticWorld:
+    def __init__(self, scene: str, size: Optional[int] = 8):
+        """A square of generated chunks starting at chunk (0, 0).
+        Only implements the parts of amulet.api.world.World that the renderer uses to read chunks.
+        Chunks are generated the first time they are requested.
+        :param scene: The name of the scene in SCENES
+        :param size: The width of the square in chunks. None for a world with no edge.
+        """
+        self.palette = Palette()
+        self._generate = SCENES[scene](self.palette)
+        self.size = size
+        self._chunks: Dict[Tuple[int, int], SyntheticChunk] = {}
+
+    @property
+    def chunk_coords(self) -> List[Tuple[int, int]]:
+        """The coordinates of every chunk in the world. Only the chunks generated so far if it has no edge."""
+        if self.size is None:
+            return list(self._chunks)
+        return [(cx, cz) for cx in range(self.size) for cz in range(self.size)]
+
+    def get_chunk(self, cx: int, cz: int, dimension: str = 'overworld') -> SyntheticChunk:
+        if self.size is not None and not (0 <= cx < self.size and 0 <= cz < self.size):
+            raise ChunkDoesNotExist
+        chunk = self._chunks.get((cx, cz))
+        if chunk is None:
+            chunk = self._chunks[(cx, cz)] = SyntheticChunk(cx, cz, Blocks(self._generate(cx, cz)))
+        return chunk
+
+    def unload(self, safe_area: Optional[Tuple[str, int, int, int, int]] = None):
+        """Forget the generated chunks outside the safe area (dimension, min cx, min cz, max cx, max cz).
+        They are generated again if they are requested."""
+        for cx, cz in list(self._chunks):
+            if safe_area is None or not (safe_area[1] <= cx <= safe_area[3] and safe_area[2] <= cz <= safe_area[4]):
+                self._chunks.pop((cx, cz), None)
@@ -0,0 +1,73 @@
+"""Compare the texture atlas packing algorithms on a synthetic set of textures.
+Run from the repository root with
+    python -m benchmarks.texture_atlas [--count 4000] [--hd]
+"""
+
+import argparse
+import random
+import time
+from typing import List
+
+from PIL import Image
+
+from amulet_map_editor.opengl.textureatlas import Frame, Texture, pack_textures, _packers
+
+
+def synthetic_textures(count: int, hd: bool = False, seed: int = 0) -> List[Texture]:
+    """Create textures with a distribution of sizes similar to a resource pack.
+    Most textures are square with some animated (tall) and some larger textures."""
+    rand = random.Random(seed)
+    base = 128 if hd else 16
+    textures = []
+    for index in range(count):
+        size = base * rand.choice([1, 1, 1, 1, 1, 1, 2, 4])
+        height = size * rand.choice([1, 1, 1, 1, 1, 1, 1, 2, 4])
+        name = f'texture_{index}'
+        # the image content does not matter for packing so a 1x1 image is used and the size overridden
+        frame = Frame(name, Image.new('RGBA', (1, 1)))
+        frame._width = size
+        frame._height = height
+        textures.append(Texture(name, [frame]))
+    return textures
+
+
+def check_overlap(textures: List[Texture]) -> bool:
+    """Check that no two frames overlap. Returns True if there is an overlap."""
+    frames = sorted((f for t in textures for f in t.frames), key=lambda f: f.x)
+    for index, frame in enumerate(frames):
+        for other in frames[index + 1:]:
+            if other.x >= frame.x + frame.width:
+                break
+            if other.y < frame.y + frame.height and frame.y < other.y + other.height:
+                return True
+    return False
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the texture atlas packers.')
+    parser.add_argument('--count', type=int, default=4000, help='The number of textures to pack.')
+    parser.add_argument('--hd', action='store_true', help='Use 128x128 base textures instead of 16x16.')
+    parser.add_argument('--repeat', type=int, default=3, help='The number of times to run each packer. The fastest is reported.')
+    args = parser.parse_args()
+
+    print(f'Packing {args.count} {"128" if args.hd else "16"}px based textures')
+    print(f'{"packer":<10}{"time (s)":>12}{"atlas size":>14}{"fill ratio":>12}{"used fill ratio":>17}')
+    for packer in _packers:
+        best_time = None
+        atlas = None
+        for _ in range(args.repeat):
+            textures = synthetic_textures(args.count, args.hd)
+            start = time.perf_counter()
+            atlas = pack_textures(textures, packer)
+            elapsed = time.perf_counter() - start
+            if best_time is None or elapsed < best_time:
+                best_time = elapsed
+        assert not check_overlap(atlas.textures), f'The {packer} packer created overlapping frames'
+        # the fill ratio of the atlas if it was cropped to the highest frame
+        used_height = max(f.y + f.height for t in atlas.textures for f in t.frames)
+        used_fill_ratio = atlas.fill_ratio * atlas.height / used_height
+        print(f'{packer:<10}{best_time:>12.3f}{f"{atlas.width}x{atlas.height}":>14}{atlas.fill_ratio:>12.3f}{used_fill_ratio:>17.3f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -2,8 +2,10 @@ import wx
 from amulet_map_editor.amulet_ui import AmuletMainWindow
 from amulet_map_editor import log
 import traceback
+import multiprocessing
 
 if __name__ == "__main__":
+    multiprocessing.freeze_support()
     try:
         app = wx.App()
         frame = AmuletMainWindow(None)